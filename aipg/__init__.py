@@ -1,4 +1,3 @@
-import asyncio
 import logging
 import time
 from contextlib import contextmanager
@@ -8,6 +7,7 @@ from typing import Annotated, List, Optional
 import typer
 from rich import print as rprint
 
+from aipg import event_loop
 from aipg.assistant import ProjectAssistant
 from aipg.configs.app_config import AppConfig
 from aipg.configs.loader import load_config
@@ -93,7 +93,7 @@ def run_assistant(
         rprint("🤖 [bold red] Welcome to Cherry AI Project Generator [/bold red]")
         assistant = ProjectAssistant(config)
         state = ProjectsAgentState(comments=comments)
-        state = asyncio.run(assistant.execute(state))
+        state = event_loop.run(assistant.execute(state))
         rprint(state)
     return state
 
@@ -1,12 +1,13 @@
-import asyncio
 import logging
 from typing import List, Optional
 
 import uvicorn  # type: ignore[import-not-found]
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
+from aipg import event_loop
 from aipg.assistant import FeedbackAssistant, ProjectAssistant
 from aipg.configs.app_config import AppConfig
 from aipg.configs.loader import load_config
@@ -74,7 +75,7 @@ def _generate_projects(
     )
     assistant = ProjectAssistant(config)
     state = ProjectsAgentState(comments=comments)
-    state = asyncio.run(assistant.execute(state))
+    state = event_loop.run_shared(assistant.execute(state))
     projects: List[Project] = [
         item.project for item in state.topic2project if item.project is not None
     ]
@@ -94,7 +95,7 @@ def _generate_feedback(
     )
     assistant = FeedbackAssistant(config)
     state = FeedbackAgentState(user_solution=user_solution, project=project)
-    state = asyncio.run(assistant.execute(state))
+    state = event_loop.run_shared(assistant.execute(state))
     return state
 
 
@@ -135,6 +136,22 @@ def generate_feedback(payload: FeedbackRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/feedback/stream")
+def stream_feedback(payload: FeedbackRequest):
+    """Stream the feedback text as plain text while the LLM generates it.
+
+    Unlike /feedback, the sandbox execution result is not included.
+    """
+    config: AppConfig = load_config(overrides=payload.overrides, schema=AppConfig)
+    state = FeedbackAgentState(
+        user_solution=payload.user_solution, project=payload.project
+    )
+    pieces = FeedbackAssistant(config).stream(state)
+    return StreamingResponse(
+        event_loop.iterate_shared(pieces), media_type="text/plain; charset=utf-8"
+    )
+
+
 @app.get("/health")
 def health() -> dict:
     return {"status": "ok"}
@@ -1,6 +1,6 @@
 import asyncio
 import logging
-from typing import Generic, List, Type, TypeVar
+from typing import AsyncIterator, Generic, List, Type, TypeVar
 
 from pydantic import BaseModel
 
@@ -8,16 +8,19 @@ from aipg.configs.app_config import AppConfig
 from aipg.domain import (
     FeedbackAgentState,
     ProcessTopicAgentState,
+    Project,
     ProjectsAgentState,
     Topic2Project,
 )
 from aipg.llm import LLMClient
 from aipg.rag.rag_builder import build_rag_service
+from aipg.rag.ranker import EmbeddingRanker
 from aipg.sandbox.builder import build_sandbox_service
 from aipg.task_inference import (
     BugFixerInference,
     CheckAutotestSandboxInference,
     DefineTopicsInference,
+    EmbeddingRankerInference,
     FeedbackInference,
     LLMRankerInference,
     ProjectGenerationInference,
@@ -77,15 +80,103 @@ class ProjectAssistant(BaseAssistant[ProjectsAgentState]):
         self.rag_service = build_rag_service(config)
         self.sandbox_service = build_sandbox_service(config)
 
-    async def process_topic(self, topic: str) -> ProcessTopicAgentState:
-        """Search for projects for a single topic using RAG service and LLM ranking."""
-        state = ProcessTopicAgentState(topic=topic)
+    def _build_ranker_inference(self) -> TaskInference[ProcessTopicAgentState]:
+        if self.config.rag.ranker == "embedding":
+            return EmbeddingRankerInference(
+                llm=self.llm,
+                ranker=EmbeddingRanker(self.rag_service.embedder),
+                similarity_threshold=self.config.rag.similarity_threshold,
+            )
+        return LLMRankerInference(
+            llm=self.llm,
+            similarity_threshold=self.config.rag.similarity_threshold,
+            semantic_match_threshold=self.config.rag.semantic_match_threshold,
+        )
+
+    async def rank_topics(
+        self, topics: List[str]
+    ) -> List[ProcessTopicAgentState | None]:
+        """Look up and rank the candidates of all topics together.
+
+        Uses one embedding call and vector-store query for every topic and, with
+        the LLM ranker, one ranking prompt. An entry is None when its topic
+        could not be ranked this way and should go through process_topic alone.
+        """
+        try:
+            candidates = await self.rag_service.try_to_get_many(topics)
+        except Exception as e:
+            logger.warning(
+                "Batched RAG lookup failed, topics will be looked up one by one: %s", e
+            )
+            return [None] * len(topics)
 
-        # Create task inferences with the RAG service
-        rag_inference = RAGServiceInference(llm=self.llm, rag_service=self.rag_service)
-        llm_ranker_inference = LLMRankerInference(
-            llm=self.llm, similarity_threshold=self.config.rag.similarity_threshold
+        states = [
+            ProcessTopicAgentState(topic=topic, candidates=topic_candidates)
+            for topic, topic_candidates in zip(topics, candidates)
+        ]
+        ranker_inference = self._build_ranker_inference()
+        concurrency = self.config.max_concurrent_topics
+        if isinstance(ranker_inference, LLMRankerInference):
+            results = await ranker_inference.transform_batch(
+                states, concurrency=concurrency
+            )
+        else:
+            results = await ranker_inference.transform_many(
+                states, concurrency=concurrency
+            )
+
+        ranked: List[ProcessTopicAgentState | None] = []
+        for topic, result in zip(topics, results):
+            if isinstance(result, BaseException):
+                logger.warning(
+                    "Ranking failed for topic '%s', retrying it alone: %s",
+                    topic,
+                    result,
+                )
+                ranked.append(None)
+            else:
+                ranked.append(result)
+        return ranked
+
+    async def generate_projects(
+        self, ranked_topics: List[ProcessTopicAgentState | None]
+    ) -> List[Project | None]:
+        """Generate the projects of ranked topics left without one in one batch.
+
+        Only used when the LLM client has Batch API support; an entry is None
+        when process_topic should generate that project itself.
+        """
+        generated: List[Project | None] = [None] * len(ranked_topics)
+        if not self.llm.supports_batch:
+            return generated
+        # Copies, so the ranked states still show that no project was found
+        pending = {
+            i: ranked.model_copy()
+            for i, ranked in enumerate(ranked_topics)
+            if ranked is not None and ranked.project is None
+        }
+        if len(pending) < 2:
+            return generated
+        results = await ProjectGenerationInference(llm=self.llm).transform_batch(
+            list(pending.values()), concurrency=self.config.max_concurrent_topics
         )
+        for i, result in zip(pending, results):
+            if isinstance(result, ProcessTopicAgentState):
+                generated[i] = result.project
+        return generated
+
+    async def process_topic(
+        self,
+        topic: str,
+        ranked: ProcessTopicAgentState | None = None,
+        generated: Project | None = None,
+    ) -> ProcessTopicAgentState:
+        """Search for projects for a single topic using RAG service and LLM ranking.
+
+        ``ranked`` is a state already looked up and ranked by rank_topics;
+        those steps are then skipped. ``generated`` is a project already
+        generated for the topic by generate_projects.
+        """
         project_generation_inference = ProjectGenerationInference(llm=self.llm)
         project_validator_inference = ProjectValidatorInference(llm=self.llm)
         project_corrector_inference = ProjectCorrectorInference(llm=self.llm)
@@ -94,15 +185,25 @@ class ProjectAssistant(BaseAssistant[ProjectsAgentState]):
         )
         bug_fixer_inference = BugFixerInference(llm=self.llm)
 
-        # Run RAG service inference to get candidates
-        state = await rag_inference.transform(state)
+        if ranked is not None:
+            state = ranked
+        else:
+            state = ProcessTopicAgentState(topic=topic)
+            rag_inference = RAGServiceInference(
+                llm=self.llm, rag_service=self.rag_service
+            )
+            # Run RAG service inference to get candidates
+            state = await rag_inference.transform(state)
 
-        # If we have candidates, run LLM ranking
-        if state.candidates:
-            state = await llm_ranker_inference.transform(state)
+            # If we have candidates, rank them
+            if state.candidates:
+                state = await self._build_ranker_inference().transform(state)
 
         if not state.project:
-            state = await project_generation_inference.transform(state)
+            if generated is not None:
+                state.project = generated
+            else:
+                state = await project_generation_inference.transform(state)
             if state.project:
                 previous_version = state.project
                 for attempt in range(1, self.config.project_correction_attempts + 1):
@@ -127,7 +228,17 @@ class ProjectAssistant(BaseAssistant[ProjectsAgentState]):
                 # Only run final validation if we don't already have a valid result
                 if not state.validation_result or not state.validation_result.is_valid:
                     logger.info("Running final validation before persisting project")
-                    state = await project_validator_inference.transform(state)
+                    # The autotest only reads the project, so it runs in the
+                    # sandbox while the LLM validates; it is kept only if the
+                    # project passes validation
+                    validated, autotested = await asyncio.gather(
+                        project_validator_inference.transform(state),
+                        check_autotest_inference.transform(state.model_copy()),
+                        return_exceptions=True,
+                    )
+                    if isinstance(validated, BaseException):
+                        raise validated
+                    state = validated
 
                     # Check final validation result and revert if invalid
                     if (
@@ -145,6 +256,8 @@ class ProjectAssistant(BaseAssistant[ProjectsAgentState]):
                         logger.info(
                             "Final validation successful, project ready for persistence"
                         )
+                        if isinstance(autotested, ProcessTopicAgentState):
+                            state.execution_result = autotested.execution_result
                 else:
                     logger.info(
                         "Project already validated successfully, skipping final validation"
@@ -158,8 +271,10 @@ class ProjectAssistant(BaseAssistant[ProjectsAgentState]):
             ):
                 logger.info("Project is valid, running autotest and bug fixing")
 
-                # Run autotest to check for bugs
-                state = await check_autotest_inference.transform(state)
+                # Run autotest to check for bugs, unless it already ran
+                # alongside the final validation
+                if state.execution_result is None:
+                    state = await check_autotest_inference.transform(state)
 
                 # Try to fix bugs if any are found
                 for attempt in range(1, self.config.bug_fix_attempts + 1):
@@ -197,7 +312,14 @@ class ProjectAssistant(BaseAssistant[ProjectsAgentState]):
                 and state.validation_result
                 and state.validation_result.is_valid
             ):
-                await self.rag_service.save(state.topic, state.project)
+                # With write-behind, embedding happens in the background writer
+                await self.rag_service.save(
+                    state.topic,
+                    state.project,
+                    generate_embedding=(
+                        "async" if self.config.rag.write_behind else "sync"
+                    ),
+                )
                 logger.info(f"Project successfully saved for topic: {state.topic}")
             elif state.project:
                 logger.warning(
@@ -207,6 +329,17 @@ class ProjectAssistant(BaseAssistant[ProjectsAgentState]):
         return state
 
     async def execute(self, state: ProjectsAgentState) -> ProjectsAgentState:
+        try:
+            return await self._execute(state)
+        finally:
+            # Persist saves still queued by the write-behind buffer and stop
+            # the background workers before the event loop shuts down
+            await self.aclose()
+
+    async def aclose(self) -> None:
+        await self.rag_service.aclose()
+
+    async def _execute(self, state: ProjectsAgentState) -> ProjectsAgentState:
         task_inferences: List[Type[TaskInference[ProjectsAgentState]]] = [
             DefineTopicsInference,
         ]
@@ -215,8 +348,31 @@ class ProjectAssistant(BaseAssistant[ProjectsAgentState]):
 
         # Run parallel processing of each topic
         if state.topics:
-            # Create tasks for parallel execution
-            process_topic_tasks = [self.process_topic(topic) for topic in state.topics]
+            # Look up and rank all topics in batched calls first
+            ranked_topics = await self.rank_topics(state.topics)
+            generated_projects = await self.generate_projects(ranked_topics)
+
+            # Create tasks for parallel execution, at most max_concurrent_topics
+            # of them in flight so large topic lists do not flood the provider
+            limit = self.config.max_concurrent_topics
+            semaphore = asyncio.Semaphore(limit) if limit else None
+
+            async def process_topic_bounded(
+                topic: str,
+                ranked: ProcessTopicAgentState | None,
+                generated: Project | None,
+            ) -> ProcessTopicAgentState:
+                if semaphore is None:
+                    return await self.process_topic(topic, ranked, generated)
+                async with semaphore:
+                    return await self.process_topic(topic, ranked, generated)
+
+            process_topic_tasks = [
+                process_topic_bounded(topic, ranked, generated)
+                for topic, ranked, generated in zip(
+                    state.topics, ranked_topics, generated_projects
+                )
+            ]
 
             # Execute all searches in parallel
             process_topic_results = await asyncio.gather(
@@ -261,3 +417,11 @@ class FeedbackAssistant(BaseAssistant[FeedbackAgentState]):
             FeedbackInference,
         ]
         return await self._run_task_inference(task_inferences, state)
+
+    async def stream(self, state: FeedbackAgentState) -> AsyncIterator[str]:
+        """Run the solution in the sandbox, then yield feedback as it is generated."""
+        state = await self._run_task_inference(
+            [CheckUserSolutionSandboxInference], state
+        )
+        async for piece in FeedbackInference(llm=self.llm).stream(state):
+            yield piece
@@ -1,5 +1,5 @@
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Literal, Optional
 from uuid import uuid4
 
 from pydantic import BaseModel, Field
@@ -21,6 +21,19 @@ class LLMConfig(BaseModel):
     temperature: Optional[float] = None
     extra_headers: Dict[str, Any] = Field(default_factory=dict)
     completion_params: Dict[str, Any] = Field(default_factory=dict)
+    # Mark the static prompt prefix as cacheable for providers with explicit
+    # prompt caching (e.g. Anthropic cache_control) and send OpenAI a
+    # prompt_cache_key per system prompt
+    prompt_caching: bool = False
+    # Client-side request cap per provider endpoint; None leaves it unthrottled
+    requests_per_minute: Optional[int] = None
+    # Generate projects for many topics through the provider's Batch API
+    # (OpenAI/Azure): cheaper, but slow; a job still running after
+    # task_timeout is cancelled and the projects are generated one by one
+    batch_api: bool = False
+    batch_poll_interval_seconds: float = 30.0
+    # Stream replies so a malformed JSON reply is cut off and retried early
+    stream_responses: bool = False
     # Provider selection and Yandex SDK specific options
     # provider can be one of: None (default litellm autodetect), "yandex_sdk"
     provider: Optional[str] = None
@@ -37,12 +50,32 @@ class LangfuseConfig(BaseModel):
 
 class RagConfig(BaseModel):
     similarity_threshold: float = 0.7
+    # Candidate ranker: "llm" asks the chat model, "embedding" uses cosine similarity
+    ranker: Literal["llm", "embedding"] = "llm"
     k_candidates: int = 5
     collection_name: str = "micro_projects"
     chroma_path: str = Field(default=str(Path(PACKAGE_PATH) / "cache" / "chroma"))
+    # Chroma server URL; when set, the async HTTP client replaces chroma_path
+    chroma_url: Optional[str] = None
+    # HNSW index knobs for new collections; None keeps Chroma's defaults.
+    # Higher search_ef trades query latency for recall
+    hnsw_search_ef: Optional[int] = None
+    hnsw_construction_ef: Optional[int] = None
+    hnsw_m: Optional[int] = None
     embedding_model: str = "gemini-embedding-001"
     embedding_base_url: Optional[str] = None
     embedding_api_key: Optional[str] = None
+    # Topic embeddings kept in memory; 0 disables the cache
+    embedding_cache_size: int = 4096
+    # Directory for an on-disk embedding cache that survives restarts
+    embedding_cache_dir: Optional[str] = None
+    # Queue saves and embed/add them to the vector store in batches
+    write_behind: bool = False
+    # Seconds a cached lookup result stays valid; None keeps it until a save
+    results_cache_ttl_seconds: Optional[float] = 3600.0
+    # Vector similarity at which the nearest stored topic is reused without
+    # the LLM ranker (e.g. 0.92 for paraphrases); None always ranks
+    semantic_match_threshold: Optional[float] = None
 
 
 class SandboxConfig(BaseModel):
@@ -51,6 +84,10 @@ class SandboxConfig(BaseModel):
     cpu_quota: Optional[float] = 0.5
     pids_limit: int = 128
     default_timeout_seconds: int = 5
+    # Exec into one long-lived container instead of starting one per run
+    reuse_container: bool = False
+    # Compose runner: send runs to one long-lived interpreter in the container
+    persistent_repl: bool = False
 
 
 class AppConfig(BaseModel):
@@ -60,6 +97,8 @@ class AppConfig(BaseModel):
     time_limit: int = 14400
     project_correction_attempts: int = 3
     bug_fix_attempts: int = 3
+    # Topics processed at once per request; None runs them all concurrently
+    max_concurrent_topics: Optional[int] = None
     session_id: str = Field(default_factory=lambda: uuid4().hex)
     rag: RagConfig = RagConfig()
     sandbox: SandboxConfig = Field(default_factory=SandboxConfig)
@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 from pydantic import BaseModel, ConfigDict, Field, field_validator
 
 from aipg.sandbox.domain import SandboxResult
@@ -14,6 +16,16 @@ class ProjectValidationResult(BaseModel):
     checks: list[ProjectValidationCheck]
 
 
+STUDENT_SOLUTION_PLACEHOLDER = "{STUDENT_SOLUTION}"
+
+
+@lru_cache(maxsize=256)
+def _split_autotest(autotest: str) -> tuple[str, ...]:
+    # Keyed by the autotest string itself, whose hash Python caches, so
+    # repeat runs of the same project skip the placeholder search
+    return tuple(autotest.split(STUDENT_SOLUTION_PLACEHOLDER))
+
+
 class Project(BaseModel):
     raw_markdown: str
     topic: str
@@ -24,10 +36,21 @@ class Project(BaseModel):
     expert_solution: str
     autotest: str
 
+    @property
+    def has_solution_placeholder(self) -> bool:
+        return len(_split_autotest(self.autotest)) > 1
+
+    def render_autotest(self, solution: str) -> str:
+        """Return the autotest with every placeholder replaced by ``solution``."""
+        return solution.join(_split_autotest(self.autotest))
+
 
 class Topic2Project(BaseModel):
     topic: str
     project: Project | None = Field(default=None)
+    # Vector-store similarity of a retrieved candidate to the searched topic;
+    # internal to ranking, so it is left out of serialized output
+    similarity: float | None = Field(default=None, exclude=True)
 
 
 class ProjectsAgentState(BaseModel):
@@ -35,30 +58,25 @@ class ProjectsAgentState(BaseModel):
     topics: list[str] = Field(default_factory=list)
     topic2project: list[Topic2Project] = Field(default_factory=list)
 
-    # Ensure validators run on attribute assignment as well
+    # Ensure validators run on attribute assignment as well. Only this state
+    # needs it (for de-duplication); the per-topic states below are mutated
+    # inside the ranking and correction loops and keep Pydantic's default of
+    # not revalidating on assignment.
     model_config = ConfigDict(validate_assignment=True)
 
     @field_validator("topics", mode="after")
     def _ensure_unique_topics(cls, topics: list[str]) -> list[str]:
-        seen: set[str] = set()
-        unique_topics: list[str] = []
-        for topic in topics:
-            if topic not in seen:
-                seen.add(topic)
-                unique_topics.append(topic)
-        return unique_topics
+        # dict keys keep first-seen order
+        return list(dict.fromkeys(topics))
 
     @field_validator("topic2project", mode="after")
     def _ensure_unique_topic2project(
         cls, items: list[Topic2Project]
     ) -> list[Topic2Project]:
-        seen_topics: set[str] = set()
-        unique_items: list[Topic2Project] = []
+        unique_items: dict[str, Topic2Project] = {}
         for item in items:
-            if item.topic not in seen_topics:
-                seen_topics.add(item.topic)
-                unique_items.append(item)
-        return unique_items
+            unique_items.setdefault(item.topic, item)
+        return list(unique_items.values())
 
 
 class ProcessTopicAgentState(BaseModel):
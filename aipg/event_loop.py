@@ -0,0 +1,186 @@
+import asyncio
+import contextlib
+import logging
+import threading
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Coroutine,
+    Generic,
+    Iterator,
+    List,
+    Optional,
+    TypeVar,
+    cast,
+)
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None  # type: ignore
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+_shared_loop: Optional[asyncio.AbstractEventLoop] = None
+_shared_loop_lock = threading.Lock()
+
+
+def run(coro: Coroutine[object, object, T]) -> T:
+    """Run a coroutine to completion, on a uvloop event loop when available.
+
+    The RAG and LLM paths chain many short awaits, where uvloop's cheaper
+    scheduling adds up. Without uvloop (e.g. on Windows) this is asyncio.run.
+    """
+    if uvloop is None:
+        return asyncio.run(coro)
+    return asyncio.run(coro, loop_factory=uvloop.new_event_loop)
+
+
+def run_shared(coro: Coroutine[object, object, T]) -> T:
+    """Run a coroutine on a long-lived background loop and wait for the result.
+
+    For sync request handlers: unlike run(), the loop outlives the call, so
+    per-loop state such as litellm's keep-alive HTTP clients is reused by
+    later requests instead of reconnecting for each one.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _get_shared_loop()).result()
+
+
+def iterate_shared(items: AsyncIterator[T]) -> Iterator[T]:
+    """Consume an async iterator on the shared loop from synchronous code.
+
+    Closing the returned generator early also closes ``items`` on the shared
+    loop, so async generators run their cleanup instead of being left open.
+    """
+    done = object()
+
+    async def next_item() -> object:
+        try:
+            return await anext(items)
+        except StopAsyncIteration:
+            return done
+
+    try:
+        while (item := run_shared(next_item())) is not done:
+            yield cast(T, item)
+    finally:
+        aclose = getattr(items, "aclose", None)
+        if aclose is not None:
+            run_shared(aclose())
+
+
+def _get_shared_loop() -> asyncio.AbstractEventLoop:
+    global _shared_loop
+    with _shared_loop_lock:
+        if _shared_loop is None:
+            loop = (
+                uvloop.new_event_loop()
+                if uvloop is not None
+                else asyncio.new_event_loop()
+            )
+            threading.Thread(
+                target=loop.run_forever, name="aipg-event-loop", daemon=True
+            ).start()
+            _shared_loop = loop
+        return _shared_loop
+
+
+class BatchQueue(Generic[T]):
+    """Queue drained in batches by a background task on the running loop.
+
+    Items put within ``max_wait_ms`` of the first item of a batch are passed
+    to ``handler`` together, up to ``max_size`` as counted by ``size``
+    (one per item by default). The queue and its worker belong to the loop
+    that created them; a put() on another loop starts a new pair.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[List[T]], Awaitable[None]],
+        max_size: int,
+        max_wait_ms: float,
+        name: str,
+        size: Optional[Callable[[T], int]] = None,
+    ) -> None:
+        self.handler = handler
+        self.max_size = max_size
+        self.max_wait_ms = max_wait_ms
+        self.name = name
+        self.size = size or (lambda item: 1)
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    def put(self, item: T) -> None:
+        loop = asyncio.get_running_loop()
+        if (
+            self._queue is None
+            or self._loop is not loop
+            or self._worker is None
+            or self._worker.done()
+        ):
+            self._queue = asyncio.Queue()
+            self._loop = loop
+            self._worker = loop.create_task(self._drain(self._queue))
+        self._queue.put_nowait(item)
+
+    async def join(self) -> None:
+        """Wait until every queued item has been handled."""
+        if self._queue is not None and self._owns_queue():
+            await self._queue.join()
+
+    async def aclose(self) -> None:
+        """Handle every queued item, then stop the worker.
+
+        A later put() starts a new worker, so this is safe to call on a queue
+        that is still shared.
+        """
+        queue, worker = self._queue, self._worker
+        owned = queue is not None and self._owns_queue()
+        # Detached first, so items put while this waits go to a new worker
+        self._queue = self._loop = self._worker = None
+        if not owned or queue is None or worker is None or worker.done():
+            return
+        await queue.join()
+        worker.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await worker
+
+    def _owns_queue(self) -> bool:
+        if self._loop is asyncio.get_running_loop():
+            return True
+        if self._queue is not None and not self._queue.empty():
+            logger.warning(
+                "%s called from another event loop; %d queued items were dropped",
+                self.name,
+                self._queue.qsize(),
+            )
+        return False
+
+    async def _drain(self, queue: asyncio.Queue) -> None:
+        loop = asyncio.get_running_loop()
+        max_wait = self.max_wait_ms / 1000
+        while True:
+            batch: List[T] = [await queue.get()]
+            size = self.size(batch[0])
+            deadline = loop.time() + max_wait
+            while size < self.max_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                size += self.size(item)
+            try:
+                await self.handler(batch)
+            except Exception:
+                logger.exception("%s failed for %d items", self.name, len(batch))
+            finally:
+                for _ in batch:
+                    queue.task_done()
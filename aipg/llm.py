@@ -1,15 +1,28 @@
 import asyncio
+import contextlib
+import hashlib
+import json
 import logging
-from typing import Any, Dict, List, TypeVar
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, List, Tuple, TypeVar
 
 import httpx
 import litellm
 from litellm.caching.caching import Cache, LiteLLMCacheType
 from pydantic import BaseModel
-from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential
+from tenacity import (
+    retry,
+    retry_if_exception,
+    stop_after_attempt,
+    wait_exponential_jitter,
+)
 
 from aipg.configs.app_config import AppConfig
 from aipg.configs.loader import load_config
+from aipg.rate_limit import AsyncRateLimiter, get_rate_limiter
 from aipg.tracing import LangfuseTracer
 from yandex_cloud_ml_sdk import YCloudML
 
@@ -18,6 +31,11 @@ try:
 except ImportError:
     AsyncCompletions = None  # type: ignore
 
+try:
+    import diskcache  # type: ignore[import-untyped]
+except ImportError:
+    diskcache = None
+
 T = TypeVar("T", bound=BaseModel)
 
 # litellm._logging._disable_debugging()
@@ -26,6 +44,104 @@ T = TypeVar("T", bound=BaseModel)
 logger = logging.getLogger(__name__)
 
 
+# litellm call options that configure the client rather than the request body
+_CLIENT_ONLY_PARAMS = frozenset(
+    {
+        "model",
+        "api_key",
+        "base_url",
+        "api_base",
+        "extra_headers",
+        "metadata",
+        "timeout",
+        "cache_control_injection_points",
+        "custom_llm_provider",
+    }
+)
+
+
+# Retries transient provider errors of a request nothing was read from yet
+_retry_transient = retry(
+    stop=stop_after_attempt(5),
+    # Jitter keeps concurrent topic pipelines from retrying in lockstep
+    wait=wait_exponential_jitter(initial=1, max=10, jitter=2),
+    retry=(
+        retry_if_exception(
+            lambda e: getattr(e, "status_code", None)
+            in {408, 409, 429, 500, 502, 503, 504}
+        )
+        | retry_if_exception(
+            lambda e: isinstance(
+                e,
+                (
+                    TimeoutError,
+                    ConnectionError,
+                    httpx.TimeoutException,
+                    httpx.ConnectError,
+                ),
+            )
+        )
+    ),
+    reraise=True,
+)
+
+
+def _chunk_text(chunk: Any) -> str | None:
+    choices = getattr(chunk, "choices", None) or []
+    delta = getattr(choices[0], "delta", None) if choices else None
+    return getattr(delta, "content", None)
+
+
+@lru_cache(maxsize=64)
+def _prompt_cache_key(system_prompt: str) -> str:
+    # Requests sharing a system prompt share a key, so the provider routes
+    # them to the same prefix cache; system prompts come from a few files
+    return hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:32]
+
+
+class LLMResponseCache:
+    """In-memory LRU of raw LLM replies keyed by LLMClient.request_cache_key.
+
+    Callers store only replies that parsed successfully, so a malformed
+    output is never replayed. Hit and miss counters are kept for monitoring.
+    """
+
+    def __init__(self, maxsize: int = 256) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            reply = self._entries.get(key)
+            if reply is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return reply
+
+    def put(self, key: str, reply: str) -> None:
+        with self._lock:
+            self._entries[key] = reply
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+# Shared by every LLMClient in the process; keys already cover the endpoint
+# and request params, so clients with different settings never collide
+_RESPONSE_CACHE = LLMResponseCache()
+
+
 class LLMClient:
     def __init__(self, config: AppConfig):
         self.config = config
@@ -52,6 +168,15 @@ class LLMClient:
                 "API key not provided and AIPG_LLM_API_KEY environment variable not set"
             )
 
+        self._supports_prompt_cache_key = False
+        self.response_cache = _RESPONSE_CACHE
+        # Structured output is only sent where litellm reports schema support
+        self._supports_response_schema = False
+        # Set for litellm providers with an OpenAI-style Batch API when
+        # config.llm.batch_api opts in
+        self._batch_provider: str | None = None
+        self._batch_model: str | None = None
+
         # Provider-specific initialization
         if self._provider == "yandex_sdk":
             if YCloudML is None:
@@ -95,35 +220,73 @@ class LLMClient:
             }
             print(f"completion_params: {self.completion_params}")
             self.completion_params.setdefault("timeout", 60)
+            if self.config.llm.prompt_caching:
+                # System prompt and first user message are identical across the
+                # parse-error retries, which only append messages after them;
+                # litellm adds cache_control only where the provider supports it
+                self.completion_params.setdefault(
+                    "cache_control_injection_points",
+                    [
+                        {"location": "message", "role": "system"},
+                        {"location": "message", "index": 1},
+                    ],
+                )
+                # OpenAI caches prefixes automatically; a prompt_cache_key
+                # keeps requests with the same system prompt on one cache
+                self._supports_prompt_cache_key = self._check_param_support(
+                    config.llm.model_name, "prompt_cache_key"
+                )
+            self._supports_response_schema = self._check_response_schema_support(
+                config.llm.model_name
+            )
+            if self.config.llm.batch_api:
+                model, provider, _, _ = litellm.get_llm_provider(config.llm.model_name)
+                if provider in {"openai", "azure"}:
+                    self._batch_provider = provider
+                    self._batch_model = model
+                else:
+                    logger.warning(
+                        "Batch API is not available for provider %s; "
+                        "using one completion per request",
+                        provider,
+                    )
 
         if config.llm.caching.enabled:
             litellm.cache = Cache(
                 type=LiteLLMCacheType.DISK, disk_cache_dir=config.llm.caching.dir_path
             )
 
-    @retry(
-        stop=stop_after_attempt(5),
-        wait=wait_exponential(multiplier=1, min=4, max=10),
-        retry=(
-            retry_if_exception(
-                lambda e: getattr(e, "status_code", None)
-                in {408, 409, 429, 500, 502, 503, 504}
+        # One bucket per provider endpoint, shared by every client (and so by
+        # every TaskInference) in the process
+        self._rate_limiter: AsyncRateLimiter | None = None
+        if config.llm.requests_per_minute:
+            self._rate_limiter = get_rate_limiter(
+                self._rate_limit_key(), config.llm.requests_per_minute
             )
-            | retry_if_exception(
-                lambda e: isinstance(
-                    e,
-                    (
-                        TimeoutError,
-                        ConnectionError,
-                        httpx.TimeoutException,
-                        httpx.ConnectError,
-                    ),
-                )
+
+        # litellm's cache does not cover the Yandex SDK, which gets its own
+        self._yandex_cache = None
+        if (
+            self._provider == "yandex_sdk"
+            and config.llm.caching.enabled
+            and diskcache is not None
+        ):
+            self._yandex_cache = diskcache.Cache(
+                str(Path(config.llm.caching.dir_path) / "yandex_sdk")
             )
-        ),
-        reraise=True,
-    )
-    async def query(self, messages: str | List[Dict[str, Any]]) -> str | None:
+
+    @_retry_transient
+    async def query(
+        self,
+        messages: str | List[Dict[str, Any]],
+        response_format: Dict[str, Any] | None = None,
+    ) -> str | None:
+        """Send messages to the LLM and return the text of the first choice.
+
+        ``response_format`` is an OpenAI-style structured-output spec. It is
+        forwarded only when the model supports JSON schemas and is ignored
+        otherwise, so callers must still parse and validate the reply.
+        """
         normalized_messages = self._tracer.normalize_messages(messages)
         logger.debug("Sending messages to LLM: %s", normalized_messages)
 
@@ -136,11 +299,14 @@ class LLMClient:
             normalized_messages, self.completion_params
         )
 
+        completion_params = self._request_params(normalized_messages, response_format)
+
         try:
+            await self._throttle()
             # Default litellm path
             response = await litellm.acompletion(
                 messages=normalized_messages,
-                **self.completion_params,
+                **completion_params,
             )
             choices = getattr(response, "choices", []) or []
             response_content_any: Any | None = (
@@ -174,6 +340,93 @@ class LLMClient:
         logger.debug("Received response from LLM: %s", content)
         return content
 
+    async def stream(
+        self,
+        messages: str | List[Dict[str, Any]],
+        response_format: Dict[str, Any] | None = None,
+    ) -> AsyncGenerator[str, None]:
+        """Yield the reply text in pieces as the model generates it.
+
+        The Yandex SDK path has no streaming here and yields the whole reply
+        as a single piece. Transient errors up to the first chunk are retried
+        like query(); later ones are not, since a retry would repeat pieces
+        the caller has already consumed. Closing the iterator early (aclose)
+        also closes the provider stream.
+        """
+        normalized_messages = self._tracer.normalize_messages(messages)
+        logger.debug("Streaming messages to LLM: %s", normalized_messages)
+
+        if self._provider == "yandex_sdk":
+            reply = await self.query_deferred(normalized_messages)
+            if reply:
+                yield reply
+            return
+
+        trace, generation = self._tracer.create_litellm_trace(
+            normalized_messages, self.completion_params
+        )
+        completion_params = self._request_params(normalized_messages, response_format)
+
+        pieces: List[str] = []
+        response: Any = None
+        try:
+            response, chunks, chunk = await self._open_stream(
+                normalized_messages, completion_params
+            )
+            while chunk is not None:
+                piece = _chunk_text(chunk)
+                if piece:
+                    pieces.append(piece)
+                    yield piece
+                chunk = await anext(chunks, None)
+        except GeneratorExit:
+            # The caller stopped reading; end the generation on the provider
+            # side too instead of paying for tokens nobody reads
+            close = getattr(response, "aclose", None)
+            if close is not None:
+                await close()
+            self._tracer.handle_trace_success(
+                trace,
+                generation,
+                "".join(pieces),
+                {},
+                {"streamed": True, "closed_early": True},
+                "litellm",
+            )
+            raise
+        except Exception as e:
+            self._tracer.handle_trace_error(trace, generation, e, "litellm")
+            raise
+
+        content = "".join(pieces)
+        self._tracer.handle_trace_success(
+            trace, generation, content, {}, {"streamed": True}, "litellm"
+        )
+        logger.debug("Received streamed response from LLM: %s", content)
+
+    @_retry_transient
+    async def _open_stream(
+        self, messages: List[Dict[str, Any]], completion_params: Dict[str, Any]
+    ) -> Tuple[Any, AsyncIterator[Any], Any]:
+        """Start a streamed completion and wait for its first chunk.
+
+        Returns the response, its chunk iterator and the first chunk (None for
+        an empty stream).
+        """
+        await self._throttle()
+        response = await litellm.acompletion(
+            messages=messages, stream=True, **completion_params
+        )
+        chunks = aiter(response)
+        try:
+            return response, chunks, await anext(chunks, None)
+        except BaseException:
+            close = getattr(response, "aclose", None)
+            if close is not None:
+                with contextlib.suppress(Exception):
+                    await close()
+            raise
+
     async def query_deferred(self, messages: str | List[Dict[str, Any]]) -> str | None:
         """Send an asynchronous request using the async run() method.
 
@@ -191,6 +444,15 @@ class LLMClient:
             for m in normalized_messages
         ]
 
+        cache = self._yandex_cache
+        cache_key = None
+        if cache is not None:
+            cache_key = self._yandex_cache_key(y_messages)
+            cached = await asyncio.to_thread(cache.get, cache_key)
+            if cached is not None:
+                logger.debug("Yandex SDK cache hit: %s", cache_key)
+                return cached
+
         # Enhanced Langfuse tracing for Yandex SDK calls
         trace, generation = self._tracer.create_yandex_trace(
             y_messages,
@@ -200,6 +462,7 @@ class LLMClient:
         )
 
         try:
+            await self._throttle()
             # Use the async run() method directly
             # Check if the model's run method is actually async or sync
             if hasattr(
@@ -207,10 +470,10 @@ class LLMClient:
             ) and asyncio.iscoroutinefunction(self._yandex_model.run):
                 result = await self._yandex_model.run(y_messages, timeout=180)
             else:
-                # Fall back to running in executor if it's synchronous
-                loop = asyncio.get_running_loop()
-                result = await loop.run_in_executor(
-                    None, lambda: self._yandex_model.run(y_messages, timeout=180)
+                # A synchronous run goes to a worker thread; unlike
+                # run_in_executor, to_thread carries contextvars (tracing) along
+                result = await asyncio.to_thread(
+                    self._yandex_model.run, y_messages, timeout=180
                 )
 
             # Handle GPTModelResult properly
@@ -240,8 +503,233 @@ class LLMClient:
             # Re-raise the original exception
             raise
 
+        if cache is not None and cache_key is not None and content is not None:
+            await asyncio.to_thread(cache.set, cache_key, content)
         return content
 
+    def _rate_limit_key(self) -> str:
+        if self._provider == "yandex_sdk":
+            return "yandex_sdk"
+        if self.config.llm.base_url:
+            return self.config.llm.base_url.rstrip("/")
+        # Without a base URL litellm routes by the model prefix (openai/, gemini/)
+        return self.config.llm.model_name.split("/", 1)[0].lower()
+
+    async def _throttle(self) -> None:
+        if self._rate_limiter is not None:
+            await self._rate_limiter.acquire()
+
+    def request_cache_key(
+        self,
+        messages: str | List[Dict[str, Any]],
+        response_format: Dict[str, Any] | None = None,
+    ) -> str | None:
+        """SHA-256 key of a deterministic request, or None if it is sampled.
+
+        Built from what is actually sent (model, endpoint, params, messages),
+        leaving out credentials and tracing metadata. Only requests sent
+        with temperature 0 count as deterministic.
+        """
+        normalized_messages = self._tracer.normalize_messages(messages)
+        request: Dict[str, Any]
+        if self._provider == "yandex_sdk":
+            request = {
+                "provider": "yandex_sdk",
+                "folder_id": self.config.llm.yandex_folder_id,
+                "model": self._yandex_model_id,
+                "version": self._yandex_model_version,
+                "temperature": self.config.llm.temperature,
+            }
+        else:
+            params = self._request_params(normalized_messages, response_format)
+            request = {
+                key: value
+                for key, value in params.items()
+                if key not in {"api_key", "metadata"}
+            }
+        if request.get("temperature") != 0:
+            return None
+        request["messages"] = normalized_messages
+        payload = json.dumps(request, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @property
+    def supports_response_schema(self) -> bool:
+        """Whether query() and stream() forward a response_format to the model."""
+        return self._supports_response_schema
+
+    @property
+    def supports_batch(self) -> bool:
+        return self._batch_provider is not None
+
+    async def batch_query(
+        self,
+        prompts: List[str | List[Dict[str, Any]]],
+        response_format: Dict[str, Any] | None = None,
+    ) -> List[str | None]:
+        """Run the prompts as one provider batch job; replies come back in order.
+
+        Batch jobs are billed at a discount but may take up to the provider's
+        24h completion window, so this suits bulk generation rather than
+        interactive requests. A job still running after task_timeout seconds
+        is cancelled and TimeoutError is raised. An entry is None when the
+        provider reported an error for that request; callers can retry it
+        with query().
+        """
+        if self._batch_provider is None:
+            raise RuntimeError("Batch API is not enabled for this LLM client")
+        provider_kwargs: Dict[str, Any] = {
+            "custom_llm_provider": self._batch_provider,
+            "api_key": self.config.llm.api_key,
+        }
+        if self.config.llm.base_url:
+            provider_kwargs["api_base"] = self.config.llm.base_url
+        if self.config.llm.extra_headers:
+            provider_kwargs["extra_headers"] = self.config.llm.extra_headers
+
+        lines = []
+        for index, messages in enumerate(prompts):
+            normalized_messages = self._tracer.normalize_messages(messages)
+            # Same sampling and length params as query(), so batched replies
+            # match the per-request path and its retries
+            params = self._request_params(normalized_messages, response_format)
+            body: Dict[str, Any] = {
+                key: value
+                for key, value in params.items()
+                if key not in _CLIENT_ONLY_PARAMS
+            }
+            body["model"] = self._batch_model
+            body["messages"] = normalized_messages
+            request = {
+                "custom_id": f"request-{index}",
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": body,
+            }
+            lines.append(json.dumps(request, ensure_ascii=False))
+
+        await self._throttle()
+        input_file = await litellm.acreate_file(
+            file=("aipg_batch.jsonl", "\n".join(lines).encode()),
+            purpose="batch",
+            **provider_kwargs,
+        )
+        await self._throttle()
+        batch = await litellm.acreate_batch(
+            completion_window="24h",
+            endpoint="/v1/chat/completions",
+            input_file_id=input_file.id,
+            **provider_kwargs,
+        )
+        logger.info("Submitted LLM batch %s with %s requests", batch.id, len(prompts))
+        # Callers wait inline (e.g. an API request), so the job gets at most
+        # task_timeout rather than the whole completion window
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.config.task_timeout
+        while batch.status not in {"completed", "failed", "expired", "cancelled"}:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                await self._cancel_batch(batch.id, provider_kwargs)
+                raise TimeoutError(
+                    f"LLM batch {batch.id} did not finish within "
+                    f"{self.config.task_timeout}s"
+                )
+            await asyncio.sleep(
+                min(self.config.llm.batch_poll_interval_seconds, remaining)
+            )
+            batch = await litellm.aretrieve_batch(batch_id=batch.id, **provider_kwargs)
+        if batch.status != "completed":
+            raise RuntimeError(f"LLM batch {batch.id} ended with status {batch.status}")
+
+        replies: List[str | None] = [None] * len(prompts)
+        if batch.output_file_id:
+            output = await litellm.afile_content(
+                file_id=batch.output_file_id, **provider_kwargs
+            )
+            for line in getattr(output, "text", "").splitlines():
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                response = record.get("response") or {}
+                if response.get("status_code") != 200:
+                    continue
+                choices = (response.get("body") or {}).get("choices") or []
+                if choices:
+                    index = int(record["custom_id"].removeprefix("request-"))
+                    replies[index] = (choices[0].get("message") or {}).get("content")
+        return replies
+
+    async def _cancel_batch(self, batch_id: str, provider_kwargs: Dict[str, Any]) -> None:
+        """Cancel an abandoned batch job so the provider stops working on it."""
+        try:
+            await litellm.acancel_batch(batch_id=batch_id, **provider_kwargs)
+        except Exception as e:
+            logger.warning("Failed to cancel LLM batch %s: %s", batch_id, e)
+
+    def _yandex_cache_key(self, y_messages: List[Dict[str, Any]]) -> str:
+        request = {
+            "messages": y_messages,
+            "model": self._yandex_model_id,
+            "version": self._yandex_model_version,
+            "temperature": self.config.llm.temperature,
+        }
+        payload = json.dumps(request, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def max_input_tokens(self) -> int | None:
+        """Context size of the configured model, or None when litellm does not know it."""
+        try:
+            return litellm.get_model_info(self.config.llm.model_name).get(
+                "max_input_tokens"
+            )
+        except Exception:
+            return None
+
+    def count_tokens(self, messages: List[Dict[str, Any]]) -> int:
+        """Estimate the prompt tokens of messages for the configured model."""
+        return litellm.token_counter(
+            model=self.config.llm.model_name, messages=messages
+        )
+
+    def _request_params(
+        self,
+        messages: List[Dict[str, Any]],
+        response_format: Dict[str, Any] | None,
+    ) -> Dict[str, Any]:
+        """completion_params plus the per-request response format and cache key."""
+        extra: Dict[str, Any] = {}
+        if response_format is not None and self._supports_response_schema:
+            extra["response_format"] = response_format
+        if self._supports_prompt_cache_key:
+            system_prompt = next(
+                (m.get("content") for m in messages if m.get("role") == "system"),
+                None,
+            )
+            if isinstance(system_prompt, str):
+                extra["prompt_cache_key"] = _prompt_cache_key(system_prompt)
+        if not extra:
+            return self.completion_params
+        return {**self.completion_params, **extra}
+
+    @staticmethod
+    def _check_param_support(model_name: str, param: str) -> bool:
+        try:
+            model, provider, _, _ = litellm.get_llm_provider(model_name)
+            supported = litellm.get_supported_openai_params(
+                model=model, custom_llm_provider=provider
+            )
+        except Exception:
+            return False
+        return param in (supported or [])
+
+    @staticmethod
+    def _check_response_schema_support(model_name: str) -> bool:
+        try:
+            return litellm.supports_response_schema(model=model_name)
+        except Exception:
+            # Unknown models are treated as unsupported rather than failing startup
+            return False
+
     def _extract_content_from_result(self, result) -> str | None:
         """Extract text content from GPTModelResult.
 
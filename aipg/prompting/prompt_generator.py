@@ -1,11 +1,13 @@
 from abc import ABC, abstractmethod
-from functools import partial
+from functools import lru_cache, partial
 from pathlib import Path
+from typing import Any
 
 from aipg.constants import PACKAGE_PATH
 from aipg.prompting.utils import (
     parse_and_check_json,
     parse_define_topics,
+    parse_llm_ranker_batch_scores,
     parse_llm_ranker_scores,
     parse_project_markdown,
     parse_project_validator_yaml,
@@ -13,8 +15,16 @@ from aipg.prompting.utils import (
 from aipg.sandbox.domain import SandboxResult
 
 
+@lru_cache(maxsize=None)
+def _read_prompt_file(file_path: Path) -> str:
+    # Prompt templates ship with the package and do not change at runtime
+    return file_path.read_text()
+
+
 class PromptGenerator(ABC):
     fields: list[str] = []
+    # Optional structured-output spec passed to LLMClient.query
+    response_format: dict[str, Any] | None = None
 
     def __init__(self):
         self.parser = self.create_parser()
@@ -28,8 +38,7 @@ class PromptGenerator(ABC):
         pass
 
     def load_from_file(self, file_path: str | Path) -> str:
-        file_path = Path(file_path)
-        return file_path.read_text()
+        return _read_prompt_file(Path(file_path))
 
     def get_field_parsing_prompt(self) -> str:
         return (
@@ -73,6 +82,23 @@ class ProjectGenerationPromptGenerator(PromptGenerator):
 
 
 class DefineTopicsPromptGenerator(PromptGenerator):
+    # JSON is valid YAML, so parse_define_topics reads structured replies as is
+    response_format = {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "topics",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "topics": {"type": "array", "items": {"type": "string"}}
+                },
+                "required": ["topics"],
+                "additionalProperties": False,
+            },
+        },
+    }
+
     def __init__(self, comments: list[str]):
         self.comments = comments
         super().__init__()
@@ -148,6 +174,24 @@ class FeedbackPromptGenerator(PromptGenerator):
 
 
 class LLMRankerPromptGenerator(PromptGenerator):
+    # Providers require an object at the schema root, so scores are wrapped;
+    # parse_llm_ranker_scores extracts the embedded array either way
+    response_format = {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "similarity_scores",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "scores": {"type": "array", "items": {"type": "number"}}
+                },
+                "required": ["scores"],
+                "additionalProperties": False,
+            },
+        },
+    }
+
     def __init__(self, topic: str, candidates: list[str]):
         self.topic = topic
         self.candidates = candidates
@@ -160,8 +204,10 @@ class LLMRankerPromptGenerator(PromptGenerator):
         )
 
     def generate_prompt(self) -> str:
+        # str.join materialises generators into a list first, so the list
+        # comprehension is kept; numbering starts at 1 via enumerate instead
         numbered_candidates = "\n".join(
-            [f"{i + 1}. {candidate}" for i, candidate in enumerate(self.candidates)]
+            [f"{i}. {candidate}" for i, candidate in enumerate(self.candidates, 1)]
         )
         return (
             f"[Проблема студента]: {self.topic}"
@@ -173,7 +219,98 @@ class LLMRankerPromptGenerator(PromptGenerator):
         return parse_llm_ranker_scores
 
 
+class BatchLLMRankerPromptGenerator(PromptGenerator):
+    """Ranks the candidates of several topics in one prompt, one group each."""
+
+    response_format = {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "grouped_similarity_scores",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "groups": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "group": {"type": "integer"},
+                                "scores": {
+                                    "type": "array",
+                                    "items": {"type": "number"},
+                                },
+                            },
+                            "required": ["group", "scores"],
+                            "additionalProperties": False,
+                        },
+                    }
+                },
+                "required": ["groups"],
+                "additionalProperties": False,
+            },
+        },
+    }
+
+    def __init__(self, groups: list[tuple[str, list[str]]]):
+        self.groups = groups
+        super().__init__()
+
+    @property
+    def system_prompt(self):
+        return self.load_from_file(
+            Path(PACKAGE_PATH) / "prompting" / "prompts" / "llm_ranker_batch.md"
+        )
+
+    def generate_prompt(self) -> str:
+        sections = []
+        for group, (topic, candidates) in enumerate(self.groups, 1):
+            numbered_candidates = "\n".join(
+                [f"{i}. {candidate}" for i, candidate in enumerate(candidates, 1)]
+            )
+            sections.append(
+                f"[Группа {group}]\n"
+                f"[Проблема студента]: {topic}\n"
+                "[Похожие проблемы]:\n"
+                f"{numbered_candidates}"
+            )
+        return "\n\n".join(sections)
+
+    def create_parser(self):
+        return parse_llm_ranker_batch_scores
+
+
 class ProjectValidatorPromptGenerator(PromptGenerator):
+    # Mirrors ProjectValidationResult; the YAML parser accepts the JSON reply
+    response_format = {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "project_validation",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "is_valid": {"type": "boolean"},
+                    "checks": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "rule_id": {"type": "string"},
+                                "passed": {"type": "boolean"},
+                                "comment": {"type": "string"},
+                            },
+                            "required": ["rule_id", "passed", "comment"],
+                            "additionalProperties": False,
+                        },
+                    },
+                },
+                "required": ["is_valid", "checks"],
+                "additionalProperties": False,
+            },
+        },
+    }
+
     def __init__(self, project_markdown: str):
         self.project_markdown = project_markdown
         super().__init__()
@@ -1,22 +1,94 @@
 import difflib
+import hashlib
 import json
 import logging
 import re
-from typing import Any, Dict, Iterable, Optional
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Iterator, Optional
 
 import json_repair
+import numpy as np
 import yaml
 from pydantic import ValidationError
 
 from aipg.domain import Project, ProjectValidationResult
 from aipg.exceptions import OutputParserException
 
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore
+
 logger = logging.getLogger(__name__)
 
+# libyaml-backed loader is several times faster than the pure-Python one;
+# PyYAML only exposes it when built against libyaml.
+_YAML_SAFE_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+_json_loads = orjson.loads if orjson is not None else json.loads
+
 
 # Pre-compiled regexes for performance
 _MD_HEADER_RE = re.compile(r"^\s{0,3}(#{1,6})\s+(.+?)\s*(?:#+\s*)?$")
 _MD_FENCE_RE = re.compile(r"^\s*([`~]{3,})(.*)$")
+# Candidate fence/header lines for a whole-document finditer sweep; each
+# candidate is confirmed with the per-line regexes above.
+_MD_EVENT_RE = re.compile(
+    r"^(?:(?P<fence>[^\S\n]*[`~]{3})|(?P<header>[^\S\n]{0,3}#))[^\n]*",
+    re.MULTILINE,
+)
+_NON_LF_LINE_BREAK_RE = re.compile("[\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]")
+_LEADING_BLANK_LINES_RE = re.compile(r"\A(?:[^\S\n]*\n)+")
+_TRAILING_BLANK_LINES_RE = re.compile(r"(?:\n[^\S\n]*)+\Z")
+
+# First flat JSON array embedded in free text
+_JSON_ARRAY_RE = re.compile(r"\[[^\]]*\]")
+
+# Parsed projects keyed by a digest of the raw markdown (LRU order)
+_PROJECT_PARSE_CACHE_SIZE = 64
+_PROJECT_PARSE_CACHE: OrderedDict[bytes, Project] = OrderedDict()
+# Projects are also parsed in worker threads (e.g. ChromaDB result decoding)
+_PROJECT_PARSE_CACHE_LOCK = threading.Lock()
+
+_PROJECT_H1_PREFIX = "# Микропроект для углубления темы:"
+_PROJECT_H1_LINE_RE = re.compile(
+    r"^[^\S\n]*" + re.escape(_PROJECT_H1_PREFIX), re.MULTILINE
+)
+
+
+def _find_json_object(text: str) -> Optional[str]:
+    """
+    Return the first balanced ``{...}`` span in text using a single linear scan.
+
+    Braces inside JSON string literals (including escaped quotes) are ignored.
+    If the object is never closed, the remainder of the text from the first
+    ``{`` is returned so that json_repair can still attempt to fix it.
+    """
+    start = text.find("{")
+    if start == -1:
+        return None
+
+    depth = 0
+    in_string = False
+    escaped = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start : i + 1]
+    return text[start:]
 
 
 def parse_json(raw_reply: str) -> Optional[Dict[str, Any]]:
@@ -54,10 +126,9 @@ def parse_json(raw_reply: str) -> Optional[Dict[str, Any]]:
             return reply
 
     # Case 2: Look for JSON object directly in the text
-    json_match = re.search(r"\{.*\}", raw_reply, re.DOTALL)
-    if json_match:
-        reply_str = json_match.group(0).strip()
-        reply = try_json_loads(reply_str)
+    json_object = _find_json_object(raw_reply)
+    if json_object:
+        reply = try_json_loads(json_object.strip())
         if reply is not None:
             return reply
 
@@ -71,11 +142,19 @@ def check_json_values(
     fallback_value: Optional[str],
 ):
     if valid_values is not None:
+        valid_values = list(valid_values)
+        # Most LLM values match a valid value up to case/whitespace; resolve those
+        # with a dict probe and only fall back to fuzzy matching on a miss.
+        exact_matches = {value.lower(): value for value in valid_values}
         for key, parsed_value in parsed_json.items():
             # Currently only support single parsed value
             if isinstance(parsed_value, list) and len(parsed_value) == 1:
                 parsed_value = parsed_value[0]
             if isinstance(parsed_value, str):
+                exact = exact_matches.get(parsed_value.strip().lower())
+                if exact is not None:
+                    parsed_json[key] = exact
+                    continue
                 close_matches = difflib.get_close_matches(parsed_value, valid_values)
             else:
                 logger.warning(
@@ -149,79 +228,67 @@ def parse_markdown_headers(markdown_text: str) -> list[tuple[str, str]]:
     if not markdown_text:
         return []
 
-    lines = markdown_text.splitlines()
+    text = markdown_text
+    if _NON_LF_LINE_BREAK_RE.search(text):
+        # Normalize CRLF/CR (and other str.splitlines breaks) so that slicing
+        # the text matches line-based semantics
+        text = "\n".join(text.splitlines())
 
     sections: list[tuple[str, str]] = []
     current_header: str | None = None
-    current_content_lines: list[str] = []
+    content_start = 0
 
     in_code_fence = False
     fence_char: str = ""
     fence_len: int = 0
 
-    def flush_current_section() -> None:
-        nonlocal current_header, current_content_lines
+    def flush_current_section(content_end: int) -> None:
         if current_header is None:
-            current_content_lines = []
             return
-        # Trim surrounding blank lines for the section content
-        start = 0
-        end = len(current_content_lines)
-        while start < end and current_content_lines[start].strip() == "":
-            start += 1
-        while end > start and current_content_lines[end - 1].strip() == "":
-            end -= 1
-        content = "\n".join(current_content_lines[start:end])
+        content = text[content_start:content_end]
+        if content.strip():
+            # Trim surrounding blank lines for the section content
+            content = _LEADING_BLANK_LINES_RE.sub("", content)
+            content = _TRAILING_BLANK_LINES_RE.sub("", content)
+        else:
+            content = ""
         sections.append((current_header, content))
-        current_header = None
-        current_content_lines = []
 
-    for line in lines:
-        # Detect code fences first; headers inside code blocks must be ignored
-        fence_match = _MD_FENCE_RE.match(line)
-        if fence_match:
-            ticks = fence_match.group(1)
-            char = ticks[0]
-            count = len(ticks)
-            if not in_code_fence:
-                in_code_fence = True
-                fence_char = char
-                fence_len = count
-                # Fence lines are part of the content if we are inside a section
-                if current_header is not None:
-                    current_content_lines.append(line)
-                continue
-            else:
-                # Close only if the closing fence matches the opening kind and length
-                if char == fence_char and count >= fence_len:
+    # Only fence and header candidate lines are visited; regular content lines
+    # are skipped inside the regex engine and later sliced out of the text.
+    for event in _MD_EVENT_RE.finditer(text):
+        line = event.group(0)
+        if event.lastgroup == "fence":
+            # Detect code fences first; headers inside code blocks must be ignored
+            fence_match = _MD_FENCE_RE.match(line)
+            if fence_match:
+                ticks = fence_match.group(1)
+                char = ticks[0]
+                count = len(ticks)
+                if not in_code_fence:
+                    in_code_fence = True
+                    fence_char = char
+                    fence_len = count
+                elif char == fence_char and count >= fence_len:
+                    # Close only if the closing fence matches the opening kind and length
                     in_code_fence = False
                     fence_char = ""
                     fence_len = 0
-                    if current_header is not None:
-                        current_content_lines.append(line)
-                    continue
+            continue
 
         if in_code_fence:
-            if current_header is not None:
-                current_content_lines.append(line)
             # Ignore header detection while in code
             continue
 
         header_match = _MD_HEADER_RE.match(line)
         if header_match:
             # New header starts; flush previous section if any
-            flush_current_section()
-            header_text = header_match.group(2).strip()
-            current_header = header_text
-            current_content_lines = []
-            continue
-
-        # Regular content line (only record if we have already seen a header)
-        if current_header is not None:
-            current_content_lines.append(line)
+            flush_current_section(event.start())
+            current_header = header_match.group(2).strip()
+            content_start = event.end() + 1
 
     # Flush the last section at EOF
-    flush_current_section()
+    flush_current_section(len(text))
 
     return sections
 
@@ -266,7 +333,7 @@ def extract_code_block(
     fence_char: str = ""
     fence_len: int = 0
     language_hint: str | None = None
-    buffer: list[str] = []
+    start_idx: int = 0
 
     first_block_fenced: str | None = None
 
@@ -277,7 +344,7 @@ def extract_code_block(
         lang_suffix = (" " + lang) if lang else ""
         return f"{ticks}{lang_suffix}\n{code_text}\n{ticks}"
 
-    for line in lines:
+    for idx, line in enumerate(lines):
         fence_match = _MD_FENCE_RE.match(line)
         if fence_match:
             ticks = fence_match.group(1)
@@ -286,18 +353,18 @@ def extract_code_block(
             rest = fence_match.group(2).strip()
 
             if not in_fence:
-                # Opening fence
+                # Opening fence; block content starts on the next line
                 in_fence = True
                 fence_char = char
                 fence_len = count
                 language_hint = rest.split()[0] if rest else None
-                buffer = []
+                start_idx = idx + 1
                 continue
             else:
                 # Potential closing fence
                 if char == fence_char and count >= fence_len:
-                    # Close current block
-                    code_text = "\n".join(buffer)
+                    # Close current block with a single slice-and-join
+                    code_text = "\n".join(lines[start_idx:idx])
                     ticks_str = fence_char * fence_len
 
                     if preferred:
@@ -317,7 +384,6 @@ def extract_code_block(
                         fence_char = ""
                         fence_len = 0
                         language_hint = None
-                        buffer = []
                         continue
                     else:
                         # No preference: return the first encountered block immediately
@@ -331,9 +397,6 @@ def extract_code_block(
                             )
                         )
 
-        if in_fence:
-            buffer.append(line)
-
     # If preferences were provided but no match found: None. Otherwise, return
     # the first block (which would have been returned early already).
     return None if preferred else first_block_fenced
@@ -479,10 +542,31 @@ def parse_project_markdown(raw_markdown: str) -> Project:
     Parse a project markdown document into a Project model.
 
     Fast path notes:
+    - Results are memoized on a BLAKE2b digest of the input, so retries and
+      validation passes that see the same markdown skip re-parsing. Callers
+      receive a copy and may mutate it freely.
     - Pre-strips an outer ```markdown fenced block to allow header scanning.
     - Single pass header parsing using parse_markdown_headers (ignores code fences correctly).
     - Uses optimized code/expected extractors.
     """
+    key = hashlib.blake2b(raw_markdown.encode("utf-8"), digest_size=16).digest()
+    with _PROJECT_PARSE_CACHE_LOCK:
+        cached = _PROJECT_PARSE_CACHE.get(key)
+        if cached is not None:
+            _PROJECT_PARSE_CACHE.move_to_end(key)
+    if cached is not None:
+        return cached.model_copy()
+
+    # Parse outside the lock; a concurrent miss just parses twice
+    project = _parse_project_markdown_uncached(raw_markdown)
+    with _PROJECT_PARSE_CACHE_LOCK:
+        _PROJECT_PARSE_CACHE[key] = project
+        if len(_PROJECT_PARSE_CACHE) > _PROJECT_PARSE_CACHE_SIZE:
+            _PROJECT_PARSE_CACHE.popitem(last=False)
+    return project.model_copy()
+
+
+def _parse_project_markdown_uncached(raw_markdown: str) -> Project:
     if not raw_markdown or not raw_markdown.strip():
         raise OutputParserException(
             "Empty markdown provided",
@@ -538,15 +622,13 @@ def parse_project_markdown(raw_markdown: str) -> Project:
 
     def _strip_conversational_text(text: str) -> str:
         """Remove any conversational text before the actual markdown content."""
-        if not text:
+        if not text or text.startswith(_PROJECT_H1_PREFIX):
             return text
 
-        lines = text.splitlines()
-        # Look for the first line that starts with "# Микропроект для углубления темы:"
-        for i, line in enumerate(lines):
-            if line.strip().startswith("# Микропроект для углубления темы:"):
-                # Return everything from this line onwards
-                return "\n".join(lines[i:])
+        # Jump straight to the first line starting with the project H1 header
+        m = _PROJECT_H1_LINE_RE.search(text)
+        if m:
+            return text[m.start() :]
 
         # If no such header found, return original text
         return text
@@ -628,8 +710,8 @@ def parse_project_markdown(raw_markdown: str) -> Project:
         fence_char = ""
         fence_len = 0
         lang_hint: Optional[str] = None
-        buf: list[str] = []
-        for line in lines:
+        start_idx = 0
+        for idx, line in enumerate(lines):
             m = _MD_FENCE_RE.match(line)
             if m:
                 ticks = m.group(1)
@@ -641,15 +723,13 @@ def parse_project_markdown(raw_markdown: str) -> Project:
                     fence_char = char
                     fence_len = count
                     lang_hint = rest.split()[0] if rest else None
-                    buf = []
+                    start_idx = idx + 1
                     continue
                 else:
                     if char == fence_char and count >= fence_len:
-                        code_text = "\n".join(buf).rstrip("\n")
+                        code_text = "\n".join(lines[start_idx:idx]).rstrip("\n")
                         return lang_hint, code_text
                     # shorter/other fence inside content; treat as content
-            if in_fence:
-                buf.append(line)
         return None, None
 
     # Expert solution: require a fenced code block (any language)
@@ -694,7 +774,9 @@ def parse_project_markdown(raw_markdown: str) -> Project:
     )
 
 
-def parse_llm_ranker_scores(raw_reply: str) -> list[float]:
+def parse_llm_ranker_scores(
+    raw_reply: str, expected_count: int | None = None
+) -> list[float]:
     """
     Parse LLM ranker response and return a list of similarity scores.
 
@@ -704,27 +786,41 @@ def parse_llm_ranker_scores(raw_reply: str) -> list[float]:
     - A plain JSON array (fallback)
 
     Returns a list of float scores in [0,1] range.
+    When ``expected_count`` is given, the number of scores is checked too.
     Raises OutputParserException for invalid JSON or unsupported structures.
     """
     if not raw_reply or not raw_reply.strip():
+        if expected_count:
+            raise OutputParserException(
+                f"Expected {expected_count} scores, got 0",
+                expected=f"JSON array of {expected_count} floats",
+                got=raw_reply,
+            )
         return []
 
-    # Prefer extracting a JSON fenced code block; fall back to first fenced block; then raw text
-    code_text = (
-        extract_code_block(raw_reply, prefer_languages=("json",), return_fenced=False)
-        or extract_code_block(raw_reply, return_fenced=False)
-        or raw_reply
-    )
+    stripped = raw_reply.strip()
+    if stripped.startswith("[") and stripped.endswith("]"):
+        # Bare JSON array, the common case: no fences to look for
+        code_text = stripped
+    else:
+        # Prefer extracting a JSON fenced code block; fall back to first fenced block; then raw text
+        code_text = (
+            extract_code_block(
+                raw_reply, prefer_languages=("json",), return_fenced=False
+            )
+            or extract_code_block(raw_reply, return_fenced=False)
+            or raw_reply
+        )
 
     # Try to extract JSON array from text if it's not pure JSON
     if not code_text.strip().startswith("["):
         # Look for a JSON array at the start of the text or after some text
-        json_match = re.search(r"\[[^\]]*\]", code_text)
+        json_match = _JSON_ARRAY_RE.search(code_text)
         if json_match:
             code_text = json_match.group(0)
 
     try:
-        loaded = json.loads(code_text)
+        loaded = _json_loads(code_text)
     except json.JSONDecodeError as e:
         raise OutputParserException(
             "Failed to parse JSON",
@@ -741,27 +837,111 @@ def parse_llm_ranker_scores(raw_reply: str) -> list[float]:
             got=str(type(loaded)),
         )
 
-    # Convert to floats and validate range
-    scores: list[float] = []
-    for i, item in enumerate(loaded):
-        try:
-            score = float(item)
-            if not (0.0 <= score <= 1.0):
-                raise OutputParserException(
-                    f"Score out of range at index {i}",
-                    expected="Float between 0.0 and 1.0",
-                    got=str(score),
-                )
-            scores.append(score)
-        except (ValueError, TypeError) as e:
+    return _validate_scores(loaded, expected_count)
+
+
+def _validate_scores(loaded: Any, expected_count: int | None) -> list[float]:
+    """Check a decoded JSON array holds expected_count floats in [0, 1]."""
+    # Convert to floats and validate range in a single vectorized pass
+    try:
+        scores = np.asarray(loaded, dtype=np.float64)
+    except (ValueError, TypeError) as e:
+        raise OutputParserException(
+            "Invalid score value",
+            expected="Float between 0.0 and 1.0",
+            got=str(loaded),
+            details={"error": str(e)},
+        ) from e
+    if scores.ndim != 1:
+        raise OutputParserException(
+            "Expected a flat JSON array",
+            expected="JSON array of floats, e.g. [0.8, 0.2, 0.9]",
+            got=str(loaded),
+        )
+    if expected_count is not None and scores.size != expected_count:
+        raise OutputParserException(
+            f"Expected {expected_count} scores, got {scores.size}",
+            expected=f"JSON array of {expected_count} floats",
+            got=str(loaded),
+        )
+
+    # NaN (e.g. from null) fails both comparisons and is reported as invalid too
+    invalid = ~((scores >= 0.0) & (scores <= 1.0))
+    if invalid.any():
+        i = int(np.argmax(invalid))
+        raise OutputParserException(
+            f"Invalid score at index {i}",
+            expected="Float between 0.0 and 1.0",
+            got=str(loaded[i]),
+        )
+
+    return scores.tolist()
+
+
+def parse_llm_ranker_batch_scores(
+    raw_reply: str, expected_counts: list[int]
+) -> dict[int, list[float]]:
+    """
+    Parse a batched LLM ranker response into scores per group.
+
+    The reply is a JSON object ``{"groups": [{"group": 1, "scores": [...]}]}``
+    with groups numbered from 1 as in the prompt. Returns a mapping from the
+    0-based group index to its scores; every group must be present with
+    ``expected_counts[i]`` scores in [0,1].
+    Raises OutputParserException for anything else.
+    """
+    example = '{"groups": [{"group": 1, "scores": [0.8, 0.2]}]}'
+    parsed = parse_json(raw_reply or "")
+    groups = parsed.get("groups") if parsed else None
+    if not isinstance(groups, list):
+        raise OutputParserException(
+            "Expected a JSON object with a 'groups' array",
+            expected=example,
+            got=(raw_reply or "")[:500],
+        )
+
+    result: dict[int, list[float]] = {}
+    for entry in groups:
+        if not isinstance(entry, dict) or not isinstance(entry.get("group"), int):
+            raise OutputParserException(
+                "Invalid group entry", expected=example, got=str(entry)[:500]
+            )
+        index = entry["group"] - 1
+        if not 0 <= index < len(expected_counts):
+            raise OutputParserException(
+                f"Unknown group {entry['group']}",
+                expected=f"Groups numbered 1 to {len(expected_counts)}",
+                got=str(entry)[:500],
+            )
+        scores = entry.get("scores")
+        if not isinstance(scores, list):
             raise OutputParserException(
-                f"Invalid score at index {i}",
-                expected="Float between 0.0 and 1.0",
-                got=str(item),
-                details={"error": str(e)},
-            ) from e
+                f"Expected a scores array for group {entry['group']}",
+                expected=example,
+                got=str(entry)[:500],
+            )
+        result[index] = _validate_scores(scores, expected_counts[index])
+
+    missing = [i + 1 for i in range(len(expected_counts)) if i not in result]
+    if missing:
+        raise OutputParserException(
+            f"Missing scores for groups {missing}",
+            expected=f"One entry for each of the {len(expected_counts)} groups",
+            got=(raw_reply or "")[:500],
+        )
+    return result
 
-    return scores
+
+def _iter_topic_strings(items: list) -> Iterator[str]:
+    """Yield stripped, non-empty string entries, warning about non-string ones."""
+    for item in items:
+        if isinstance(item, str):
+            if topic := item.strip():
+                yield topic
+        else:
+            logger.warning(
+                "Ignoring non-string topic entry: %r (type=%s)", item, type(item)
+            )
 
 
 def parse_define_topics(raw_reply: str) -> list[str]:
@@ -789,7 +969,7 @@ def parse_define_topics(raw_reply: str) -> list[str]:
     )
 
     try:
-        loaded = yaml.safe_load(code_text)
+        loaded = yaml.load(code_text, Loader=_YAML_SAFE_LOADER)
     except yaml.YAMLError as e:
         raise OutputParserException(
             "Failed to parse YAML",
@@ -821,20 +1001,7 @@ def parse_define_topics(raw_reply: str) -> list[str]:
         )
 
     # Normalize: keep only non-empty strings, strip whitespace, de-duplicate preserving order
-    normalized: list[str] = []
-    seen: set[str] = set()
-    for item in topics_value:
-        if isinstance(item, str):
-            topic = item.strip()
-            if topic and topic not in seen:
-                seen.add(topic)
-                normalized.append(topic)
-        else:
-            logger.warning(
-                "Ignoring non-string topic entry: %r (type=%s)", item, type(item)
-            )
-
-    return normalized
+    return list(dict.fromkeys(_iter_topic_strings(topics_value)))
 
 
 def parse_project_validator_yaml(raw_reply: str) -> ProjectValidationResult:
@@ -868,7 +1035,7 @@ def parse_project_validator_yaml(raw_reply: str) -> ProjectValidationResult:
     )
 
     try:
-        loaded = yaml.safe_load(code_text)
+        loaded = yaml.load(code_text, Loader=_YAML_SAFE_LOADER)
     except yaml.YAMLError as e:
         raise OutputParserException(
             "Failed to parse YAML",
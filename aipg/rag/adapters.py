@@ -1,122 +1,239 @@
+import asyncio
+import hashlib
+import importlib.util
+import json
 import logging
-from typing import Any, List, Mapping, Optional, Sequence, Union
-
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple, Union
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from aipg.domain import Project
+from aipg.event_loop import BatchQueue
 from aipg.exceptions import OutputParserException
 from aipg.prompting.utils import parse_project_markdown
-from aipg.rag.ports import EmbeddingPort, RetrievedItem, VectorStorePort
+from aipg.rag.ports import EmbeddingPort, Embeddings, RetrievedItem, VectorStorePort
 
 try:
-    import chromadb
+    import diskcache  # type: ignore[import-untyped]
 except ImportError:
-    chromadb = None  # type: ignore
+    diskcache = None
 
 try:
+    import httpx
     from google import genai
+    from google.genai import types as genai_types
 except ImportError:
     genai = None  # type: ignore
 
 logger = logging.getLogger(__name__)
 
+_PROJECT_CACHE_SIZE = 2048
+
+# A BatchingEmbedder caller's texts and the future its rows are delivered to
+_PendingEmbedding = Tuple[List[str], asyncio.Future]
+
+# Vectors are L2-normalised by the adapter on add and query, so inner product
+# ranks like cosine without Chroma normalising on every call. Collections
+# created earlier keep their cosine space, which is equivalent for unit vectors.
+_COLLECTION_METADATA = {"hnsw:space": "ip"}
+
+# Persistent clients and collections shared by every adapter in the process,
+# keyed by persist_dir and (persist_dir, collection_name). A PersistentClient
+# loads its HNSW index into memory, so building one per adapter is costly.
+# The lock is a threading.Lock because creation runs in asyncio.to_thread
+# workers, which an asyncio.Lock would not serialise.
+_CLIENT_CACHE: Dict[str, Any] = {}
+_COLLECTION_CACHE: Dict[Tuple[str, str], Any] = {}
+_CACHE_LOCK = threading.Lock()
+
+
+def _import_chromadb() -> Any:
+    # Deferred: importing chromadb is slow and only needed once the store is used
+    import chromadb
+
+    return chromadb
+
+
+def _unit_rows(embeddings: Any) -> np.ndarray:
+    """Return embeddings as an (N, D) float32 array of unit-length rows."""
+    rows = np.asarray(embeddings, dtype=np.float32)
+    if rows.ndim == 1:
+        rows = rows.reshape(1, -1)
+    norms = np.linalg.norm(rows, axis=1, keepdims=True)
+    norms[norms == 0.0] = 1.0
+    return rows / norms
+
+
+def _rows_match(embeddings: Embeddings, count: int) -> bool:
+    """Whether an embedder returned one row per text; logs a warning if not.
+
+    Mismatched rows can no longer be matched to texts, so callers report a
+    failed call (an empty array) instead.
+    """
+    if len(embeddings) == count:
+        return True
+    logger.warning("Embedder returned %d vectors for %d texts", len(embeddings), count)
+    return False
+
+
+def _decode_project(project_md: str, project_json: Any) -> Project:
+    """Build a Project from its stored JSON fields, parsing the markdown as fallback.
+
+    Rows saved before the fields were stored only carry ``project_md``.
+    """
+    if isinstance(project_json, str):
+        try:
+            return Project.model_validate(
+                {**json.loads(project_json), "raw_markdown": project_md}
+            )
+        except (ValueError, TypeError) as e:
+            logger.warning("Invalid stored project fields, parsing markdown: %s", e)
+    return parse_project_markdown(project_md)
+
 
 class ChromaDbAdapter(VectorStorePort):
-    def __init__(self, collection_name: str, persist_dir: Optional[str] = None) -> None:
-        if chromadb is None:
+    def __init__(
+        self,
+        collection_name: str,
+        persist_dir: Optional[str] = None,
+        url: Optional[str] = None,
+        hnsw_params: Optional[Mapping[str, int]] = None,
+    ) -> None:
+        if importlib.util.find_spec("chromadb") is None:
             raise ImportError("chromadb is not installed")
+        if persist_dir and url:
+            raise ValueError("Pass either persist_dir or url, not both")
 
         self.collection_name = collection_name
         self.persist_dir = persist_dir
+        # Chroma server for the async HTTP client, e.g. "http://localhost:8000"
+        self.url = url
+        # HNSW index settings (e.g. {"search_ef": 64, "M": 32}), applied when
+        # the collection is created; existing collections keep their own
+        self.collection_metadata = {
+            **_COLLECTION_METADATA,
+            **{f"hnsw:{name}": value for name, value in (hnsw_params or {}).items()},
+        }
         self._client = None
         self._collection = None
+        # Taken only on a cold start; warm calls return before reaching it
+        self._init_lock = asyncio.Lock()
+        # Parsed projects keyed by row id (LRU order); ids are content hashes
+        # and Chroma never overwrites an existing id on add, so entries stay valid
+        self._project_cache: OrderedDict[str, Project] = OrderedDict()
+        # Results are decoded in worker threads, which share the cache
+        self._project_cache_lock = threading.Lock()
+
+    def _create_persistent_client(self):
+        chromadb = _import_chromadb()
+        try:
+            return chromadb.PersistentClient(path=self.persist_dir)
+        except Exception as e:
+            logger.error(f"Failed to create ChromaDB client: {e}")
+            # If the database is corrupted, try to clear it and recreate
+            if (
+                "hnsw segment reader" in str(e).lower()
+                or "nothing found on disk" in str(e).lower()
+            ):
+                logger.warning(
+                    "Detected ChromaDB corruption, attempting to clear cache..."
+                )
+                chroma_path = Path(self.persist_dir)
+                if chroma_path.exists():
+                    # Create backup
+                    backup_path = (
+                        chroma_path.parent / f"{chroma_path.name}_corrupted_backup"
+                    )
+                    if not backup_path.exists():
+                        shutil.copytree(chroma_path, backup_path)
+                        logger.info(
+                            f"Created backup of corrupted cache at: {backup_path}"
+                        )
 
-    async def _get_client(self):
-        """Get or create the async client."""
-        if self._client is None:
+                    # Clear the corrupted cache
+                    shutil.rmtree(chroma_path)
+                    chroma_path.mkdir(parents=True, exist_ok=True)
+                    logger.info("Cleared corrupted ChromaDB cache")
+
+                    # Try again with fresh cache
+                    return chromadb.PersistentClient(path=self.persist_dir)
+            raise
+
+    def _get_sync_collection(self):
+        """Fetch the shared persistent client and collection, creating them once."""
+        assert self.persist_dir is not None
+        with _CACHE_LOCK:
+            client = _CLIENT_CACHE.get(self.persist_dir)
+            if client is None:
+                client = self._create_persistent_client()
+                _CLIENT_CACHE[self.persist_dir] = client
+            key = (self.persist_dir, self.collection_name)
+            collection = _COLLECTION_CACHE.get(key)
+            if collection is None:
+                collection = client.get_or_create_collection(
+                    name=self.collection_name, metadata=self.collection_metadata
+                )
+                _COLLECTION_CACHE[key] = collection
+            self._client = client
+            self._collection = collection
+            return collection
+
+    async def _initialize(self) -> None:
+        """Create the client and collection once, even under concurrent first calls."""
+        async with self._init_lock:
+            if self._collection is not None:
+                return
             if self.persist_dir:
                 # For persistent storage, we still need to use the sync client
                 # as AsyncHttpClient doesn't support local persistence yet
-                import asyncio
-                from concurrent.futures import ThreadPoolExecutor
-
-                def create_sync_client():
-                    try:
-                        return chromadb.PersistentClient(path=self.persist_dir)
-                    except Exception as e:
-                        logger.error(f"Failed to create ChromaDB client: {e}")
-                        # If the database is corrupted, try to clear it and recreate
-                        if (
-                            "hnsw segment reader" in str(e).lower()
-                            or "nothing found on disk" in str(e).lower()
-                        ):
-                            logger.warning(
-                                "Detected ChromaDB corruption, attempting to clear cache..."
-                            )
-                            import shutil
-                            from pathlib import Path
-
-                            chroma_path = Path(self.persist_dir)
-                            if chroma_path.exists():
-                                # Create backup
-                                backup_path = (
-                                    chroma_path.parent
-                                    / f"{chroma_path.name}_corrupted_backup"
-                                )
-                                if not backup_path.exists():
-                                    shutil.copytree(chroma_path, backup_path)
-                                    logger.info(
-                                        f"Created backup of corrupted cache at: {backup_path}"
-                                    )
-
-                                # Clear the corrupted cache
-                                shutil.rmtree(chroma_path)
-                                chroma_path.mkdir(parents=True, exist_ok=True)
-                                logger.info("Cleared corrupted ChromaDB cache")
-
-                                # Try again with fresh cache
-                                return chromadb.PersistentClient(path=self.persist_dir)
-                        raise
-
-                loop = asyncio.get_running_loop()
-                with ThreadPoolExecutor() as executor:
-                    sync_client = await loop.run_in_executor(
-                        executor, create_sync_client
-                    )
-                self._client = sync_client
+                await asyncio.to_thread(self._get_sync_collection)
             else:
                 # Use AsyncHttpClient for remote connections
-                self._client = await chromadb.AsyncHttpClient()
+                client = await _import_chromadb().AsyncHttpClient(
+                    **self._http_client_args()
+                )
+                self._collection = await client.get_or_create_collection(
+                    name=self.collection_name, metadata=self.collection_metadata
+                )
+                self._client = client
+
+    def _http_client_args(self) -> Dict[str, Any]:
+        if not self.url:
+            return {}
+        parsed = urlsplit(self.url)
+        ssl = parsed.scheme == "https"
+        return {
+            "host": parsed.hostname or "localhost",
+            "port": parsed.port or (443 if ssl else 8000),
+            "ssl": ssl,
+        }
+
+    async def _get_client(self):
+        """Get or create the client."""
+        if self._client is None:
+            await self._initialize()
         return self._client
 
     async def _get_collection(self):
         """Get or create the collection."""
         if self._collection is None:
-            client = await self._get_client()
-            if self.persist_dir:
-                # For sync client, run in executor
-                import asyncio
-                from concurrent.futures import ThreadPoolExecutor
-
-                def get_collection():
-                    return client.get_or_create_collection(
-                        name=self.collection_name, metadata={"hnsw:space": "cosine"}
-                    )
-
-                loop = asyncio.get_running_loop()
-                with ThreadPoolExecutor() as executor:
-                    self._collection = await loop.run_in_executor(
-                        executor, get_collection
-                    )
-            else:
-                # For async client
-                self._collection = await client.get_or_create_collection(
-                    name=self.collection_name, metadata={"hnsw:space": "cosine"}
-                )
+            await self._initialize()
         return self._collection
 
+    async def warm_up(self) -> None:
+        await self._get_collection()
+
     async def add(
         self,
-        ids: Sequence[str],
-        embeddings: Sequence[Sequence[float]],
-        metadatas: Sequence[Mapping[str, Union[str, int, float, bool]]],
+        ids: List[str],
+        embeddings: Union[Sequence[Sequence[float]], np.ndarray],
+        metadatas: List[Dict[str, Any]],
     ) -> None:
         # Validate that all sequences have the same length
         ids_len = len(ids)
@@ -129,83 +246,319 @@ class ChromaDbAdapter(VectorStorePort):
                 "All sequences must have the same length."
             )
 
+        # ids and metadatas go to Chroma as-is; embeddings become one float32 array
+        embeddings_arg = _unit_rows(embeddings)
+
         collection = await self._get_collection()
 
         if self.persist_dir:
-            # For sync client, run in executor
-            import asyncio
-            from concurrent.futures import ThreadPoolExecutor
-
-            def add_to_collection():
-                collection.add(
-                    ids=list(ids),
-                    embeddings=list(embeddings),
-                    metadatas=list(metadatas),
-                )
-
-            loop = asyncio.get_running_loop()
-            with ThreadPoolExecutor() as executor:
-                await loop.run_in_executor(executor, add_to_collection)
+            # For sync client, run in a worker thread
+            await asyncio.to_thread(
+                collection.add,
+                ids=ids,
+                embeddings=embeddings_arg,
+                metadatas=metadatas,
+            )
         else:
             # For async client
             await collection.add(
-                ids=list(ids), embeddings=list(embeddings), metadatas=list(metadatas)
+                ids=ids, embeddings=embeddings_arg, metadatas=metadatas
             )
 
-    async def query(self, embedding: List[float], k: int) -> List[RetrievedItem]:
+    async def add_arrays(
+        self,
+        ids: List[str],
+        embeddings: np.ndarray,
+        metadatas: List[Dict[str, Any]],
+    ) -> None:
+        """Add rows from an (N, D) embedding matrix without converting it to lists."""
+        if embeddings.ndim != 2:
+            raise ValueError(
+                f"Expected a 2-D embedding matrix, got shape {embeddings.shape}"
+            )
+        await self.add(ids=ids, embeddings=embeddings, metadatas=metadatas)
+
+    async def query(
+        self, embedding: Union[Sequence[float], np.ndarray], k: int
+    ) -> List[RetrievedItem]:
+        results = await self.query_batch([embedding], k)
+        return results[0] if results else []
+
+    async def query_batch(
+        self,
+        embeddings: Union[Sequence[Union[Sequence[float], np.ndarray]], np.ndarray],
+        k: int,
+    ) -> List[List[RetrievedItem]]:
+        """Run all queries in a single Chroma call, one result list per embedding."""
+        if len(embeddings) == 0:
+            return []
         collection = await self._get_collection()
+        query_embeddings = _unit_rows(embeddings)
 
-        if self.persist_dir:
-            # For sync client, run in executor
-            import asyncio
-            from concurrent.futures import ThreadPoolExecutor
+        n_queries = len(query_embeddings)
 
-            def query_collection():
-                return collection.query(
-                    query_embeddings=[embedding],
+        if self.persist_dir:
+            # For sync client, query and decode in the same worker thread
+            def query_collection() -> List[List[RetrievedItem]]:
+                res = collection.query(
+                    query_embeddings=query_embeddings,
                     n_results=k,
-                    include=["metadatas"],
+                    include=["metadatas", "distances"],
                 )
+                return self._to_results(res, n_queries)
 
-            loop = asyncio.get_running_loop()
-            with ThreadPoolExecutor() as executor:
-                res = await loop.run_in_executor(executor, query_collection)
-        else:
-            # For async client
-            res = await collection.query(
-                query_embeddings=[embedding],
-                n_results=k,
-                include=["metadatas"],
-            )
+            return await asyncio.to_thread(query_collection)
 
-        items: List[RetrievedItem] = []
+        # For async client; decoding projects is CPU work, keep it off the loop
+        res = await collection.query(
+            query_embeddings=query_embeddings,
+            n_results=k,
+            include=["metadatas", "distances"],
+        )
+        return await asyncio.to_thread(self._to_results, res, n_queries)
+
+    def _to_results(self, res: Any, n_queries: int) -> List[List[RetrievedItem]]:
+        ids = res.get("ids") or []
         metadatas = res.get("metadatas") or []
-        if metadatas:
-            for meta in metadatas[0]:
-                topic = meta.get("topic", "")
-                project_md = meta.get("project_md", "")
-
-                # Parse raw markdown to reconstruct Project
-                if project_md and isinstance(project_md, str):
-                    try:
-                        micro_project = parse_project_markdown(project_md)
-                    except OutputParserException as e:
-                        # Skip items that can't be parsed
-                        logger.warning(
-                            f"Failed to parse raw markdown for topic '{topic}': {e}"
-                        )
-                        continue
-                else:
-                    continue
-
-                items.append(
-                    RetrievedItem(
-                        topic=str(topic),
-                        micro_project=micro_project,
-                        metadata=dict(meta) if meta else None,
-                    )
-                )
-        return items
+        distances = res.get("distances") or [None] * len(ids)
+        results = [
+            self._to_retrieved_items(row_ids, row, row_distances)
+            for row_ids, row, row_distances in zip(ids, metadatas, distances)
+        ]
+        # Chroma returns one row per query; pad in case it returned nothing
+        results.extend([] for _ in range(n_queries - len(results)))
+        return results
+
+    def _parse_row_project(
+        self, row_id: str, project_md: str, project_json: Any = None
+    ) -> Project:
+        cache = self._project_cache
+        with self._project_cache_lock:
+            project = cache.get(row_id)
+            if project is not None:
+                cache.move_to_end(row_id)
+        if project is None:
+            # Decode outside the lock; a concurrent miss just decodes twice
+            project = _decode_project(project_md, project_json)
+            with self._project_cache_lock:
+                cache[row_id] = project
+                if len(cache) > _PROJECT_CACHE_SIZE:
+                    cache.popitem(last=False)
+        return project.model_copy()
+
+    def _row_project(self, row_id: str, meta: Mapping[str, Any]) -> Optional[Project]:
+        """Decode a row's project, or None if the row must be skipped."""
+        # save() always writes topic and project_md as strings
+        project_md = meta.get("project_md", "")
+        if not project_md:
+            return None
+
+        # Rebuild Project from stored fields, or parse the raw markdown
+        try:
+            return self._parse_row_project(row_id, project_md, meta.get("project_json"))
+        except OutputParserException as e:
+            # Skip items that can't be parsed
+            logger.warning(
+                "Failed to parse raw markdown for topic %r: %s", meta.get("topic", ""), e
+            )
+            return None
+
+    def _to_retrieved_items(
+        self,
+        ids: Sequence[str],
+        metadatas: Sequence[Mapping[str, Any]],
+        distances: Optional[Sequence[float]] = None,
+    ) -> List[RetrievedItem]:
+        # Both the "ip" and "cosine" spaces report 1 - cosine for unit vectors
+        similarities: Sequence[Optional[float]] = (
+            [1.0 - float(d) for d in distances] if distances else [None] * len(ids)
+        )
+        return [
+            RetrievedItem(
+                topic=meta.get("topic", ""),
+                micro_project=micro_project,
+                # Read-only view instead of a per-item copy
+                metadata=MappingProxyType(meta),
+                similarity=similarity,
+            )
+            for row_id, meta, similarity in zip(ids, metadatas, similarities)
+            if (micro_project := self._row_project(row_id, meta)) is not None
+        ]
+
+
+class CachedEmbedder(EmbeddingPort):
+    """LRU cache in front of another embedder, keyed by a hash of each text.
+
+    Topics are embedded on retrieval and again on save, so repeats are common;
+    only cache misses reach the wrapped embedder, deduplicated within a call.
+    With ``persist_dir`` set, vectors are also kept in an on-disk diskcache
+    store, so they survive restarts.
+    """
+
+    def __init__(
+        self,
+        embedder: EmbeddingPort,
+        cache_size: int = 4096,
+        persist_dir: Optional[str] = None,
+    ) -> None:
+        self.embedder = embedder
+        self.cache_size = cache_size
+        self._cache: OrderedDict[bytes, np.ndarray] = OrderedDict()
+        self._disk: Any = None
+        if persist_dir:
+            if diskcache is None:
+                raise ImportError("diskcache is not installed")
+            self._disk = diskcache.Cache(persist_dir)
+
+    async def embedding_processor(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        cache = self._cache
+        keys = [
+            hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+            for text in texts
+        ]
+        vectors: List[Optional[np.ndarray]] = [None] * len(texts)
+        # Cache misses grouped by key in first-seen order, so duplicates embed once
+        missing: Dict[bytes, List[int]] = {}
+        for i, key in enumerate(keys):
+            cached = cache.get(key)
+            if cached is None:
+                missing.setdefault(key, []).append(i)
+            else:
+                cache.move_to_end(key)
+                vectors[i] = cached
+
+        if missing and self._disk is not None:
+            stored = await asyncio.to_thread(self._disk_get_many, list(missing))
+            for key, vector in stored.items():
+                for i in missing.pop(key):
+                    vectors[i] = vector
+                self._remember(key, vector)
+
+        if missing:
+            fresh = await self.embedder.embedding_processor(
+                [texts[positions[0]] for positions in missing.values()]
+            )
+            if not _rows_match(fresh, len(missing)):
+                return np.empty((0, 0), dtype=np.float32)
+            new_vectors: Dict[bytes, np.ndarray] = {}
+            for (key, positions), values in zip(missing.items(), fresh):
+                vector = np.asarray(values, dtype=np.float32)
+                for i in positions:
+                    vectors[i] = vector
+                self._remember(key, vector)
+                new_vectors[key] = vector
+            if self._disk is not None:
+                await asyncio.to_thread(self._disk_set_many, new_vectors)
+
+        # Every slot is filled: either a cache hit or a fresh vector
+        return np.stack(vectors)  # type: ignore[arg-type]
+
+    async def aclose(self) -> None:
+        await self.embedder.aclose()
+
+    def _remember(self, key: bytes, vector: np.ndarray) -> None:
+        if self.cache_size <= 0:
+            return
+        cache = self._cache
+        cache[key] = vector
+        while len(cache) > self.cache_size:
+            cache.popitem(last=False)
+
+    def _disk_get_many(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+        stored: Dict[bytes, np.ndarray] = {}
+        for key in keys:
+            raw = self._disk.get(key)
+            if raw is not None:
+                stored[key] = np.frombuffer(raw, dtype=np.float32)
+        return stored
+
+    def _disk_set_many(self, vectors: Dict[bytes, np.ndarray]) -> None:
+        # One SQLite transaction for the whole batch
+        with self._disk.transact():
+            for key, vector in vectors.items():
+                self._disk.set(key, vector.tobytes())
+
+
+class BatchingEmbedder(EmbeddingPort):
+    """Coalesces concurrent calls into one call to the wrapped embedder.
+
+    Calls arriving within ``max_wait_ms`` of each other share one request,
+    up to ``max_batch_size`` texts; each caller gets back its own rows.
+    """
+
+    def __init__(
+        self,
+        embedder: EmbeddingPort,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+    ) -> None:
+        if max_batch_size <= 0:
+            raise ValueError(
+                "max_batch_size must be positive (got %d)" % max_batch_size
+            )
+        self.embedder = embedder
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._pending: BatchQueue[_PendingEmbedding] = BatchQueue(
+            self._dispatch,
+            max_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+            name="Embedding batcher",
+            size=lambda item: len(item[0]),
+        )
+        self._flush_tasks: set[asyncio.Task] = set()
+
+    async def embedding_processor(self, texts: List[str]) -> np.ndarray:
+        if self.max_wait_ms <= 0 or len(texts) >= self.max_batch_size:
+            embeddings = await self.embedder.embedding_processor(texts)
+            return np.asarray(embeddings, dtype=np.float32)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._pending.put((texts, future))
+        return await future
+
+    async def aclose(self) -> None:
+        await self._pending.aclose()
+        loop = asyncio.get_running_loop()
+        flushes = [task for task in self._flush_tasks if task.get_loop() is loop]
+        if flushes:
+            await asyncio.gather(*flushes, return_exceptions=True)
+        await self.embedder.aclose()
+
+    async def _dispatch(self, pending: List[_PendingEmbedding]) -> None:
+        # Flush in the background so the next window fills during the request
+        task = asyncio.get_running_loop().create_task(self._flush(pending))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def _flush(self, pending: List[_PendingEmbedding]) -> None:
+        texts = [text for batch, _ in pending for text in batch]
+        try:
+            embeddings = await self.embedder.embedding_processor(texts)
+        except Exception as e:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        if not _rows_match(embeddings, len(texts)):
+            embeddings = np.empty((0, 0), dtype=np.float32)
+            for _, future in pending:
+                if not future.done():
+                    future.set_result(embeddings)
+            return
+
+        rows = np.asarray(embeddings, dtype=np.float32)
+        offset = 0
+        for batch, future in pending:
+            if not future.done():
+                future.set_result(rows[offset : offset + len(batch)])
+            offset += len(batch)
 
 
 class GeminiEmbeddingAdapter(EmbeddingPort):
@@ -215,46 +568,88 @@ class GeminiEmbeddingAdapter(EmbeddingPort):
         base_url: Optional[str] = None,
         model_name: str = "gemini-embedding-001",
         client: Optional[object] = None,
+        batch_size: int = 100,
+        max_workers: int = 4,
+        http_options: Optional[Any] = None,
     ) -> None:
+        if batch_size <= 0:
+            raise ValueError("batch_size must be positive (got %d)" % batch_size)
+        if max_workers <= 0:
+            raise ValueError("max_workers must be positive (got %d)" % max_workers)
+
         self.client: Any
         if client is not None:
             self.client = client
         else:
             if genai is None:
                 raise ImportError("Genai not available")
-            self.client = genai.Client(api_key=api_key)
+            if http_options is None:
+                # Keep-alive pool sized for the concurrent batches; the SDK
+                # reuses one transport per client, so connections survive calls
+                limits = httpx.Limits(
+                    max_connections=max_workers * 2,
+                    max_keepalive_connections=max_workers * 2,
+                    keepalive_expiry=60.0,
+                )
+                http_options = genai_types.HttpOptions(
+                    client_args={"limits": limits},
+                    async_client_args={"limits": limits},
+                )
+            self.client = genai.Client(api_key=api_key, http_options=http_options)
         self.model_name = model_name
         self.base_url = base_url
+        self.batch_size = batch_size
+        self.max_workers = max_workers
 
-    async def embedding_processor(self, texts: List[str]) -> List[List[float]]:
-        if not texts:
-            return []
-        if genai is None:
-            raise ImportError("Genai not available")
-
+    async def _embed_batch(self, batch: List[str]) -> List[Optional[List[float]]]:
         # Use the async aio module for embedding
         try:
             result = await self.client.aio.models.embed_content(
-                model=self.model_name, contents=texts
+                model=self.model_name, contents=batch
             )
         except AttributeError:
-            # Fallback to sync method in executor if aio is not available
-            import asyncio
-            from concurrent.futures import ThreadPoolExecutor
+            # Fallback to sync method in a thread if aio is not available
+            result = await asyncio.to_thread(
+                self.client.models.embed_content,
+                model=self.model_name,
+                contents=batch,
+            )
 
-            def sync_embed():
-                return self.client.models.embed_content(
-                    model=self.model_name, contents=texts
-                )
+        if not result.embeddings:
+            return [None] * len(batch)
+        return [vectors.values for vectors in result.embeddings]
 
-            loop = asyncio.get_running_loop()
-            with ThreadPoolExecutor() as executor:
-                result = await loop.run_in_executor(executor, sync_embed)
+    async def _embed_uncached(self, texts: List[str]) -> List[Optional[List[float]]]:
+        batch_size = self.batch_size
+        if len(texts) <= batch_size:
+            return await self._embed_batch(texts)
 
-        if not result.embeddings:
-            return []
-        return [
-            vectors.values
-            for vectors in result.embeddings
-            if vectors.values is not None
-        ]
+        # Dispatch fixed-size batches concurrently, at most max_workers in flight
+        semaphore = asyncio.Semaphore(self.max_workers)
+
+        async def embed_bounded(batch: List[str]) -> List[Optional[List[float]]]:
+            async with semaphore:
+                return await self._embed_batch(batch)
+
+        batches = [texts[i : i + batch_size] for i in range(0, len(texts), batch_size)]
+        results = await asyncio.gather(*(embed_bounded(b) for b in batches))
+        return [vector for batch_vectors in results for vector in batch_vectors]
+
+    async def embedding_processor(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        if genai is None:
+            raise ImportError("Genai not available")
+
+        # Duplicate texts are sent once and fanned back out
+        unique = list(dict.fromkeys(texts))
+        fresh = await self._embed_uncached(unique)
+        by_text = {
+            text: np.asarray(values, dtype=np.float32)
+            for text, values in zip(unique, fresh)
+            if values is not None
+        }
+        rows = [by_text[text] for text in texts if text in by_text]
+        if not rows:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.stack(rows)
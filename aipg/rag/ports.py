@@ -1,31 +1,57 @@
+import asyncio
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import List, Optional
+from typing import Any, List, Mapping, Optional, Union
+
+import numpy as np
 
 from aipg.domain import Project
 
+# (N, D) embeddings; adapters return float32 arrays, simple ports may return lists
+Embeddings = Union[List[List[float]], np.ndarray]
 
-@dataclass
+
+@dataclass(slots=True, frozen=True)
 class RetrievedItem:
     topic: str
     micro_project: Project
-    metadata: Optional[dict] = None
+    metadata: Optional[Mapping[str, Any]] = None
+    # Cosine similarity to the query embedding, when the store reports it
+    similarity: Optional[float] = None
 
 
 @dataclass
 class EmbeddingPort(ABC):
     @abstractmethod
-    async def embedding_processor(self, texts: List[str]) -> List[List[float]]: ...
+    async def embedding_processor(self, texts: List[str]) -> Embeddings: ...
+
+    async def aclose(self) -> None:
+        """Stop background tasks; wrappers also close the embedder they wrap."""
 
 
 @dataclass
 class VectorStorePort(ABC):
     @abstractmethod
     async def add(
-        self, ids: List[str], embeddings: List[List[float]], metadatas: List[dict]
+        self, ids: List[str], embeddings: Embeddings, metadatas: List[dict]
     ) -> None:
         raise NotImplementedError()
 
     @abstractmethod
-    async def query(self, embedding: List[float], k: int) -> List[RetrievedItem]:
+    async def query(
+        self, embedding: Union[List[float], np.ndarray], k: int
+    ) -> List[RetrievedItem]:
         raise NotImplementedError
+
+    async def warm_up(self) -> None:
+        """Open connections or load indexes ahead of the first query."""
+
+    async def query_batch(
+        self, embeddings: Embeddings, k: int
+    ) -> List[List[RetrievedItem]]:
+        """Query several embeddings; stores with a native batch API override this."""
+        return list(
+            await asyncio.gather(
+                *(self.query(embedding, k) for embedding in embeddings)
+            )
+        )
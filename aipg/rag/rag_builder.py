@@ -1,12 +1,43 @@
 from __future__ import annotations
 
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
 from aipg.configs.app_config import AppConfig
 
-from .adapters import ChromaDbAdapter, GeminiEmbeddingAdapter
+from .adapters import (
+    BatchingEmbedder,
+    CachedEmbedder,
+    ChromaDbAdapter,
+    GeminiEmbeddingAdapter,
+)
+from .ports import EmbeddingPort
 from .service import RagService
 
+# A service holds warm state (embedding and results caches, the Chroma
+# collection, the write-behind queue), so assistants built from the same
+# settings share one
+_SERVICES: Dict[Tuple[str, Optional[str], Optional[str]], RagService] = {}
+_SERVICES_LOCK = threading.Lock()
+
 
 def build_rag_service(config: AppConfig) -> RagService:
+    # Embedding endpoint and key fall back to the LLM ones, so the resolved
+    # values are part of the key as well
+    key = (
+        config.rag.model_dump_json(),
+        config.rag.embedding_base_url or config.llm.base_url,
+        config.rag.embedding_api_key or config.llm.api_key,
+    )
+    with _SERVICES_LOCK:
+        service = _SERVICES.get(key)
+        if service is None:
+            service = _SERVICES[key] = _build_service(config)
+    return service
+
+
+def _build_service(config: AppConfig) -> RagService:
     k_candidates = config.rag.k_candidates
     collection_name = config.rag.collection_name
     chroma_path = config.rag.chroma_path
@@ -14,17 +45,41 @@ def build_rag_service(config: AppConfig) -> RagService:
     embedding_base_url = config.rag.embedding_base_url or config.llm.base_url
     embedding_api_key = config.rag.embedding_api_key or config.llm.api_key
 
+    # A Chroma server takes precedence over the embedded on-disk store
     vector_store = ChromaDbAdapter(
-        collection_name=collection_name, persist_dir=chroma_path
+        collection_name=collection_name,
+        persist_dir=None if config.rag.chroma_url else chroma_path,
+        url=config.rag.chroma_url,
+        hnsw_params={
+            name: value
+            for name, value in (
+                ("search_ef", config.rag.hnsw_search_ef),
+                ("construction_ef", config.rag.hnsw_construction_ef),
+                ("M", config.rag.hnsw_m),
+            )
+            if value is not None
+        },
     )
-    embedder = GeminiEmbeddingAdapter(
+    embedder: EmbeddingPort = GeminiEmbeddingAdapter(
         api_key=embedding_api_key,
         base_url=embedding_base_url,
         model_name=embedding_model,
     )
+    # Concurrent misses share requests; cache hits never wait on the window
+    embedder = BatchingEmbedder(embedder)
+    if config.rag.embedding_cache_size > 0:
+        # One store per model, so vectors of different models never mix
+        cache_dir = config.rag.embedding_cache_dir
+        embedder = CachedEmbedder(
+            embedder,
+            cache_size=config.rag.embedding_cache_size,
+            persist_dir=str(Path(cache_dir) / embedding_model) if cache_dir else None,
+        )
 
     return RagService(
         embedder=embedder,
         vector_store=vector_store,
         k_candidates=k_candidates,
+        write_behind=config.rag.write_behind,
+        results_cache_ttl=config.rag.results_cache_ttl_seconds,
     )
@@ -0,0 +1,28 @@
+from typing import List
+
+import numpy as np
+
+from aipg.rag.adapters import _unit_rows
+from aipg.rag.ports import EmbeddingPort
+
+
+class EmbeddingRanker:
+    """Scores candidates by cosine similarity of their embeddings to the query."""
+
+    def __init__(self, embedder: EmbeddingPort) -> None:
+        self.embedder = embedder
+
+    async def rank(self, query: str, candidates: List[str]) -> np.ndarray:
+        """Return one float32 cosine score per candidate, in candidate order."""
+        if not candidates:
+            return np.empty(0, dtype=np.float32)
+
+        # Query and candidates go out in one embedding request
+        embeddings = await self.embedder.embedding_processor([query, *candidates])
+        if len(embeddings) != len(candidates) + 1:
+            raise RuntimeError(
+                f"Failed to generate embeddings for ranking topic: '{query}'"
+            )
+
+        rows = _unit_rows(embeddings)
+        return rows[1:] @ rows[0]
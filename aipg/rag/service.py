@@ -1,12 +1,22 @@
+import asyncio
+import hashlib
 import logging
-import uuid
-from typing import List
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Literal, Optional, Tuple, Union
+
+import numpy as np
 
 from aipg.domain import Project, Topic2Project
-from aipg.rag.ports import EmbeddingPort, RetrievedItem, VectorStorePort
+from aipg.event_loop import BatchQueue
+from aipg.rag.ports import EmbeddingPort, Embeddings, RetrievedItem, VectorStorePort
 
 logger = logging.getLogger(__name__)
 
+# A pending vector-store row: (id, float32 embedding, metadata); a None
+# embedding is generated from metadata["topic"] when the row is written
+_PendingWrite = Tuple[str, Optional[np.ndarray], Dict[str, Any]]
+
 
 class RagService:
     def __init__(
@@ -14,83 +24,346 @@ class RagService:
         embedder: EmbeddingPort,
         vector_store: VectorStorePort,
         k_candidates: int = 5,
+        write_behind: bool = False,
+        write_batch_size: int = 250,
+        write_flush_interval_ms: float = 500.0,
+        results_cache_size: int = 1024,
+        results_cache_ttl: Optional[float] = 3600.0,
     ) -> None:
         self.embedder = embedder
         self.vector_store = vector_store
         self.k_candidates = k_candidates
+        # With write_behind, save() queues rows and a background task adds them
+        # in batches; call flush() or aclose() before the event loop shuts down
+        self.write_behind = write_behind
+        self._writes: BatchQueue[_PendingWrite] = BatchQueue(
+            self._write_batch,
+            max_size=write_batch_size,
+            max_wait_ms=write_flush_interval_ms,
+            name="RAG write-behind",
+        )
+        # Results per normalized topic (LRU order), so a repeated topic skips
+        # the embed and query; any save here clears it, and entries expire
+        # after results_cache_ttl seconds (None: never) to pick up rows other
+        # processes add to a shared store
+        self.results_cache_size = results_cache_size
+        self.results_cache_ttl = results_cache_ttl
+        self._results_cache: OrderedDict[str, Tuple[float, List[Topic2Project]]] = (
+            OrderedDict()
+        )
+        # Query embeddings of recently looked-up topics (LRU order); saving a
+        # topic after a miss reuses its embedding instead of embedding it again
+        self._query_embeddings: OrderedDict[str, np.ndarray] = OrderedDict()
 
         if k_candidates <= 0:
             raise ValueError("k_candidates must be positive (got %d)" % k_candidates)
+        if write_batch_size <= 0:
+            raise ValueError(
+                "write_batch_size must be positive (got %d)" % write_batch_size
+            )
 
     async def try_to_get(self, topic: str) -> List[Topic2Project]:
         """
         Try to retrieve a micro project for the given topic.
         Returns List[Topic2Project] if found, [] if not found.
         """
-        embeddings = await self.embedder.embedding_processor([topic])
-        if not embeddings:
+        cached = self._get_cached_results(topic)
+        if cached is not None:
+            return cached
+
+        embeddings = await self._embed_with_store_ready([topic])
+        if len(embeddings) == 0:
             raise RuntimeError(f"Failed to generate embedding for topic: '{topic}'")
         topic_embedding = embeddings[0]
+        self._remember_embeddings([topic], embeddings)
         candidates: List[RetrievedItem] = await self.vector_store.query(
             embedding=topic_embedding, k=self.k_candidates
         )
+        return self._to_topic2projects(topic, candidates)
+
+    async def try_to_get_many(self, topics: List[str]) -> List[List[Topic2Project]]:
+        """
+        Retrieve micro projects for several topics at once.
+        Topics are embedded in one call and queried in one batch; the result
+        holds one (possibly empty) list per topic, in input order.
+        """
+        if not topics:
+            return []
+        results: List[Optional[List[Topic2Project]]] = [
+            self._get_cached_results(topic) for topic in topics
+        ]
+        missing = [topic for topic, result in zip(topics, results) if result is None]
+        fetched: List[List[RetrievedItem]] = []
+        if missing:
+            embeddings = await self._embed_with_store_ready(missing)
+            if len(embeddings) != len(missing):
+                raise RuntimeError(
+                    "Failed to generate embeddings for topics: "
+                    f"expected {len(missing)}, got {len(embeddings)}"
+                )
+            self._remember_embeddings(missing, embeddings)
+            # One multi-query call; stores without a native batch API fan out
+            fetched = await self.vector_store.query_batch(
+                embeddings, k=self.k_candidates
+            )
+        fresh = iter(
+            self._to_topic2projects(topic, candidates)
+            for topic, candidates in zip(missing, fetched)
+        )
+        return [result if result is not None else next(fresh) for result in results]
+
+    async def _embed_with_store_ready(self, texts: List[str]) -> Embeddings:
+        # On a cold start the store opens its index while the embedding
+        # request is in flight; once warm, warm_up returns immediately
+        embeddings, _ = await asyncio.gather(
+            self.embedder.embedding_processor(texts), self.vector_store.warm_up()
+        )
+        return embeddings
+
+    def _remember_embeddings(self, topics: List[str], embeddings: Embeddings) -> None:
+        if self.results_cache_size <= 0:
+            return
+        cache = self._query_embeddings
+        for topic, embedding in zip(topics, embeddings):
+            cache[topic] = np.asarray(embedding, dtype=np.float32)
+            cache.move_to_end(topic)
+        while len(cache) > self.results_cache_size:
+            cache.popitem(last=False)
+
+    def _to_topic2projects(
+        self, topic: str, candidates: List[RetrievedItem]
+    ) -> List[Topic2Project]:
         topic_candidates = [candidate.topic for candidate in candidates]
         if topic_candidates:
             result = [
-                Topic2Project(topic=candidate.topic, project=candidate.micro_project)
+                Topic2Project(
+                    topic=candidate.topic,
+                    project=candidate.micro_project,
+                    similarity=candidate.similarity,
+                )
                 for candidate in candidates
             ]
             logger.info(
-                f"RAG search successful: found {len(result)} matching projects for topic '{topic}'"
+                "RAG search successful: found %d matching projects for topic '%s'",
+                len(result),
+                topic,
+            )
+            logger.debug("Found topics: %s", topic_candidates)
+        else:
+            result = []
+            logger.info(
+                "RAG search completed: no matching projects found for topic '%s'",
+                topic,
+            )
+        self._cache_results(topic, result)
+        return result
+
+    @staticmethod
+    def _results_key(topic: str) -> str:
+        return topic.strip().lower()
+
+    def _get_cached_results(self, topic: str) -> Optional[List[Topic2Project]]:
+        key = self._results_key(topic)
+        entry = self._results_cache.get(key)
+        if entry is None:
+            return None
+        expires_at, cached = entry
+        if time.monotonic() >= expires_at:
+            del self._results_cache[key]
+            return None
+        self._results_cache.move_to_end(key)
+        logger.debug("RAG results cache hit for topic '%s'", topic)
+        # Callers mutate the returned projects, so hand out copies
+        return [t2p.model_copy(deep=True) for t2p in cached]
+
+    def _cache_results(self, topic: str, result: List[Topic2Project]) -> None:
+        if self.results_cache_size <= 0:
+            return
+        expires_at = (
+            time.monotonic() + self.results_cache_ttl
+            if self.results_cache_ttl is not None
+            else float("inf")
+        )
+        key = self._results_key(topic)
+        cache = self._results_cache
+        cache[key] = (expires_at, [t2p.model_copy(deep=True) for t2p in result])
+        cache.move_to_end(key)
+        while len(cache) > self.results_cache_size:
+            cache.popitem(last=False)
+
+    async def save(
+        self,
+        topic: str,
+        micro_project: Project,
+        generate_embedding: Literal["sync", "async"] = "sync",
+        precomputed_embedding: Union[List[float], np.ndarray, None] = None,
+    ) -> None:
+        """Store a project under its topic.
+
+        With generate_embedding="async" the row is queued unembedded and the
+        background writer embeds and adds it; call flush() to wait for it.
+        The topic is not embedded again if precomputed_embedding is given or
+        a recent try_to_get/try_to_get_many already embedded it.
+        """
+        logger.info("RAG save initiated for topic: '%s'", topic)
+        self._check_content(topic, micro_project)
+
+        if precomputed_embedding is None:
+            precomputed_embedding = self._query_embeddings.get(topic)
+
+        if precomputed_embedding is None and generate_embedding == "async":
+            deterministic_id, metadata = self._build_row(topic, micro_project)
+            self._writes.put((deterministic_id, None, metadata))
+            logger.info("RAG save queued for embedding: topic '%s'", topic)
+            return
+
+        if precomputed_embedding is None:
+            embeddings = await self.embedder.embedding_processor([topic])
+            if len(embeddings) == 0:
+                raise RuntimeError(f"Failed to generate embedding for topic: '{topic}'")
+            precomputed_embedding = embeddings[0]
+            logger.debug(
+                "Generated embedding for topic '%s' (dimension: %d)",
+                topic,
+                len(precomputed_embedding),
             )
-            logger.debug(f"Found topics: {topic_candidates}")
-            return result
 
+        # Rows are kept as contiguous float32, whatever the embedder returned
+        topic_embedding = np.asarray(precomputed_embedding, dtype=np.float32)
+
+        deterministic_id, metadata = self._build_row(topic, micro_project)
+
+        if self.write_behind or generate_embedding == "async":
+            self._writes.put((deterministic_id, topic_embedding, metadata))
+            logger.info("RAG save queued: micro project for topic '%s'", topic)
+            return
+
+        await self.vector_store.add(
+            ids=[deterministic_id],
+            embeddings=topic_embedding.reshape(1, -1),
+            metadatas=[metadata],
+        )
+        self._results_cache.clear()
         logger.info(
-            f"RAG search completed: no matching projects found for topic '{topic}'"
+            "RAG save completed: successfully saved micro project for topic '%s'",
+            topic,
         )
-        return []
 
-    async def save(self, topic: str, micro_project: Project) -> None:
-        logger.info(f"RAG save initiated for topic: '{topic}'")
+    async def save_many(self, pairs: List[Tuple[str, Project]]) -> None:
+        """Save several (topic, project) pairs with one embedding call and one add."""
+        if not pairs:
+            return
+        logger.info("RAG batch save initiated for %d topics", len(pairs))
+        for topic, micro_project in pairs:
+            self._check_content(topic, micro_project)
 
+        embeddings = await self.embedder.embedding_processor(
+            [topic for topic, _ in pairs]
+        )
+        if len(embeddings) != len(pairs):
+            raise RuntimeError(
+                "Failed to generate embeddings for topics: "
+                f"expected {len(pairs)}, got {len(embeddings)}"
+            )
+
+        rows: List[_PendingWrite] = []
+        for (topic, micro_project), embedding in zip(
+            pairs, np.asarray(embeddings, dtype=np.float32)
+        ):
+            row_id, metadata = self._build_row(topic, micro_project)
+            rows.append((row_id, embedding, metadata))
+        if self.write_behind:
+            for row in rows:
+                self._writes.put(row)
+            logger.info("RAG batch save queued: %d micro projects", len(rows))
+            return
+        await self._write_batch(rows)
+
+    def _check_content(self, topic: str, micro_project: Project) -> None:
         # Validate that micro_project content is not empty
         content = micro_project.raw_markdown.strip()
         if not content or content in ["", "<!-- -->", "<!-- -->", "<!--  -->"]:
             logger.warning(
-                f"Empty or placeholder content detected for topic '{topic}' "
-                f"and project '{micro_project.topic}': content='{micro_project.raw_markdown[:100]}...'"
+                "Empty or placeholder content detected for topic '%s' "
+                "and project '%s': content='%s...'",
+                topic,
+                micro_project.topic,
+                micro_project.raw_markdown[:100],
             )
             raise RuntimeError(
                 f"Cannot save empty or placeholder content for topic '{topic}' "
                 f"and project '{micro_project.topic}'. Content must contain meaningful project data."
             )
 
-        embeddings = await self.embedder.embedding_processor([topic])
-        if not embeddings:
-            raise RuntimeError(f"Failed to generate embedding for topic: '{topic}'")
-
-        topic_embedding = embeddings[0]
-        logger.debug(
-            f"Generated embedding for topic '{topic}' (dimension: {len(topic_embedding)})"
-        )
-
+    def _build_row(
+        self, topic: str, micro_project: Project
+    ) -> Tuple[str, Dict[str, Any]]:
+        """Return the (id, metadata) pair stored for a project."""
         # Store only the raw markdown for simplicity
         raw_markdown = micro_project.raw_markdown
         logger.debug(
-            f"Storing raw markdown for topic '{topic}' (length: {len(raw_markdown)} chars)"
+            "Storing raw markdown for topic '%s' (length: %d chars)",
+            topic,
+            len(raw_markdown),
         )
 
-        # Generate deterministic unique ID from topic and raw_markdown
-        content_for_hash = f"{topic}:{raw_markdown}"
-        deterministic_id = uuid.uuid5(uuid.NAMESPACE_URL, content_for_hash).hex
+        # Generate deterministic unique ID from "topic:raw_markdown", hashed
+        # piecewise so the markdown is never copied into a joined string;
+        # 128-bit BLAKE2b keeps the 32-char hex format of the old uuid5 ids
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(topic.encode("utf-8"))
+        digest.update(b":")
+        digest.update(raw_markdown.encode("utf-8"))
+        deterministic_id = digest.hexdigest()
         logger.debug("Generated deterministic ID: %s", deterministic_id)
 
+        metadata = {
+            "topic": topic,
+            "project_md": raw_markdown,
+            # Parsed fields, so queries can skip re-parsing the markdown
+            "project_json": micro_project.model_dump_json(exclude={"raw_markdown"}),
+        }
+        return deterministic_id, metadata
+
+    async def flush(self) -> None:
+        """Wait until every queued write has been added to the vector store."""
+        await self._writes.join()
+
+    async def aclose(self) -> None:
+        """Flush queued writes and stop the background tasks.
+
+        The service stays usable; the next write-behind save starts a new
+        worker.
+        """
+        await self._writes.aclose()
+        await self.embedder.aclose()
+
+    async def _write_batch(self, batch: List[_PendingWrite]) -> None:
+        # The same project saved twice maps to one id; Chroma rejects
+        # duplicate ids within a single add
+        rows: Dict[str, _PendingWrite] = {row[0]: row for row in batch}
+        unembedded = [
+            row_id for row_id, embedding, _ in rows.values() if embedding is None
+        ]
+        if unembedded:
+            embeddings = await self.embedder.embedding_processor(
+                [rows[row_id][2]["topic"] for row_id in unembedded]
+            )
+            if len(embeddings) != len(unembedded):
+                raise RuntimeError(
+                    "Failed to generate embeddings for topics: "
+                    f"expected {len(unembedded)}, got {len(embeddings)}"
+                )
+            for row_id, embedding in zip(
+                unembedded, np.asarray(embeddings, dtype=np.float32)
+            ):
+                rows[row_id] = (row_id, embedding, rows[row_id][2])
+        # Every row is embedded by now
+        vectors = [embedding for _, embedding, _ in rows.values()]
         await self.vector_store.add(
-            ids=[deterministic_id],
-            embeddings=[topic_embedding],
-            metadatas=[{"topic": topic, "project_md": raw_markdown}],
-        )
-        logger.info(
-            f"RAG save completed: successfully saved micro project for topic '{topic}'"
+            ids=list(rows),
+            embeddings=np.stack(vectors),  # type: ignore[arg-type]
+            metadatas=[metadata for _, _, metadata in rows.values()],
         )
+        self._results_cache.clear()
+        logger.info("RAG stored %d micro projects", len(rows))
@@ -0,0 +1,69 @@
+import asyncio
+import threading
+import time
+from typing import Dict, Tuple
+
+
+class AsyncRateLimiter:
+    """Token bucket allowing ``max_rate`` acquisitions per ``time_period`` seconds.
+
+    The bucket starts full, so a burst of up to ``max_rate`` requests goes out
+    at once and later ones are spaced at the refill rate. No asyncio primitive
+    is held between calls, which lets one limiter serve several event loops
+    (e.g. ``event_loop.run`` and the shared background loop).
+    """
+
+    def __init__(self, max_rate: float, time_period: float = 60.0) -> None:
+        if max_rate <= 0 or time_period <= 0:
+            raise ValueError("max_rate and time_period must be positive")
+        self.max_rate = max_rate
+        self.time_period = time_period
+        self._refill_per_second = max_rate / time_period
+        self._tokens = float(max_rate)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _try_take(self) -> float:
+        """Take a token and return 0, or return the seconds until one is free."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                float(self.max_rate),
+                self._tokens + (now - self._updated_at) * self._refill_per_second,
+            )
+            self._updated_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self._refill_per_second
+
+    async def acquire(self) -> None:
+        while (delay := self._try_take()) > 0:
+            await asyncio.sleep(delay)
+
+    async def __aenter__(self) -> None:
+        await self.acquire()
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        return None
+
+
+_limiters: Dict[Tuple[str, float, float], AsyncRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(
+    key: str, max_rate: float, time_period: float = 60.0
+) -> AsyncRateLimiter:
+    """Return the process-wide limiter for ``key``, creating it on first use.
+
+    Clients talking to the same provider endpoint share one bucket, so the
+    request budget holds however many LLMClient instances are alive.
+    """
+    with _limiters_lock:
+        limiter_key = (key, float(max_rate), float(time_period))
+        limiter = _limiters.get(limiter_key)
+        if limiter is None:
+            limiter = AsyncRateLimiter(max_rate, time_period)
+            _limiters[limiter_key] = limiter
+        return limiter
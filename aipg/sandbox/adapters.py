@@ -1,17 +1,119 @@
 from __future__ import annotations
 
 import asyncio
-import base64
+import atexit
 import contextlib
+import logging
 import subprocess
+import threading
 import uuid
-from typing import Optional
+from typing import List, Optional, Tuple
 
 from aipg.configs.app_config import SandboxConfig
 
+from .docker_engine import (
+    DEFAULT_DOCKER_SOCKET,
+    DockerEngineClient,
+    engine_api_available,
+)
 from .domain import SandboxResult
 from .ports import SandboxRunner
 
+logger = logging.getLogger(__name__)
+
+# Runs inside the sandbox: stdin carries "<code byte length>\n<code><input>",
+# so the code travels without encoding and the program reads only its input
+_STDIN_LOADER = (
+    "import sys; n = int(sys.stdin.buffer.readline()); "
+    "exec(compile(sys.stdin.buffer.read(n).decode('utf-8'), '<sandbox>', 'exec'), "
+    "{'__name__': '__main__'})"
+)
+
+
+def _stdin_payload(code: str, input_data: Optional[str]) -> bytes:
+    source = code.encode("utf-8")
+    return b"%d\n" % len(source) + source + (input_data or "").encode("utf-8")
+
+
+# Engine API execs have no stdin attached, so the code and input travel as
+# environment variables; the loader removes them before running the code
+_ENV_LOADER = (
+    "import io, os, sys; "
+    "sys.stdin = io.TextIOWrapper("
+    "io.BytesIO(os.fsencode(os.environ.pop('AIPG_SANDBOX_INPUT'))), encoding='utf-8'); "
+    "exec(compile(os.environ.pop('AIPG_SANDBOX_CODE'), '<sandbox>', 'exec'), "
+    "{'__name__': '__main__'})"
+)
+# Linux caps a single environment string at 128 KiB
+_ENV_VALUE_LIMIT = 120_000
+
+
+def _env_payload(code: str, input_data: Optional[str]) -> Optional[List[str]]:
+    """Environment for _ENV_LOADER, or None if the payload cannot go in env."""
+    env = [f"AIPG_SANDBOX_CODE={code}", f"AIPG_SANDBOX_INPUT={input_data or ''}"]
+    for item in env:
+        if "\x00" in item:
+            return None
+        # UTF-8 needs at most 4 bytes per character, so only long values
+        # pay for an encode to measure them
+        if len(item) * 4 > _ENV_VALUE_LIMIT and (
+            len(item.encode("utf-8")) > _ENV_VALUE_LIMIT
+        ):
+            return None
+    return env
+
+
+# The command is fixed now that the code arrives on stdin
+_PYTHON_ARGV = ("python", "-c", _STDIN_LOADER)
+
+# Long-lived interpreter for ComposeDockerRunner(persistent_repl=True). Each
+# request is "<code len> <input len> <timeout>\n<code><input>" and each reply
+# "<exit code> <timed out> <stdout len> <stderr len>\n<stdout><stderr>"; code
+# runs in a fresh namespace, and SIGALRM enforces the timeout in-process
+_REPL_SERVER = """
+import io, signal, sys, traceback
+from contextlib import redirect_stderr, redirect_stdout
+
+class Timeout(BaseException):
+    pass
+
+def on_alarm(signum, frame):
+    raise Timeout()
+
+signal.signal(signal.SIGALRM, on_alarm)
+requests, replies = sys.stdin.buffer, sys.stdout.buffer
+while header := requests.readline():
+    code_len, input_len, timeout = map(int, header.split())
+    source = requests.read(code_len).decode("utf-8")
+    sys.stdin = io.TextIOWrapper(io.BytesIO(requests.read(input_len)), encoding="utf-8")
+    out, err = io.StringIO(), io.StringIO()
+    exit_code, timed_out = 0, 0
+    with redirect_stdout(out), redirect_stderr(err):
+        signal.alarm(timeout)
+        try:
+            exec(compile(source, "<sandbox>", "exec"), {"__name__": "__main__"})
+        except Timeout:
+            exit_code, timed_out = 124, 1
+        except SystemExit as e:
+            if isinstance(e.code, int) or e.code is None:
+                exit_code = e.code or 0
+            else:
+                print(e.code, file=sys.stderr)
+                exit_code = 1
+        except BaseException as e:
+            traceback.print_exception(e.with_traceback(e.__traceback__.tb_next))
+            exit_code = 1
+        finally:
+            signal.alarm(0)
+    stdout = out.getvalue().encode("utf-8", "replace")
+    stderr = err.getvalue().encode("utf-8", "replace")
+    replies.write(b"%d %d %d %d\\n" % (exit_code, timed_out, len(stdout), len(stderr)))
+    replies.write(stdout + stderr)
+    replies.flush()
+"""
+# Extra time the host waits for a reply before giving up on the interpreter
+_REPL_GRACE_SECONDS = 2
+
 
 class DockerPythonRunner(SandboxRunner):
     """Run untrusted Python code inside a Docker container with strict limits.
@@ -19,6 +121,11 @@ class DockerPythonRunner(SandboxRunner):
     This adapter intentionally avoids the Docker SDK to reduce dependencies and
     uses the `docker` CLI instead. It sets conservative defaults and supports
     passing stdin to the containerized process.
+
+    By default every run gets a fresh container. With ``reuse_container`` one
+    long-lived container (same limits) is started on first use and each run is
+    a `docker exec` into it, which skips the container start-up cost; runs then
+    share the container's /tmp and process table.
     """
 
     def __init__(
@@ -29,6 +136,7 @@ class DockerPythonRunner(SandboxRunner):
         cpu_quota: Optional[float] = None,
         pids_limit: Optional[int] = None,
         default_timeout_seconds: Optional[int] = None,
+        reuse_container: bool = False,
     ) -> None:
         # Use config if provided, otherwise fall back to individual parameters or defaults
         if config is not None:
@@ -37,6 +145,7 @@ class DockerPythonRunner(SandboxRunner):
             self._cpu_quota = config.cpu_quota
             self._pids_limit = config.pids_limit
             self._default_timeout_seconds = config.default_timeout_seconds
+            self._reuse_container = config.reuse_container
         else:
             # Fallback to individual parameters or defaults for backward compatibility
             self._image = image or "aipg-sandbox:latest"
@@ -44,52 +153,64 @@ class DockerPythonRunner(SandboxRunner):
             self._cpu_quota = cpu_quota if cpu_quota is not None else 0.5
             self._pids_limit = pids_limit or 128
             self._default_timeout_seconds = default_timeout_seconds or 5
+            self._reuse_container = reuse_container
+
+        # Limits do not change per run, so the flags are rendered once
+        self._isolation_argv = self._isolation_flags()
+        self._warm_container: Optional[str] = None
+        self._warm_lock = threading.Lock()
+        if self._reuse_container:
+            atexit.register(self.close)
+
+    async def __aenter__(self) -> DockerPythonRunner:
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await asyncio.to_thread(self.close)
+
+    def close(self) -> None:
+        """Remove the warm container, if one was started."""
+        with self._warm_lock:
+            name, self._warm_container = self._warm_container, None
+        if name is not None:
+            self._force_remove(name)
 
     async def run(
         self, code: str, input_data: Optional[str], timeout_seconds: int
     ) -> SandboxResult:
-        encoded = base64.b64encode(code.encode("utf-8")).decode("ascii")
-        container_name = f"py-sbx-{uuid.uuid4().hex[:12]}"
-
-        # Compose a safe command that decodes and executes the user code.
-        python_cmd = (
-            "python - <<'PY'\n"
-            'import base64,sys; exec(base64.b64decode("'
-            + encoded
-            + "\").decode('utf-8'))\n"
-            "PY"
-        )
-
-        shell_cmd = [
-            "sh",
-            "-lc",
-            python_cmd,
-        ]
-
-        # Build docker run command with strict isolation flags
-        docker_cmd = [
-            "docker",
-            "run",
-            "--rm",
-            "--name",
-            container_name,
-            "--network",
-            "none",
-            "--read-only",
-            "--tmpfs",
-            "/tmp:rw,noexec,nosuid,size=64m",
-            "--cpus",
-            str(self._cpu_quota if self._cpu_quota is not None else 1),
-            "--memory",
-            self._memory_limit,
-            "--pids-limit",
-            str(self._pids_limit),
-            "--security-opt",
-            "no-new-privileges:true",
-            "--user",
-            "65534:65534",  # nobody
-            self._image,
-        ] + shell_cmd
+        if self._reuse_container:
+            try:
+                container_name = await asyncio.to_thread(self._get_warm_container)
+            except Exception:
+                return SandboxResult(
+                    stdout="",
+                    stderr="docker execution failed",
+                    exit_code=1,
+                    timed_out=False,
+                )
+            docker_cmd = [
+                "docker",
+                "exec",
+                "-i",
+                "--user",
+                "65534:65534",  # nobody
+                container_name,
+                *_PYTHON_ARGV,
+            ]
+        else:
+            container_name = f"py-sbx-{uuid.uuid4().bytes[:6].hex()}"
+            # Build docker run command with strict isolation flags; the code
+            # is piped ahead of the input, so nothing user-supplied is in argv
+            docker_cmd = [
+                "docker",
+                "run",
+                "--rm",
+                "--name",
+                container_name,
+                *self._isolation_argv,
+                self._image,
+                *_PYTHON_ARGV,
+            ]
 
         # Use asyncio subprocess to avoid blocking the event loop
         try:
@@ -102,7 +223,7 @@ class DockerPythonRunner(SandboxRunner):
 
             try:
                 stdout, stderr = await asyncio.wait_for(
-                    process.communicate(input=(input_data or "").encode("utf-8")),
+                    process.communicate(input=_stdin_payload(code, input_data)),
                     timeout=(
                         timeout_seconds
                         if timeout_seconds is not None
@@ -120,7 +241,9 @@ class DockerPythonRunner(SandboxRunner):
                 with contextlib.suppress(Exception):
                     process.kill()
                     await process.wait()
-                self._force_remove(container_name)
+                # Killing the docker client does not stop the code inside a
+                # warm container, so the container is replaced as a whole
+                self._discard_container(container_name)
                 return SandboxResult(
                     stdout="",
                     stderr="",
@@ -136,6 +259,56 @@ class DockerPythonRunner(SandboxRunner):
                 timed_out=False,
             )
 
+    def _isolation_flags(self) -> Tuple[str, ...]:
+        return (
+            "--network",
+            "none",
+            "--read-only",
+            "--tmpfs",
+            "/tmp:rw,noexec,nosuid,size=64m",
+            "--cpus",
+            str(self._cpu_quota if self._cpu_quota is not None else 1),
+            "--memory",
+            self._memory_limit,
+            "--pids-limit",
+            str(self._pids_limit),
+            "--security-opt",
+            "no-new-privileges:true",
+            "--user",
+            "65534:65534",  # nobody
+        )
+
+    def _get_warm_container(self) -> str:
+        with self._warm_lock:
+            if self._warm_container is None:
+                name = f"py-sbx-warm-{uuid.uuid4().bytes[:6].hex()}"
+                subprocess.run(
+                    [
+                        "docker",
+                        "run",
+                        "-d",
+                        "--rm",
+                        "--name",
+                        name,
+                        *self._isolation_argv,
+                        "--entrypoint",
+                        "sleep",
+                        self._image,
+                        "infinity",
+                    ],
+                    check=True,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                )
+                self._warm_container = name
+            return self._warm_container
+
+    def _discard_container(self, name: str) -> None:
+        with self._warm_lock:
+            if self._warm_container == name:
+                self._warm_container = None
+        self._force_remove(name)
+
     def _force_remove(self, name: str) -> None:
         try:
             subprocess.run(
@@ -154,26 +327,170 @@ class ComposeDockerRunner(SandboxRunner):
     This runner is designed for Docker Compose environments where a sandbox
     container is already running and we need to execute code inside it using
     docker exec instead of spawning new containers.
+
+    When aiohttp is installed and the Docker socket is mounted, execs go
+    through the Engine API on a pooled connection rather than a forked
+    `docker` CLI per run; the CLI remains the fallback.
+
+    With ``persistent_repl`` runs are sent, one at a time, to a long-lived
+    interpreter in the container, so stdlib and preinstalled imports stay
+    warm between runs. Each run gets a fresh namespace, but modules and
+    their state are shared, and code writing straight to file descriptor 1
+    corrupts the reply stream.
     """
 
     def __init__(
         self,
         container_name: str = "ai-micro-project-generator-sandbox-1",
         default_timeout_seconds: int = 5,
+        docker_socket: str = DEFAULT_DOCKER_SOCKET,
+        persistent_repl: bool = False,
     ) -> None:
         self._container_name = container_name
         self._default_timeout_seconds = default_timeout_seconds
+        self._engine: Optional[DockerEngineClient] = (
+            DockerEngineClient(docker_socket)
+            if engine_api_available(docker_socket)
+            else None
+        )
+        self._persistent_repl = persistent_repl
+        # The interpreter's pipes belong to the loop that started it
+        self._repl: Optional[asyncio.subprocess.Process] = None
+        self._repl_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._repl_lock: Optional[asyncio.Lock] = None
 
     async def run(
         self, code: str, input_data: Optional[str], timeout_seconds: int
     ) -> SandboxResult:
-        # Encode the code to avoid shell injection issues
-        encoded = base64.b64encode(code.encode("utf-8")).decode("ascii")
+        timeout = timeout_seconds or self._default_timeout_seconds
+        if self._persistent_repl:
+            result = await self._run_repl(code, input_data, timeout)
+            if result is not None:
+                return result
+        env = _env_payload(code, input_data) if self._engine is not None else None
+        if self._engine is not None and env is not None:
+            try:
+                stdout, stderr, exit_code = await asyncio.wait_for(
+                    self._engine.exec_run(
+                        self._container_name,
+                        ["python", "-c", _ENV_LOADER],
+                        user="sandbox",
+                        env=env,
+                    ),
+                    timeout=timeout,
+                )
+                return SandboxResult(
+                    stdout=stdout.decode("utf-8", errors="replace"),
+                    stderr=stderr.decode("utf-8", errors="replace"),
+                    exit_code=exit_code,
+                    timed_out=False,
+                )
+            except asyncio.TimeoutError:
+                return SandboxResult(
+                    stdout="",
+                    stderr="Execution timed out",
+                    exit_code=124,
+                    timed_out=True,
+                )
+            except Exception as e:
+                logger.warning(
+                    "Docker Engine API exec failed, using the docker CLI: %s", e
+                )
+                engine, self._engine = self._engine, None
+                await self._close_engine(engine)
+        return await self._run_cli(code, input_data, timeout)
+
+    async def _run_repl(
+        self, code: str, input_data: Optional[str], timeout: int
+    ) -> Optional[SandboxResult]:
+        """Run code in the persistent interpreter; None if it is unusable."""
+        loop = asyncio.get_running_loop()
+        if self._repl_lock is None or self._repl_loop is not loop:
+            self._discard_repl()
+            self._repl_loop = loop
+            self._repl_lock = asyncio.Lock()
+        async with self._repl_lock:
+            try:
+                process = await self._get_repl()
+                assert process.stdin is not None and process.stdout is not None
+                source = code.encode("utf-8")
+                data = (input_data or "").encode("utf-8")
+                process.stdin.write(
+                    b"%d %d %d\n" % (len(source), len(data), timeout) + source + data
+                )
+                await process.stdin.drain()
+                header = await asyncio.wait_for(
+                    process.stdout.readline(), timeout + _REPL_GRACE_SECONDS
+                )
+                exit_code, timed_out, out_len, err_len = map(int, header.split())
+                stdout = await process.stdout.readexactly(out_len)
+                stderr = await process.stdout.readexactly(err_len)
+            except asyncio.TimeoutError:
+                self._discard_repl()
+                return SandboxResult(
+                    stdout="",
+                    stderr="Execution timed out",
+                    exit_code=124,
+                    timed_out=True,
+                )
+            except Exception as e:
+                logger.warning("Sandbox interpreter failed, running one-off: %s", e)
+                self._discard_repl()
+                return None
+        return SandboxResult(
+            stdout=stdout.decode("utf-8", errors="replace"),
+            stderr=stderr.decode("utf-8", errors="replace"),
+            exit_code=exit_code,
+            timed_out=bool(timed_out),
+        )
 
-        # Create a safe command that decodes and executes the user code
-        python_cmd = f"python -c \"import base64; exec(base64.b64decode('{encoded}').decode('utf-8'))\""
+    async def _get_repl(self) -> asyncio.subprocess.Process:
+        if self._repl is None or self._repl.returncode is not None:
+            self._repl = await asyncio.create_subprocess_exec(
+                "docker",
+                "exec",
+                "-i",
+                "--user",
+                "sandbox",
+                self._container_name,
+                "python",
+                "-u",
+                "-c",
+                _REPL_SERVER,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+            )
+        return self._repl
+
+    def _discard_repl(self) -> None:
+        process, self._repl = self._repl, None
+        if process is not None and process.returncode is None:
+            # Best-effort: the process may belong to a loop that has closed
+            with contextlib.suppress(Exception):
+                process.kill()
 
-        # Use docker exec to run code in the existing sandbox container
+    async def aclose(self) -> None:
+        """Stop the persistent interpreter and close the Engine API session."""
+        process = self._repl
+        self._discard_repl()
+        if process is not None:
+            await process.wait()
+        if self._engine is not None:
+            # The client opens a new session if the runner is used again
+            await self._close_engine(self._engine)
+
+    @staticmethod
+    async def _close_engine(engine: DockerEngineClient) -> None:
+        # Best-effort: the session may belong to a loop that has closed
+        with contextlib.suppress(Exception):
+            await engine.close()
+
+    async def _run_cli(
+        self, code: str, input_data: Optional[str], timeout: int
+    ) -> SandboxResult:
+        # Use docker exec to run code in the existing sandbox container; the
+        # code is piped ahead of the input, so the command line is fixed
         docker_cmd = [
             "docker",
             "exec",
@@ -181,9 +498,7 @@ class ComposeDockerRunner(SandboxRunner):
             "--user",
             "sandbox",  # Use sandbox user
             self._container_name,
-            "sh",
-            "-c",
-            python_cmd,
+            *_PYTHON_ARGV,
         ]
 
         try:
@@ -196,8 +511,8 @@ class ComposeDockerRunner(SandboxRunner):
 
             try:
                 stdout, stderr = await asyncio.wait_for(
-                    process.communicate(input=(input_data or "").encode("utf-8")),
-                    timeout=timeout_seconds or self._default_timeout_seconds,
+                    process.communicate(input=_stdin_payload(code, input_data)),
+                    timeout=timeout,
                 )
                 exit_code = await process.wait()
                 return SandboxResult(
@@ -3,11 +3,19 @@
 from __future__ import annotations
 
 import os
+import threading
+from typing import Dict, Tuple
+
 from aipg.configs.app_config import AppConfig
 from aipg.sandbox.adapters import DockerPythonRunner, ComposeDockerRunner
 from aipg.sandbox.ports import SandboxRunner
 from aipg.sandbox.service import PythonSandboxService
 
+# Runners keep warm resources (a reused container, a persistent interpreter,
+# an Engine API session), so services built from the same settings share one
+_RUNNERS: Dict[Tuple[str, str], SandboxRunner] = {}
+_RUNNERS_LOCK = threading.Lock()
+
 
 def build_sandbox_service(config: AppConfig) -> PythonSandboxService:
     """Build a configured sandbox service.
@@ -21,15 +29,22 @@ def build_sandbox_service(config: AppConfig) -> PythonSandboxService:
     # Use ComposeDockerRunner if we're in a Docker Compose environment
     # (detected by checking if ENVIRONMENT is set to development/production)
     environment = os.getenv("ENVIRONMENT", "").lower()
-    runner: SandboxRunner
-    if environment in ("development", "production"):
-        runner = ComposeDockerRunner(
-            container_name="ai-micro-project-generator-sandbox-1",
-            default_timeout_seconds=config.sandbox.default_timeout_seconds,
-        )
-    else:
-        runner = DockerPythonRunner(config=config.sandbox)
+    key = (environment, config.sandbox.model_dump_json())
+    with _RUNNERS_LOCK:
+        runner = _RUNNERS.get(key)
+        if runner is None:
+            runner = _RUNNERS[key] = _build_runner(config, environment)
 
     return PythonSandboxService(
         runner=runner, default_timeout_seconds=config.sandbox.default_timeout_seconds
     )
+
+
+def _build_runner(config: AppConfig, environment: str) -> SandboxRunner:
+    if environment in ("development", "production"):
+        return ComposeDockerRunner(
+            container_name="ai-micro-project-generator-sandbox-1",
+            default_timeout_seconds=config.sandbox.default_timeout_seconds,
+            persistent_repl=config.sandbox.persistent_repl,
+        )
+    return DockerPythonRunner(config=config.sandbox)
@@ -0,0 +1,110 @@
+"""Minimal Docker Engine API client for running execs over the daemon socket."""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import struct
+from typing import Any, List, Optional, Tuple
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None  # type: ignore
+
+DEFAULT_DOCKER_SOCKET = "/var/run/docker.sock"
+
+# Each stdout/stderr frame of a non-TTY exec starts with
+# [stream type, 0, 0, 0, payload size (uint32, big-endian)]
+_FRAME_HEADER = struct.Struct(">BxxxI")
+_STDOUT, _STDERR = 1, 2
+
+
+def engine_api_available(socket_path: str = DEFAULT_DOCKER_SOCKET) -> bool:
+    """Whether execs can go through the Engine API instead of the docker CLI."""
+    return aiohttp is not None and os.path.exists(socket_path)
+
+
+def demultiplex(raw: bytes) -> Tuple[bytes, bytes]:
+    """Split a multiplexed exec stream into (stdout, stderr)."""
+    stdout: List[bytes] = []
+    stderr: List[bytes] = []
+    view = memoryview(raw)
+    offset = 0
+    while offset + _FRAME_HEADER.size <= len(view):
+        stream, size = _FRAME_HEADER.unpack_from(view, offset)
+        offset += _FRAME_HEADER.size
+        payload = bytes(view[offset : offset + size])
+        offset += size
+        if stream == _STDOUT:
+            stdout.append(payload)
+        elif stream == _STDERR:
+            stderr.append(payload)
+    return b"".join(stdout), b"".join(stderr)
+
+
+class DockerEngineClient:
+    """Create and run execs through the Docker Engine REST API.
+
+    One aiohttp session over the Unix socket is kept per event loop, so
+    consecutive runs reuse its connection pool instead of forking the
+    `docker` CLI for every call.
+    """
+
+    def __init__(self, socket_path: str = DEFAULT_DOCKER_SOCKET) -> None:
+        if aiohttp is None:
+            raise RuntimeError("aiohttp is required for the Docker Engine API")
+        self._socket_path = socket_path
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # A session is bound to the loop that created it
+        loop = asyncio.get_running_loop()
+        if (
+            self._session is None
+            or self._session.closed
+            or self._session_loop is not loop
+        ):
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.UnixConnector(path=self._socket_path),
+                base_url="http://docker",
+            )
+            self._session_loop = loop
+        return self._session
+
+    async def exec_run(
+        self,
+        container: str,
+        cmd: List[str],
+        user: Optional[str] = None,
+        env: Optional[List[str]] = None,
+    ) -> Tuple[bytes, bytes, int]:
+        """Run cmd in a running container; returns (stdout, stderr, exit code)."""
+        session = self._get_session()
+        spec: dict[str, Any] = {
+            "Cmd": cmd,
+            "AttachStdout": True,
+            "AttachStderr": True,
+        }
+        if user is not None:
+            spec["User"] = user
+        if env:
+            spec["Env"] = env
+        async with session.post(f"/containers/{container}/exec", json=spec) as resp:
+            resp.raise_for_status()
+            exec_id = (await resp.json())["Id"]
+        async with session.post(
+            f"/exec/{exec_id}/start", json={"Detach": False, "Tty": False}
+        ) as resp:
+            resp.raise_for_status()
+            stdout, stderr = demultiplex(await resp.read())
+        async with session.get(f"/exec/{exec_id}/json") as resp:
+            resp.raise_for_status()
+            exit_code = (await resp.json())["ExitCode"]
+        return stdout, stderr, int(exit_code if exit_code is not None else 1)
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
@@ -2,6 +2,7 @@ from .task_inference import (
     BugFixerInference,
     CheckAutotestSandboxInference,
     DefineTopicsInference,
+    EmbeddingRankerInference,
     FeedbackInference,
     LLMRankerInference,
     ProjectCorrectorInference,
@@ -15,6 +16,7 @@ __all__ = [
     "BugFixerInference",
     "CheckAutotestSandboxInference",
     "DefineTopicsInference",
+    "EmbeddingRankerInference",
     "FeedbackInference",
     "LLMRankerInference",
     "ProjectCorrectorInference",
@@ -1,6 +1,11 @@
+import asyncio
+import copy
+import json
 import logging
-from typing import Any, Dict, Generic, List, Optional, TypeVar
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Dict, Generic, List, Optional, TypeVar
 
+import numpy as np
 from pydantic import BaseModel
 
 from aipg.domain import (
@@ -9,8 +14,9 @@ from aipg.domain import (
     ProjectsAgentState,
 )
 from aipg.exceptions import OutputParserException
-from aipg.llm import LLMClient
+from aipg.llm import LLMClient, LLMResponseCache
 from aipg.prompting.prompt_generator import (
+    BatchLLMRankerPromptGenerator,
     BugFixerPromptGenerator,
     DefineTopicsPromptGenerator,
     FeedbackPromptGenerator,
@@ -21,6 +27,7 @@ from aipg.prompting.prompt_generator import (
     PromptGenerator,
 )
 from aipg.prompting.utils import format_project_validation_result_yaml
+from aipg.rag.ranker import EmbeddingRanker
 from aipg.rag.service import RagService
 from aipg.sandbox.domain import SandboxResult
 from aipg.sandbox.service import PythonSandboxService
@@ -29,13 +36,58 @@ StateT = TypeVar("StateT", bound=BaseModel)
 
 logger = logging.getLogger(__name__)
 
+_BOLD_START = "\033[1m"
+_BOLD_END = "\033[0m"
+
+_JSON_DECODER = json.JSONDecoder()
+# A streamed JSON reply that has not opened an object or array after this
+# many characters is treated as a failed attempt without waiting for the rest
+_JSON_PREAMBLE_LIMIT = 512
+
+
+def _json_reply_settled(text: str) -> bool:
+    """True once a streamed JSON reply is complete, or clearly is not JSON."""
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        return len(text) > _JSON_PREAMBLE_LIMIT
+    start = min(starts)
+    # Text before the value (e.g. an opening ```json fence) means the parser
+    # needs whatever follows it too, such as the closing fence
+    if text[:start].strip():
+        return False
+    try:
+        _JSON_DECODER.raw_decode(text, start)
+    except ValueError:
+        return False
+    return True
+
+
+def _set_retry_feedback(
+    chat_prompt: List[Dict[str, Any]],
+    base_prompt_len: int,
+    response: str | None,
+    feedback: str,
+) -> None:
+    """Replace the previous failed attempt in chat_prompt with the latest one.
+
+    Older failures rarely help the model and would make each retry's prompt
+    longer; the base messages stay untouched so cached prefixes still match.
+    """
+    del chat_prompt[base_prompt_len:]
+    chat_prompt.extend(
+        [
+            {"role": "assistant", "content": response or ""},
+            {"role": "user", "content": feedback},
+        ]
+    )
+
 
 class TaskInference(Generic[StateT]):
     def __init__(self, llm: LLMClient, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.llm: LLMClient = llm
         self.fallback_value: Optional[str] = None
-        self.ignored_value: List[str] = []
+        self.ignored_value: frozenset[str] = frozenset()
 
     def initialize_task(self, state: StateT):
         self.prompt_generator: Optional[PromptGenerator] = None
@@ -47,46 +99,162 @@ class TaskInference(Generic[StateT]):
             logger.warning("Failed to identify %s; setting to None.", key)
             return
 
+        # Values can be whole project markdowns; skip the string work unless
+        # the line is actually logged
+        if not logger.isEnabledFor(logging.INFO):
+            return
+
         prefix = key
         value_str = str(value).replace("\n", "\\n")
         if len(prefix) + len(value_str) > max_width:
             value_str = value_str[: max_width - len(prefix) - 3] + "..."
 
-        bold_start = "\033[1m"
-        bold_end = "\033[0m"
-
-        logger.info(f"{bold_start}{prefix}{bold_end}: {value_str}")
+        logger.info("%s%s%s: %s", _BOLD_START, prefix, _BOLD_END, value_str)
 
     async def transform(self, state: StateT) -> StateT:
         self.initialize_task(state)
         parser_output = await self._chat_and_parse_prompt_output()
         for k, v in parser_output.items():
-            if v in self.ignored_value:
+            # Parsed values can be lists, which are unhashable; only strings
+            # can be ignored values anyway
+            if isinstance(v, str) and v in self.ignored_value:
                 v = None
             self.log_value(k, v)
             setattr(state, k, self.post_process(state=state, value=v))
         return state
 
+    async def transform_many(
+        self, states: List[StateT], concurrency: Optional[int] = None
+    ) -> List[StateT | BaseException]:
+        """Transform several states concurrently, so their LLM calls overlap.
+
+        Results are in input order; a failed transform yields its exception.
+        ``concurrency`` caps how many transforms run at once.
+        """
+        semaphore = asyncio.Semaphore(concurrency) if concurrency else None
+
+        async def transform_one(state: StateT) -> StateT:
+            # transform keeps per-call state (prompt generator, valid values)
+            # on the instance, so each state gets its own shallow copy
+            inference = copy.copy(self)
+            if semaphore is None:
+                return await inference.transform(state)
+            async with semaphore:
+                return await inference.transform(state)
+
+        return list(
+            await asyncio.gather(
+                *(transform_one(state) for state in states), return_exceptions=True
+            )
+        )
+
     def post_process(self, state, value):
         return value
 
+    def _response_cache_key(
+        self,
+        chat_prompt: List[Dict[str, Any]],
+        response_format: Dict[str, Any] | None,
+    ) -> str | None:
+        """Cache key for the request, or None if its reply is not deterministic."""
+        # Only a real client knows what it sends; other clients (e.g. test
+        # doubles) always query
+        if not isinstance(self.llm, LLMClient):
+            return None
+        return self.llm.request_cache_key(chat_prompt, response_format)
+
+    @property
+    def response_cache(self) -> LLMResponseCache | None:
+        """The client's cache of parsed replies, with its hit/miss counters."""
+        return self.llm.response_cache if isinstance(self.llm, LLMClient) else None
+
+    async def _query(
+        self,
+        chat_prompt: List[Dict[str, Any]],
+        response_format: Dict[str, Any] | None = None,
+    ) -> str | None:
+        """llm.query, replaying the cached reply of an identical earlier request."""
+        cache_key = self._response_cache_key(chat_prompt, response_format)
+        if cache_key is not None:
+            cached = self.llm.response_cache.get(cache_key)
+            if cached is not None:
+                logger.debug("LLM response cache hit: %s", cache_key)
+                return cached
+        if self.llm.config.llm.stream_responses is True:
+            return await self._stream_query(chat_prompt, response_format)
+        return await self.llm.query(chat_prompt, response_format=response_format)
+
+    async def _stream_query(
+        self,
+        chat_prompt: List[Dict[str, Any]],
+        response_format: Dict[str, Any] | None,
+    ) -> str:
+        """Stream the reply, cutting a JSON reply off as soon as it is settled.
+
+        The stream stops once a complete JSON value has arrived, or once the
+        reply plainly is not JSON; a bad attempt then reaches the parser and
+        its retry without waiting for the rest of the generation.
+        """
+        # Without schema support the format is not sent and the model answers
+        # in whatever format its prompt asks for (e.g. YAML), so never cut it
+        expects_json = (
+            response_format is not None
+            and response_format.get("type") in {"json_schema", "json_object"}
+            and self.llm.supports_response_schema is True
+        )
+        pieces: List[str] = []
+        length = 0
+        opened = False
+        async with aclosing(
+            self.llm.stream(chat_prompt, response_format=response_format)
+        ) as stream:
+            async for piece in stream:
+                pieces.append(piece)
+                length += len(piece)
+                if not expects_json:
+                    continue
+                opened = opened or "{" in piece or "[" in piece
+                # Decoding is only worth trying when a value may have closed
+                if (opened and piece.rstrip().endswith(("}", "]"))) or (
+                    not opened and length > _JSON_PREAMBLE_LIMIT
+                ):
+                    if _json_reply_settled("".join(pieces)):
+                        break
+        return "".join(pieces)
+
+    def _remember_response(
+        self,
+        chat_prompt: List[Dict[str, Any]],
+        response: str | None,
+        response_format: Dict[str, Any] | None = None,
+    ) -> None:
+        """Cache a reply that parsed successfully for later identical requests."""
+        cache_key = self._response_cache_key(chat_prompt, response_format)
+        if cache_key is not None and response is not None:
+            self.llm.response_cache.put(cache_key, response)
+
     async def _chat_and_parse_prompt_output(self) -> Dict[str, Any]:
         try:
             assert self.prompt_generator is not None, (
                 "prompt_generator is not initialized"
             )
             chat_prompt = self.prompt_generator.generate_chat_prompt()
-            logger.debug(f"LLM chat_prompt:\n{chat_prompt}")
-            output = await self.llm.query(chat_prompt)
-            logger.debug(f"LLM output:\n{output}")
+            logger.debug("LLM chat_prompt:\n%s", chat_prompt)
+            output = await self._query(
+                chat_prompt, response_format=self.prompt_generator.response_format
+            )
+            logger.debug("LLM output:\n%s", output)
             parsed_output = self.prompt_generator.parser(
                 output,
                 valid_values=self.valid_values,
                 fallback_value=self.fallback_value,
             )
+            self._remember_response(
+                chat_prompt, output, self.prompt_generator.response_format
+            )
             return parsed_output
         except OutputParserException as e:
-            logger.error(f"Failed to parse output: {e}")
+            logger.error("Failed to parse output: %s", e)
             raise e
 
 
@@ -99,26 +267,29 @@ class DefineTopicsInference(TaskInference[ProjectsAgentState]):
         comments = state.comments
         self.prompt_generator = DefineTopicsPromptGenerator(comments=comments)
         chat_prompt = self.prompt_generator.generate_chat_prompt()
+        base_prompt_len = len(chat_prompt)
         last_exception: OutputParserException | None = None
         for attempt in range(1, 4):
-            response = await self.llm.query(chat_prompt)
+            response = await self._query(
+                chat_prompt, response_format=self.prompt_generator.response_format
+            )
             try:
                 topics = self.prompt_generator.parser(response)
+                self._remember_response(
+                    chat_prompt, response, self.prompt_generator.response_format
+                )
                 break
             except OutputParserException as e:
                 last_exception = e
-                chat_prompt.extend(
-                    [
-                        {"role": "assistant", "content": response or ""},
-                        {"role": "user", "content": str(e)},
-                    ]
-                )
+                _set_retry_feedback(chat_prompt, base_prompt_len, response, str(e))
                 logger.warning(
-                    f"Define topics parse failed on attempt {attempt}/3; adding error to context and retrying: {e}"
+                    "Define topics parse failed on attempt %s/3; adding error to context and retrying: %s",
+                    attempt,
+                    e,
                 )
         else:
             logger.error(
-                f"Failed to parse define topics after 3 attempts: {last_exception}"
+                "Failed to parse define topics after 3 attempts: %s", last_exception
             )
             raise (
                 last_exception
@@ -135,16 +306,67 @@ class ProjectGenerationInference(TaskInference[ProcessTopicAgentState]):
     def initialize_task(self, state: ProcessTopicAgentState):
         super().initialize_task(state)
 
+    async def transform_batch(
+        self, states: List[ProcessTopicAgentState], concurrency: Optional[int] = None
+    ) -> List[ProcessTopicAgentState | BaseException]:
+        """Generate the projects of several topics as one provider batch job.
+
+        Without Batch API support on the client this is transform_many. A
+        reply that is missing or fails to parse is generated again through
+        transform and its retry loop, at most ``concurrency`` at a time.
+        Results follow transform_many: input order, exceptions in place.
+        """
+        pending = [state for state in states if state.project is None]
+        if len(pending) > 1 and self.llm.supports_batch:
+            prompt_generators = [
+                ProjectGenerationPromptGenerator(topic=state.topic) for state in pending
+            ]
+            try:
+                replies = await self.llm.batch_query(
+                    [
+                        generator.generate_chat_prompt()
+                        for generator in prompt_generators
+                    ],
+                    response_format=ProjectGenerationPromptGenerator.response_format,
+                )
+            except Exception as e:
+                logger.warning(
+                    "Batched generation of %s projects failed; generating them one by one: %s",
+                    len(pending),
+                    e,
+                )
+            else:
+                for state, generator, reply in zip(pending, prompt_generators, replies):
+                    if reply is None:
+                        continue
+                    try:
+                        state.project = generator.parser(reply)
+                    except OutputParserException as e:
+                        logger.warning(
+                            "Batched project for topic '%s' failed to parse; regenerating it: %s",
+                            state.topic,
+                            e,
+                        )
+
+        # States that already have a project pass through transform unchanged
+        return await self.transform_many(states, concurrency=concurrency)
+
     async def transform(self, state: ProcessTopicAgentState) -> ProcessTopicAgentState:
         self.initialize_task(state)
         if state.project is None:
             self.prompt_generator = ProjectGenerationPromptGenerator(topic=state.topic)
             chat_prompt = self.prompt_generator.generate_chat_prompt()
+            base_prompt_len = len(chat_prompt)
             last_exception: OutputParserException | None = None
             for attempt in range(1, 4):
-                response = await self.llm.query(chat_prompt)
+                response = await self._query(
+                    chat_prompt, response_format=self.prompt_generator.response_format
+                )
                 try:
                     state.project = self.prompt_generator.parser(response)
+                    self._remember_response(
+                        chat_prompt, response, self.prompt_generator.response_format
+                    )
                     break
                 except OutputParserException as e:
                     last_exception = e
@@ -154,18 +376,17 @@ class ProjectGenerationInference(TaskInference[ProcessTopicAgentState]):
                         "Начни сразу с заголовка '# Микропроект для углубления темы: ...' "
                         "Не добавляй никакого текста до или после markdown контента."
                     )
-                    chat_prompt.extend(
-                        [
-                            {"role": "assistant", "content": response or ""},
-                            {"role": "user", "content": error_feedback},
-                        ]
+                    _set_retry_feedback(
+                        chat_prompt, base_prompt_len, response, error_feedback
                     )
                     logger.warning(
-                        f"Project parse failed on attempt {attempt}/3; adding error to context and retrying: {e}"
+                        "Project parse failed on attempt %s/3; adding error to context and retrying: %s",
+                        attempt,
+                        e,
                     )
             else:
                 logger.error(
-                    f"Failed to parse project after 3 attempts: {last_exception}"
+                    "Failed to parse project after 3 attempts: %s", last_exception
                 )
                 raise (
                     last_exception
@@ -181,9 +402,10 @@ class FeedbackInference(TaskInference[FeedbackAgentState]):
     def initialize_task(self, state: FeedbackAgentState):
         super().initialize_task(state)
 
-    async def transform(self, state: FeedbackAgentState) -> FeedbackAgentState:
-        self.initialize_task(state)
-        self.prompt_generator = FeedbackPromptGenerator(
+    def _create_prompt_generator(
+        self, state: FeedbackAgentState
+    ) -> FeedbackPromptGenerator:
+        return FeedbackPromptGenerator(
             user_solution=state.user_solution,
             project_goal=state.project.goal,
             project_description=state.project.description,
@@ -192,114 +414,357 @@ class FeedbackInference(TaskInference[FeedbackAgentState]):
             project_autotest=state.project.autotest,
             execution_result=state.execution_result,
         )
+
+    async def transform(self, state: FeedbackAgentState) -> FeedbackAgentState:
+        self.initialize_task(state)
+        self.prompt_generator = self._create_prompt_generator(state)
         chat_prompt = self.prompt_generator.generate_chat_prompt()
-        response = await self.llm.query(chat_prompt)
+        response = await self._query(
+            chat_prompt, response_format=self.prompt_generator.response_format
+        )
         feedback = self.prompt_generator.parser(response)
+        self._remember_response(
+            chat_prompt, response, self.prompt_generator.response_format
+        )
         state.feedback = feedback
         return state
 
+    async def stream(self, state: FeedbackAgentState) -> AsyncIterator[str]:
+        """Like transform, but yield the feedback text as it is generated.
+
+        state.feedback is set once the iterator is exhausted.
+        """
+        self.initialize_task(state)
+        prompt_generator = self._create_prompt_generator(state)
+        self.prompt_generator = prompt_generator
+        pieces: List[str] = []
+        async for piece in self.llm.stream(prompt_generator.generate_chat_prompt()):
+            pieces.append(piece)
+            yield piece
+        state.feedback = prompt_generator.parser("".join(pieces))
+
 
 class LLMRankerInference(TaskInference[ProcessTopicAgentState]):
     def __init__(
-        self, llm: LLMClient, similarity_threshold: float = 0.7, *args, **kwargs
+        self,
+        llm: LLMClient,
+        similarity_threshold: float = 0.7,
+        max_context_fraction: float = 0.8,
+        semantic_match_threshold: float | None = None,
+        *args,
+        **kwargs,
     ):
         super().__init__(llm, *args, **kwargs)
         self.similarity_threshold = similarity_threshold
+        # Share of the model context a batched ranking prompt may take up
+        self.max_context_fraction = max_context_fraction
+        # Vector similarity at which a candidate is taken as a paraphrase of
+        # the topic without asking the LLM; None always asks
+        self.semantic_match_threshold = semantic_match_threshold
 
     def initialize_task(self, state: ProcessTopicAgentState):
         super().initialize_task(state)
 
     async def transform(self, state: ProcessTopicAgentState) -> ProcessTopicAgentState:
         self.initialize_task(state)
-        # Extract topic strings from Topic2Project objects
-        candidate_topics = [candidate.topic for candidate in state.candidates]
-
-        # Early return if no candidates to avoid unnecessary LLM calls
-        if not candidate_topics:
-            logger.info(
-                f"No candidates found for topic: '{state.topic}', skipping LLM ranking"
-            )
+        if not self._needs_ranking(state):
             return state
 
+        candidate_topics, topic_indices = self._unique_candidate_topics(state)
         logger.info(
-            f"LLM Ranking initiated for topic: '{state.topic}' with {len(candidate_topics)} candidates"
+            "LLM Ranking initiated for topic: '%s' with %s candidates",
+            state.topic,
+            len(candidate_topics),
         )
-        logger.debug(f"Candidate topics: {candidate_topics}")
+        logger.debug("Candidate topics: %s", candidate_topics)
 
         self.prompt_generator = LLMRankerPromptGenerator(
             topic=state.topic, candidates=candidate_topics
         )
-        chat_prompt = self.prompt_generator.generate_chat_prompt()
-        last_exception: OutputParserException | None = None
-        for attempt in range(1, 4):
-            logger.debug(f"LLM Ranking attempt {attempt}/3 for topic '{state.topic}'")
-            response = await self.llm.query(chat_prompt)
-            try:
-                scores = self.prompt_generator.parser(response)
-                logger.debug(f"Parsed scores: {scores}")
+        scores = await self._query_scores(
+            self.prompt_generator,
+            parse_kwargs={"expected_count": len(candidate_topics)},
+            label=f"topic '{state.topic}'",
+            retry_hint=(
+                "IMPORTANT: Return ONLY a valid JSON array of floats between 0.0 and 1.0. "
+                f"Expected {len(candidate_topics)} scores for {len(candidate_topics)} candidates. "
+                "Example: [0.8, 0.2, 0.9]"
+            ),
+        )
+        self._select_best(state, [scores[i] for i in topic_indices])
+        return state
 
-                # Ensure we have the right number of scores
-                if len(scores) != len(state.candidates):
-                    raise OutputParserException(
-                        f"Expected {len(state.candidates)} scores, got {len(scores)}"
-                    )
+    async def transform_batch(
+        self, states: List[ProcessTopicAgentState], concurrency: Optional[int] = None
+    ) -> List[ProcessTopicAgentState | BaseException]:
+        """Rank the candidates of several topics with a single LLM call.
 
-                # Find the candidate with the highest score
-                if scores:  # Only proceed if we have scores
-                    best_score_idx = max(range(len(scores)), key=lambda i: scores[i])
-                    best_score = scores[best_score_idx]
-                    best_topic = state.candidates[best_score_idx].topic
+        States without candidates or with an exact match are settled without
+        the LLM. If the batched prompt would not fit the model context, or its
+        reply cannot be parsed, the states are ranked one by one instead, at
+        most ``concurrency`` at a time. Results follow transform_many: input
+        order, exceptions in place.
+        """
+        pending = []
+        for state in states:
+            self.initialize_task(state)
+            if self._needs_ranking(state):
+                pending.append(state)
 
-                    logger.info(
-                        f"Score analysis for topic '{state.topic}': best candidate '{best_topic}' with score {best_score:.3f}"
+        if len(pending) > 1:
+            unique_topics = [self._unique_candidate_topics(state) for state in pending]
+            self.prompt_generator = BatchLLMRankerPromptGenerator(
+                [
+                    (state.topic, candidate_topics)
+                    for state, (candidate_topics, _) in zip(pending, unique_topics)
+                ]
+            )
+            if self._fits_context(self.prompt_generator.generate_chat_prompt()):
+                logger.info(
+                    "LLM Ranking initiated for %s topics in one batch", len(pending)
+                )
+                expected_counts = [len(topics) for topics, _ in unique_topics]
+                try:
+                    grouped_scores = await self._query_scores(
+                        self.prompt_generator,
+                        parse_kwargs={"expected_counts": expected_counts},
+                        label=f"a batch of {len(pending)} topics",
+                        retry_hint=(
+                            "IMPORTANT: Return ONLY a JSON object with one entry per group, "
+                            'e.g. {"groups": [{"group": 1, "scores": [0.8, 0.2]}]}. '
+                            f"Expected score counts per group: {expected_counts}."
+                        ),
                     )
-
-                    # Only set best_candidate if score is above threshold
-                    if best_score >= self.similarity_threshold:
-                        state.project = state.candidates[best_score_idx].project
-                        state.topic = state.candidates[best_score_idx].topic
-                        logger.info(
-                            f"LLM Ranking successful: selected '{best_topic}' with score {best_score:.3f} (threshold: {self.similarity_threshold})"
-                        )
-                    else:
-                        state.project = None
-                        logger.info(
-                            f"LLM Ranking completed: no candidate meets threshold. Best score: {best_score:.3f} (threshold: {self.similarity_threshold})"
-                        )
-                else:
-                    # No scores available, no best candidate
-                    state.project = None
-                    logger.info(
-                        "LLM Ranking completed: no scores available, no best candidate selected"
+                except OutputParserException:
+                    logger.warning(
+                        "Batched LLM ranking failed; ranking topics one by one"
                     )
-                break
+                else:
+                    for i, (state, (_, topic_indices)) in enumerate(
+                        zip(pending, unique_topics)
+                    ):
+                        scores = grouped_scores[i]
+                        self._select_best(state, [scores[j] for j in topic_indices])
+                    return list(states)
+            else:
+                logger.info(
+                    "Batched ranking prompt for %s topics exceeds the context budget; ranking topics one by one",
+                    len(pending),
+                )
+
+        # States are matched by identity: equal topics may appear more than once
+        pending_ids = {id(state) for state in pending}
+        ranked = iter(await self.transform_many(pending, concurrency=concurrency))
+        return [next(ranked) if id(state) in pending_ids else state for state in states]
+
+    def _needs_ranking(self, state: ProcessTopicAgentState) -> bool:
+        """Settle states that need no LLM call; True if one is still required."""
+        # Early return if no candidates to avoid unnecessary LLM calls
+        if not state.candidates:
+            logger.info(
+                "No candidates found for topic: '%s', skipping LLM ranking", state.topic
+            )
+            return False
+
+        # An exact topic match scores 1.0 by definition; no need to ask the LLM
+        normalized_topic = state.topic.strip().lower()
+        for candidate in state.candidates:
+            if candidate.topic.strip().lower() == normalized_topic:
+                logger.info(
+                    "LLM Ranking skipped: exact match '%s' for topic '%s'",
+                    candidate.topic,
+                    state.topic,
+                )
+                state.project = candidate.project
+                state.topic = candidate.topic
+                return False
+
+        if self.semantic_match_threshold is not None:
+            best = max(
+                state.candidates,
+                key=lambda candidate: (
+                    -1.0 if candidate.similarity is None else candidate.similarity
+                ),
+            )
+            if (
+                best.similarity is not None
+                and best.similarity >= self.semantic_match_threshold
+            ):
+                logger.info(
+                    "LLM Ranking skipped: '%s' matches topic '%s' with similarity %.3f",
+                    best.topic,
+                    state.topic,
+                    best.similarity,
+                )
+                state.project = best.project
+                state.topic = best.topic
+                return False
+        return True
+
+    @staticmethod
+    def _unique_candidate_topics(
+        state: ProcessTopicAgentState,
+    ) -> tuple[List[str], List[int]]:
+        """Candidate topics without case/whitespace duplicates, for the prompt.
+
+        Also returns, per candidate, the index of its topic in that list, to
+        map the scores back onto all candidates.
+        """
+        positions: Dict[str, int] = {}
+        topics: List[str] = []
+        topic_indices: List[int] = []
+        for candidate in state.candidates:
+            key = candidate.topic.strip().lower()
+            if key not in positions:
+                positions[key] = len(topics)
+                topics.append(candidate.topic)
+            topic_indices.append(positions[key])
+        return topics, topic_indices
+
+    def _fits_context(self, chat_prompt: List[Dict[str, Any]]) -> bool:
+        # Models litellm does not know are assumed to have a small context
+        max_input_tokens = self.llm.max_input_tokens() or 8192
+        return (
+            self.llm.count_tokens(chat_prompt)
+            <= max_input_tokens * self.max_context_fraction
+        )
+
+    async def _query_scores(
+        self,
+        prompt_generator: PromptGenerator,
+        parse_kwargs: Dict[str, Any],
+        label: str,
+        retry_hint: str,
+    ) -> Any:
+        """Query the LLM and parse its scores, feeding parse errors back up to 3 times."""
+        chat_prompt = prompt_generator.generate_chat_prompt()
+        base_prompt_len = len(chat_prompt)
+        last_exception: OutputParserException | None = None
+        for attempt in range(1, 4):
+            logger.debug("LLM Ranking attempt %s/3 for %s", attempt, label)
+            response = await self._query(
+                chat_prompt, response_format=prompt_generator.response_format
+            )
+            try:
+                # The parser checks the score count in the same pass as the range
+                scores = prompt_generator.parser(response, **parse_kwargs)
+                self._remember_response(
+                    chat_prompt, response, prompt_generator.response_format
+                )
+                logger.debug("Parsed scores: %s", scores)
+                return scores
             except OutputParserException as e:
                 last_exception = e
-                error_feedback = (
-                    f"Parsing error: {e}\n\n"
-                    "IMPORTANT: Return ONLY a valid JSON array of floats between 0.0 and 1.0. "
-                    f"Expected {len(state.candidates)} scores for {len(state.candidates)} candidates. "
-                    "Example: [0.8, 0.2, 0.9]"
-                )
-                chat_prompt.extend(
-                    [
-                        {"role": "assistant", "content": response or ""},
-                        {"role": "user", "content": error_feedback},
-                    ]
+                _set_retry_feedback(
+                    chat_prompt,
+                    base_prompt_len,
+                    response,
+                    f"Parsing error: {e}\n\n{retry_hint}",
                 )
                 logger.warning(
-                    f"LLM ranker parse failed on attempt {attempt}/3; adding error to context and retrying: {e}"
+                    "LLM ranker parse failed on attempt %s/3; adding error to context and retrying: %s",
+                    attempt,
+                    e,
                 )
+        logger.error(
+            "Failed to parse LLM ranker scores after 3 attempts: %s", last_exception
+        )
+        raise (
+            last_exception
+            if last_exception
+            else OutputParserException(
+                "LLM ranker parsing failed with no additional context"
+            )
+        )
+
+    def _select_best(self, state: ProcessTopicAgentState, scores: List[float]) -> None:
+        """Pick the best-scoring candidate if it clears the similarity threshold."""
+        if not scores:
+            # No scores available, no best candidate
+            state.project = None
+            logger.info(
+                "LLM Ranking completed: no scores available, no best candidate selected"
+            )
+            return
+
+        # float64 keeps the parsed values exact for the threshold comparison;
+        # argmax returns the first best candidate, as max() did
+        scores_arr = np.asarray(scores, dtype=np.float64)
+        best_score_idx = int(scores_arr.argmax())
+        best_score = float(scores_arr[best_score_idx])
+        best_topic = state.candidates[best_score_idx].topic
+        logger.info(
+            "Score analysis for topic '%s': best candidate '%s' with score %.3f",
+            state.topic,
+            best_topic,
+            best_score,
+        )
+
+        # Only set best_candidate if score is above threshold
+        if best_score >= self.similarity_threshold:
+            state.project = state.candidates[best_score_idx].project
+            state.topic = state.candidates[best_score_idx].topic
+            logger.info(
+                "LLM Ranking successful: selected '%s' with score %.3f (threshold: %s)",
+                best_topic,
+                best_score,
+                self.similarity_threshold,
+            )
         else:
-            logger.error(
-                f"Failed to parse LLM ranker scores after 3 attempts: {last_exception}"
+            state.project = None
+            logger.info(
+                "LLM Ranking completed: no candidate meets threshold. Best score: %.3f (threshold: %s)",
+                best_score,
+                self.similarity_threshold,
             )
-            raise (
-                last_exception
-                if last_exception
-                else OutputParserException(
-                    "LLM ranker parsing failed with no additional context"
-                )
+
+
+class EmbeddingRankerInference(TaskInference[ProcessTopicAgentState]):
+    def __init__(
+        self,
+        llm: LLMClient,
+        ranker: EmbeddingRanker,
+        similarity_threshold: float = 0.7,
+        *args,
+        **kwargs,
+    ):
+        super().__init__(llm, *args, **kwargs)
+        self.ranker = ranker
+        self.similarity_threshold = similarity_threshold
+
+    def initialize_task(self, state: ProcessTopicAgentState):
+        super().initialize_task(state)
+
+    async def transform(self, state: ProcessTopicAgentState) -> ProcessTopicAgentState:
+        self.initialize_task(state)
+        candidate_topics = [candidate.topic for candidate in state.candidates]
+        if not candidate_topics:
+            logger.info(
+                "No candidates found for topic: '%s', skipping embedding ranking",
+                state.topic,
+            )
+            return state
+
+        scores = await self.ranker.rank(state.topic, candidate_topics)
+        logger.debug("Embedding similarity scores: %s", scores)
+
+        best_score_idx = int(scores.argmax())
+        best_score = float(scores[best_score_idx])
+        if best_score >= self.similarity_threshold:
+            state.project = state.candidates[best_score_idx].project
+            state.topic = state.candidates[best_score_idx].topic
+            logger.info(
+                "Embedding ranking successful: selected '%s' with score %.3f (threshold: %s)",
+                state.topic,
+                best_score,
+                self.similarity_threshold,
+            )
+        else:
+            state.project = None
+            logger.info(
+                "Embedding ranking completed: no candidate meets threshold. Best score: %.3f (threshold: %s)",
+                best_score,
+                self.similarity_threshold,
             )
         return state
 
@@ -315,11 +780,13 @@ class RAGServiceInference(TaskInference[ProcessTopicAgentState]):
     async def transform(self, state: ProcessTopicAgentState) -> ProcessTopicAgentState:
         self.initialize_task(state)
         # Search for candidates using the RAG service
-        logger.info(f"RAG Service Inference initiated for topic: '{state.topic}'")
+        logger.info("RAG Service Inference initiated for topic: '%s'", state.topic)
         candidates = await self.rag_service.try_to_get(state.topic)
         state.candidates = candidates
         logger.info(
-            f"RAG Service Inference completed: found {len(candidates)} candidates for topic '{state.topic}'"
+            "RAG Service Inference completed: found %s candidates for topic '%s'",
+            len(candidates),
+            state.topic,
         )
         return state
 
@@ -338,40 +805,41 @@ class ProjectValidatorInference(TaskInference[ProcessTopicAgentState]):
             project_markdown=state.project.raw_markdown
         )
         chat_prompt = self.prompt_generator.generate_chat_prompt()
+        base_prompt_len = len(chat_prompt)
         last_exception: OutputParserException | None = None
         for attempt in range(1, 4):
-            response = await self.llm.query(chat_prompt)
+            response = await self._query(
+                chat_prompt, response_format=self.prompt_generator.response_format
+            )
             try:
                 validation_result = self.prompt_generator.parser(response)
+                self._remember_response(
+                    chat_prompt, response, self.prompt_generator.response_format
+                )
                 state.validation_result = validation_result
                 break
             except OutputParserException as e:
                 last_exception = e
                 error_feedback = (
                     f"Parsing error: {e}\n\n"
-                    "IMPORTANT: Return ONLY valid YAML with 'is_valid' and 'checks' fields. "
+                    "IMPORTANT: Return ONLY a valid JSON object with 'is_valid' and 'checks' fields. "
                     "Example:\n"
-                    "is_valid: true\n"
-                    "checks:\n"
-                    "  - rule_id: 'SOLVABILITY'\n"
-                    "    passed: true\n"
-                    "    comment: 'OK'\n"
-                    "  - rule_id: 'AUTOTEST_SCOPE'\n"
-                    "    passed: true\n"
-                    "    comment: 'OK'"
+                    '{"is_valid": true, "checks": ['
+                    '{"rule_id": "SOLVABILITY", "passed": true, "comment": "OK"}, '
+                    '{"rule_id": "AUTOTEST_SCOPE", "passed": true, "comment": "OK"}]}'
                 )
-                chat_prompt.extend(
-                    [
-                        {"role": "assistant", "content": response or ""},
-                        {"role": "user", "content": error_feedback},
-                    ]
+                _set_retry_feedback(
+                    chat_prompt, base_prompt_len, response, error_feedback
                 )
                 logger.warning(
-                    f"Project validator parse failed on attempt {attempt}/3; adding error to context and retrying: {e}"
+                    "Project validator parse failed on attempt %s/3; adding error to context and retrying: %s",
+                    attempt,
+                    e,
                 )
         else:
             logger.error(
-                f"Failed to parse project validator response after 3 attempts: {last_exception}"
+                "Failed to parse project validator response after 3 attempts: %s",
+                last_exception,
             )
             raise (
                 last_exception
@@ -403,11 +871,17 @@ class ProjectCorrectorInference(TaskInference[ProcessTopicAgentState]):
             validation_report=validation_report,
         )
         chat_prompt = self.prompt_generator.generate_chat_prompt()
+        base_prompt_len = len(chat_prompt)
         last_exception: OutputParserException | None = None
         for attempt in range(1, 4):
-            response = await self.llm.query(chat_prompt)
+            response = await self._query(
+                chat_prompt, response_format=self.prompt_generator.response_format
+            )
             try:
                 corrected_project = self.prompt_generator.parser(response)
+                self._remember_response(
+                    chat_prompt, response, self.prompt_generator.response_format
+                )
                 state.project = corrected_project
                 break
             except OutputParserException as e:
@@ -418,18 +892,18 @@ class ProjectCorrectorInference(TaskInference[ProcessTopicAgentState]):
                     "comments, or code blocks. Start directly with '# Микропроект для углубления темы:' "
                     "and provide the complete corrected project in the same format as the original."
                 )
-                chat_prompt.extend(
-                    [
-                        {"role": "assistant", "content": response or ""},
-                        {"role": "user", "content": error_feedback},
-                    ]
+                _set_retry_feedback(
+                    chat_prompt, base_prompt_len, response, error_feedback
                 )
                 logger.warning(
-                    f"Project corrector parse failed on attempt {attempt}/3; adding error to context and retrying: {e}"
+                    "Project corrector parse failed on attempt %s/3; adding error to context and retrying: %s",
+                    attempt,
+                    e,
                 )
         else:
             logger.error(
-                f"Failed to parse project corrector response after 3 attempts: {last_exception}"
+                "Failed to parse project corrector response after 3 attempts: %s",
+                last_exception,
             )
             raise (
                 last_exception
@@ -455,7 +929,7 @@ class CheckAutotestSandboxInference(TaskInference[ProcessTopicAgentState]):
         self.initialize_task(state)
         if state.project is not None:
             # Ensure autotest contains the placeholder for student solution
-            if "{STUDENT_SOLUTION}" not in state.project.autotest:
+            if not state.project.has_solution_placeholder:
                 state.execution_result = SandboxResult(
                     stdout="",
                     stderr="{STUDENT_SOLUTION} должен присутствовать в Автотесте. Проверь его и попробуй снова.",
@@ -463,9 +937,7 @@ class CheckAutotestSandboxInference(TaskInference[ProcessTopicAgentState]):
                     timed_out=False,
                 )
                 return state
-            code = state.project.autotest.replace(
-                "{STUDENT_SOLUTION}", state.project.expert_solution
-            )
+            code = state.project.render_autotest(state.project.expert_solution)
             result = await self.sandbox_service.run_code(code)
             state.execution_result = result
         return state
@@ -491,9 +963,10 @@ class BugFixerInference(TaskInference[ProcessTopicAgentState]):
 
         logger.info("Bug fixing initiated for project with execution errors")
         logger.debug(
-            f"Execution result: exit_code={state.execution_result.exit_code}, "
-            f"timed_out={state.execution_result.timed_out}, "
-            f"stderr={state.execution_result.stderr}"
+            "Execution result: exit_code=%s, timed_out=%s, stderr=%s",
+            state.execution_result.exit_code,
+            state.execution_result.timed_out,
+            state.execution_result.stderr,
         )
 
         self.prompt_generator = BugFixerPromptGenerator(
@@ -501,11 +974,17 @@ class BugFixerInference(TaskInference[ProcessTopicAgentState]):
             sandbox_result=state.execution_result,
         )
         chat_prompt = self.prompt_generator.generate_chat_prompt()
+        base_prompt_len = len(chat_prompt)
         last_exception: OutputParserException | None = None
         for attempt in range(1, 4):
-            response = await self.llm.query(chat_prompt)
+            response = await self._query(
+                chat_prompt, response_format=self.prompt_generator.response_format
+            )
             try:
                 fixed_project = self.prompt_generator.parser(response)
+                self._remember_response(
+                    chat_prompt, response, self.prompt_generator.response_format
+                )
                 state.project = fixed_project
                 logger.info("Bug fixing completed successfully")
                 break
@@ -517,18 +996,18 @@ class BugFixerInference(TaskInference[ProcessTopicAgentState]):
                     "comments, or code blocks. Start directly with '# Микропроект для углубления темы:' "
                     "and provide the complete corrected project in the same format as the original."
                 )
-                chat_prompt.extend(
-                    [
-                        {"role": "assistant", "content": response or ""},
-                        {"role": "user", "content": error_feedback},
-                    ]
+                _set_retry_feedback(
+                    chat_prompt, base_prompt_len, response, error_feedback
                 )
                 logger.warning(
-                    f"Bug fixer parse failed on attempt {attempt}/3; adding error to context and retrying: {e}"
+                    "Bug fixer parse failed on attempt %s/3; adding error to context and retrying: %s",
+                    attempt,
+                    e,
                 )
         else:
             logger.error(
-                f"Failed to parse bug fixer response after 3 attempts: {last_exception}"
+                "Failed to parse bug fixer response after 3 attempts: %s",
+                last_exception,
             )
             raise (
                 last_exception
@@ -553,9 +1032,7 @@ class CheckUserSolutionSandboxInference(TaskInference[FeedbackAgentState]):
     async def transform(self, state: FeedbackAgentState) -> FeedbackAgentState:
         self.initialize_task(state)
         if state.project is not None:
-            code = state.project.autotest.replace(
-                "{STUDENT_SOLUTION}", state.user_solution
-            )
+            code = state.project.render_autotest(state.user_solution)
             result = await self.sandbox_service.run_code(code)
             state.execution_result = result
         return state
@@ -0,0 +1,95 @@
+from typing import Any, Callable, List, Optional
+from unittest.mock import AsyncMock
+
+import pytest
+
+from aipg.configs.app_config import AppConfig, LLMConfig
+from aipg.domain import Project
+from aipg.llm import LLMClient
+from aipg.rag.ports import EmbeddingPort
+
+# The generator's markdown layout, filled in from the Project fields
+PROJECT_MARKDOWN = """# Микропроект для углубления темы: {topic}
+
+## Цель микропроекта
+{goal}
+
+## Описание микропроекта
+{description}
+
+## Входные данные
+{input_data}
+
+## Ожидаемый результат
+{expected_output}
+
+## Эталонное решение
+```python
+{expert_solution}
+```
+
+## Автотест
+```python
+{autotest}
+```
+"""
+
+
+class LengthEmbedder(EmbeddingPort):
+    """Embeds each text as its length and records every call it receives."""
+
+    def __init__(self) -> None:
+        self.calls: List[List[str]] = []
+
+    async def embedding_processor(self, texts: List[str]) -> List[List[float]]:
+        self.calls.append(list(texts))
+        return [[float(len(t))] for t in texts]
+
+
+@pytest.fixture
+def length_embedder() -> LengthEmbedder:
+    return LengthEmbedder()
+
+
+@pytest.fixture
+def make_project() -> Callable[..., Project]:
+    """Factory for a minimal valid Project; keyword arguments override fields.
+
+    Unless given, raw_markdown is the project in the generator's layout, so
+    it parses back to the same fields.
+    """
+
+    def make(**overrides: Any) -> Project:
+        fields = {
+            "topic": "topic",
+            "goal": "Цель.",
+            "description": "Описание.",
+            "input_data": "Список чисел.",
+            "expected_output": "Отсортированный список.",
+            "expert_solution": "print('solution')",
+            "autotest": "{STUDENT_SOLUTION}",
+            **overrides,
+        }
+        fields.setdefault("raw_markdown", PROJECT_MARKDOWN.format(**fields))
+        return Project(**fields)
+
+    return make
+
+
+@pytest.fixture
+def make_client() -> Callable[..., LLMClient]:
+    """Factory for an LLMClient without disk caching.
+
+    Keyword arguments are LLMConfig fields; with ``replies`` given, query()
+    is mocked to return them in order.
+    """
+
+    def make(replies: Optional[List[str]] = None, **llm_options: Any) -> LLMClient:
+        config = AppConfig(llm=LLMConfig(**{"api_key": "test-key", **llm_options}))
+        config.llm.caching.enabled = False
+        client = LLMClient(config)
+        if replies is not None:
+            client.query = AsyncMock(side_effect=replies)  # type: ignore[method-assign]
+        return client
+
+    return make
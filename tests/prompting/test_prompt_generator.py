@@ -0,0 +1,44 @@
+from pathlib import Path
+
+import pytest
+
+from aipg.prompting.prompt_generator import (
+    DefineTopicsPromptGenerator,
+    ProjectGenerationPromptGenerator,
+    ProjectValidatorPromptGenerator,
+)
+
+
+@pytest.mark.unit
+def test_system_prompt_file_is_read_once(monkeypatch: pytest.MonkeyPatch) -> None:
+    reads: list[Path] = []
+    read_text = Path.read_text
+
+    def counting_read_text(self: Path, *args, **kwargs) -> str:
+        reads.append(self)
+        return read_text(self, *args, **kwargs)
+
+    ProjectGenerationPromptGenerator(topic="warm-up").system_prompt
+    monkeypatch.setattr(Path, "read_text", counting_read_text)
+
+    prompts = [
+        ProjectGenerationPromptGenerator(topic=topic).generate_chat_prompt()
+        for topic in ["a", "b"]
+    ]
+
+    assert reads == []
+    assert prompts[0][0]["content"] == prompts[1][0]["content"] != ""
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize(
+    "generator",
+    [
+        DefineTopicsPromptGenerator(comments=["comment"]),
+        ProjectValidatorPromptGenerator(project_markdown="project"),
+    ],
+)
+def test_prompts_sent_with_json_schema_ask_for_json(generator) -> None:
+    assert generator.response_format["type"] == "json_schema"
+    assert "JSON" in generator.system_prompt
+    assert "YAML" not in generator.system_prompt
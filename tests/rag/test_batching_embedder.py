@@ -0,0 +1,38 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from aipg.rag.adapters import BatchingEmbedder
+from tests.conftest import LengthEmbedder
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_batching_embedder_coalesces_concurrent_calls(
+    length_embedder: LengthEmbedder,
+) -> None:
+    embedder = BatchingEmbedder(length_embedder)
+
+    results = await asyncio.gather(
+        embedder.embedding_processor(["a"]),
+        embedder.embedding_processor(["bb", "ccc"]),
+        embedder.embedding_processor(["dddd"]),
+    )
+
+    assert [r.tolist() for r in results] == [[[1.0]], [[2.0], [3.0]], [[4.0]]]
+    assert length_embedder.calls == [["a", "bb", "ccc", "dddd"]]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_batching_embedder_passes_large_calls_through(
+    length_embedder: LengthEmbedder,
+) -> None:
+    embedder = BatchingEmbedder(length_embedder, max_batch_size=2)
+
+    result = await embedder.embedding_processor(["a", "bb"])
+
+    assert result.dtype == np.float32
+    assert result.tolist() == [[1.0], [2.0]]
+    assert length_embedder.calls == [["a", "bb"]]
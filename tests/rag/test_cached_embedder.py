@@ -0,0 +1,53 @@
+from pathlib import Path
+
+import pytest
+
+from aipg.rag.adapters import CachedEmbedder
+from tests.conftest import LengthEmbedder
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_cached_embedder_embeds_repeated_texts_once(
+    length_embedder: LengthEmbedder,
+) -> None:
+    embedder = CachedEmbedder(length_embedder)
+
+    first = await embedder.embedding_processor(["a", "bb", "a"])
+    second = await embedder.embedding_processor(["bb", "ccc", "a"])
+
+    assert first.tolist() == [[1.0], [2.0], [1.0]]
+    assert second.tolist() == [[2.0], [3.0], [1.0]]
+    assert length_embedder.calls == [["a", "bb"], ["ccc"]]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_cached_embedder_evicts_least_recently_used(
+    length_embedder: LengthEmbedder,
+) -> None:
+    embedder = CachedEmbedder(length_embedder, cache_size=2)
+
+    await embedder.embedding_processor(["a", "bb"])
+    await embedder.embedding_processor(["a"])
+    await embedder.embedding_processor(["ccc"])
+    await embedder.embedding_processor(["a", "bb"])
+
+    assert length_embedder.calls == [["a", "bb"], ["ccc"], ["bb"]]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_cached_embedder_persists_vectors_on_disk(
+    tmp_path: Path, length_embedder: LengthEmbedder
+) -> None:
+    pytest.importorskip("diskcache")
+    await CachedEmbedder(
+        length_embedder, persist_dir=str(tmp_path)
+    ).embedding_processor(["bb"])
+
+    restarted = CachedEmbedder(length_embedder, persist_dir=str(tmp_path))
+    result = await restarted.embedding_processor(["bb", "a"])
+
+    assert result.tolist() == [[2.0], [1.0]]
+    assert length_embedder.calls == [["bb"], ["a"]]
@@ -0,0 +1,123 @@
+from pathlib import Path
+from typing import Callable, List
+
+import numpy as np
+import pytest
+
+from aipg.domain import Project
+from aipg.rag.adapters import ChromaDbAdapter
+from aipg.rag.ports import EmbeddingPort
+from aipg.rag.service import RagService
+
+
+class FixedEmbedder(EmbeddingPort):
+    async def embedding_processor(self, texts: List[str]) -> List[List[float]]:
+        return [[1.0, 0.0] for _ in texts]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_query_batch_returns_results_per_query(
+    tmp_path: Path, make_project: Callable[..., Project]
+) -> None:
+    pytest.importorskip("chromadb")
+    adapter = ChromaDbAdapter(collection_name="test", persist_dir=str(tmp_path))
+    await adapter.add_arrays(
+        ids=["a", "b"],
+        embeddings=np.array([[1.0, 0.0], [0.0, 1.0]], dtype=np.float32),
+        metadatas=[
+            {"topic": "a", "project_md": make_project(topic="a").raw_markdown},
+            {"topic": "b", "project_md": make_project(topic="b").raw_markdown},
+        ],
+    )
+
+    results = await adapter.query_batch([[0.0, 1.0], [1.0, 0.1]], k=1)
+
+    assert [[item.topic for item in row] for row in results] == [["b"], ["a"]]
+    assert results[0][0].micro_project.topic == "b"
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_saved_project_round_trips_through_stored_fields(
+    tmp_path: Path, make_project: Callable[..., Project]
+) -> None:
+    pytest.importorskip("chromadb")
+    adapter = ChromaDbAdapter(collection_name="test", persist_dir=str(tmp_path))
+    service = RagService(embedder=FixedEmbedder(), vector_store=adapter)
+    project = make_project(
+        raw_markdown="free-form notes, not in the generator's markdown layout"
+    )
+
+    await service.save("topic", project)
+    result = await service.try_to_get("topic")
+
+    assert [t2p.project for t2p in result] == [project]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_query_ranks_by_direction_not_magnitude(
+    tmp_path: Path, make_project: Callable[..., Project]
+) -> None:
+    pytest.importorskip("chromadb")
+    adapter = ChromaDbAdapter(collection_name="test", persist_dir=str(tmp_path))
+    await adapter.add(
+        ids=["near", "far"],
+        embeddings=[[1.0, 0.0], [10.0, 10.0]],
+        metadatas=[
+            {"topic": "near", "project_md": make_project(topic="near").raw_markdown},
+            {"topic": "far", "project_md": make_project(topic="far").raw_markdown},
+        ],
+    )
+
+    results = await adapter.query([1.0, 0.2], k=2)
+
+    assert [item.topic for item in results] == ["near", "far"]
+    # Reported similarity is the cosine of the (normalised) vectors
+    assert results[0].similarity == pytest.approx(1 / (1.04**0.5), abs=1e-4)
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_adapters_share_persistent_collection(tmp_path: Path) -> None:
+    pytest.importorskip("chromadb")
+    first = ChromaDbAdapter(collection_name="test", persist_dir=str(tmp_path))
+    second = ChromaDbAdapter(collection_name="test", persist_dir=str(tmp_path))
+    other = ChromaDbAdapter(collection_name="other", persist_dir=str(tmp_path))
+
+    collection = await first._get_collection()
+
+    assert await second._get_collection() is collection
+    assert await other._get_collection() is not collection
+    assert await other._get_client() is await first._get_client()
+
+
+@pytest.mark.unit
+def test_url_maps_to_http_client_args() -> None:
+    pytest.importorskip("chromadb")
+    adapter = ChromaDbAdapter(collection_name="test", url="https://chroma.local")
+
+    assert adapter._http_client_args() == {
+        "host": "chroma.local",
+        "port": 443,
+        "ssl": True,
+    }
+    with pytest.raises(ValueError):
+        ChromaDbAdapter(collection_name="test", persist_dir="x", url="http://h:1")
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_hnsw_params_apply_to_new_collection(tmp_path: Path) -> None:
+    pytest.importorskip("chromadb")
+    adapter = ChromaDbAdapter(
+        collection_name="test",
+        persist_dir=str(tmp_path),
+        hnsw_params={"search_ef": 64},
+    )
+
+    collection = await adapter._get_collection()
+
+    assert collection.metadata["hnsw:search_ef"] == 64
+    assert collection.metadata["hnsw:space"] == "ip"
@@ -0,0 +1,33 @@
+from typing import Dict, List
+
+import pytest
+
+from aipg.rag.ports import EmbeddingPort
+from aipg.rag.ranker import EmbeddingRanker
+
+
+class LookupEmbedder(EmbeddingPort):
+    def __init__(self, vectors: Dict[str, List[float]]) -> None:
+        self.vectors = vectors
+
+    async def embedding_processor(self, texts: List[str]) -> List[List[float]]:
+        return [self.vectors[text] for text in texts]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_rank_returns_cosine_similarity_per_candidate() -> None:
+    embedder = LookupEmbedder(
+        {
+            "query": [1.0, 0.0],
+            "same": [3.0, 0.0],
+            "orthogonal": [0.0, 2.0],
+            "opposite": [-1.0, 0.0],
+        }
+    )
+    ranker = EmbeddingRanker(embedder)
+
+    scores = await ranker.rank("query", ["same", "orthogonal", "opposite"])
+
+    assert scores == pytest.approx([1.0, 0.0, -1.0])
+    assert len(await ranker.rank("query", [])) == 0
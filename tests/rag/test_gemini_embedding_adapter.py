@@ -0,0 +1,48 @@
+from types import SimpleNamespace
+from typing import List
+
+import pytest
+
+from aipg.rag.adapters import GeminiEmbeddingAdapter
+
+
+class FakeModels:
+    def __init__(self) -> None:
+        self.calls: List[List[str]] = []
+
+    async def embed_content(self, model: str, contents: List[str]) -> SimpleNamespace:
+        self.calls.append(list(contents))
+        return SimpleNamespace(
+            embeddings=[SimpleNamespace(values=[float(len(t))]) for t in contents]
+        )
+
+
+def create_fake_client(models: FakeModels) -> SimpleNamespace:
+    return SimpleNamespace(aio=SimpleNamespace(models=models))
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_embedding_processor_batches_and_preserves_order() -> None:
+    models = FakeModels()
+    adapter = GeminiEmbeddingAdapter(
+        client=create_fake_client(models), batch_size=2, max_workers=2
+    )
+    texts = ["a", "bb", "ccc", "dddd", "eeeee"]
+
+    result = await adapter.embedding_processor(texts)
+
+    assert result.tolist() == [[1.0], [2.0], [3.0], [4.0], [5.0]]
+    assert all(len(call) <= 2 for call in models.calls)
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_embedding_processor_sends_duplicate_texts_once() -> None:
+    models = FakeModels()
+    adapter = GeminiEmbeddingAdapter(client=create_fake_client(models))
+
+    result = await adapter.embedding_processor(["bb", "a", "bb", "a"])
+
+    assert result.tolist() == [[2.0], [1.0], [2.0], [1.0]]
+    assert models.calls == [["bb", "a"]]
@@ -1,5 +1,6 @@
 from typing import Any, List, Optional
 
+import numpy as np
 import pytest
 
 from aipg.domain import Project, Topic2Project
@@ -210,6 +211,7 @@ async def test_save_success() -> None:
     call = vector_store.add_calls[0]
     assert len(call["ids"]) == 1
     assert len(call["embeddings"]) == 1
+    assert call["embeddings"].dtype == np.float32
     assert len(call["metadatas"]) == 1
     assert call["metadatas"][0]["topic"] == "test-topic"
     assert call["metadatas"][0]["project_md"] == "test content"
@@ -234,3 +236,177 @@ def test_constructor_raises_when_k_candidates_invalid() -> None:
             vector_store=vector_store,
             k_candidates=-1,
         )
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_write_behind_batches_saves_until_flush() -> None:
+    vector_store = DummyVectorStore()
+    service = RagService(
+        embedder=DummyEmbedder(),
+        vector_store=vector_store,
+        write_behind=True,
+        write_flush_interval_ms=50,
+    )
+
+    for topic in ["t1", "t2", "t1"]:
+        await service.save(topic, create_topic2project(topic).project)
+    assert vector_store.add_calls == []
+
+    await service.flush()
+
+    assert len(vector_store.add_calls) == 1
+    call = vector_store.add_calls[0]
+    assert [m["topic"] for m in call["metadatas"]] == ["t1", "t2"]
+    assert len(call["ids"]) == len(call["embeddings"]) == 2
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_aclose_writes_queued_saves_and_stops_worker() -> None:
+    vector_store = DummyVectorStore()
+    service = RagService(
+        embedder=DummyEmbedder(),
+        vector_store=vector_store,
+        write_behind=True,
+        write_flush_interval_ms=50,
+    )
+    await service.save("t1", create_topic2project("t1").project)
+    worker = service._writes._worker
+
+    await service.aclose()
+
+    assert len(vector_store.add_calls) == 1
+    assert worker is not None and worker.cancelled()
+    # The service stays usable after closing
+    await service.save("t2", create_topic2project("t2").project)
+    await service.aclose()
+    assert len(vector_store.add_calls) == 2
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_try_to_get_many_returns_candidates_per_topic() -> None:
+    candidates = [create_retrieved_item("t1"), create_retrieved_item("t2")]
+    service = RagService(
+        embedder=DummyEmbedder(),
+        vector_store=DummyVectorStore(candidates=candidates),
+        k_candidates=1,
+    )
+
+    result = await service.try_to_get_many(["a", "b"])
+
+    assert [[t2p.topic for t2p in row] for row in result] == [["t1"], ["t1"]]
+    assert await service.try_to_get_many([]) == []
+
+
+class CountingEmbedder(DummyEmbedder):
+    def __init__(self) -> None:
+        super().__init__()
+        self.calls = 0
+
+    async def embedding_processor(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        return await super().embedding_processor(texts)
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_try_to_get_caches_exact_topic_until_save() -> None:
+    embedder = CountingEmbedder()
+    service = RagService(
+        embedder=embedder,
+        vector_store=DummyVectorStore(candidates=[create_retrieved_item("t1")]),
+    )
+
+    first = await service.try_to_get("t1")
+    first[0].project.goal = "mutated"
+    second = await service.try_to_get("t1")
+    assert embedder.calls == 1
+    assert second[0].project.goal == "goal_t1"
+
+    await service.save("t2", create_topic2project("t2").project)
+    await service.try_to_get("t1")
+    assert embedder.calls == 3
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_save_many_uses_one_embedding_call_and_one_add() -> None:
+    embedder = CountingEmbedder()
+    vector_store = DummyVectorStore()
+    service = RagService(embedder=embedder, vector_store=vector_store)
+
+    await service.save_many(
+        [(topic, create_topic2project(topic).project) for topic in ["t1", "t2"]]
+    )
+
+    assert embedder.calls == 1
+    assert len(vector_store.add_calls) == 1
+    call = vector_store.add_calls[0]
+    assert [m["topic"] for m in call["metadatas"]] == ["t1", "t2"]
+    assert len(call["ids"]) == len(set(call["ids"])) == 2
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_async_save_embeds_in_background_writer() -> None:
+    embedder = CountingEmbedder()
+    vector_store = DummyVectorStore()
+    service = RagService(
+        embedder=embedder, vector_store=vector_store, write_flush_interval_ms=50
+    )
+
+    for topic in ["t1", "t2"]:
+        await service.save(
+            topic, create_topic2project(topic).project, generate_embedding="async"
+        )
+    assert embedder.calls == 0
+
+    await service.flush()
+
+    assert embedder.calls == 1
+    assert len(vector_store.add_calls) == 1
+    assert len(vector_store.add_calls[0]["embeddings"]) == 2
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_save_reuses_embedding_from_missed_lookup() -> None:
+    embedder = CountingEmbedder()
+    vector_store = DummyVectorStore()
+    service = RagService(embedder=embedder, vector_store=vector_store)
+
+    assert await service.try_to_get("t1") == []
+    await service.save("t1", create_topic2project("t1").project)
+    await service.save(
+        "t2",
+        create_topic2project("t2").project,
+        precomputed_embedding=[0.0, 1.0, 0.0],
+    )
+
+    assert embedder.calls == 1
+    assert vector_store.add_calls[1]["embeddings"].tolist() == [[0.0, 1.0, 0.0]]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_results_cache_normalizes_topic_and_expires(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    embedder = CountingEmbedder()
+    service = RagService(
+        embedder=embedder,
+        vector_store=DummyVectorStore(candidates=[create_retrieved_item("t1")]),
+        results_cache_ttl=60,
+    )
+    now = 1000.0
+    monkeypatch.setattr("aipg.rag.service.time.monotonic", lambda: now)
+
+    await service.try_to_get("Python Lists")
+    await service.try_to_get("  python lists ")
+    assert embedder.calls == 1
+
+    now += 61
+    await service.try_to_get("python lists")
+    assert embedder.calls == 2
@@ -0,0 +1,153 @@
+import asyncio
+import os
+import subprocess
+import sys
+from typing import List
+
+import pytest
+
+from aipg.sandbox.adapters import (
+    _ENV_LOADER,
+    _STDIN_LOADER,
+    ComposeDockerRunner,
+    DockerPythonRunner,
+    _env_payload,
+    _stdin_payload,
+)
+from aipg.sandbox.docker_engine import demultiplex
+
+
+class FakeProcess:
+    returncode = 0
+
+    async def communicate(self, input: bytes) -> tuple[bytes, bytes]:
+        return b"ok\n", b""
+
+    async def wait(self) -> int:
+        return 0
+
+
+@pytest.mark.unit
+async def test_reuse_container_starts_once_and_execs(monkeypatch):
+    started: List[List[str]] = []
+    executed: List[tuple] = []
+
+    def fake_run(cmd, **kwargs):
+        started.append(cmd)
+        return subprocess.CompletedProcess(cmd, 0)
+
+    async def fake_exec(*cmd, **kwargs):
+        executed.append(cmd)
+        return FakeProcess()
+
+    monkeypatch.setattr(subprocess, "run", fake_run)
+    monkeypatch.setattr(asyncio, "create_subprocess_exec", fake_exec)
+    runner = DockerPythonRunner(reuse_container=True)
+
+    async with runner:
+        results = [await runner.run("print('ok')", None, 5) for _ in range(2)]
+
+    assert [result.stdout for result in results] == ["ok\n", "ok\n"]
+    assert len(started) == 2  # one `docker run -d`, one `docker rm -f` on exit
+    assert started[0][:3] == ["docker", "run", "-d"]
+    assert started[1][:3] == ["docker", "rm", "-f"]
+    warm_name = started[0][started[0].index("--name") + 1]
+    assert all(cmd[:2] == ("docker", "exec") and warm_name in cmd for cmd in executed)
+
+
+@pytest.mark.unit
+def test_stdin_loader_runs_code_and_leaves_input_on_stdin():
+    code = "name = input()\nprint(f'hi {name}', __name__)\n"
+    result = subprocess.run(
+        [sys.executable, "-c", _STDIN_LOADER],
+        input=_stdin_payload(code, "Ёжик\n"),
+        capture_output=True,
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.decode("utf-8") == "hi Ёжик __main__\n"
+
+
+@pytest.mark.unit
+def test_env_loader_runs_code_with_input_as_stdin():
+    code = "import sys\nprint(input(), sys.stdin.read(), __name__)\n"
+    env = _env_payload(code, "первая\nвторая")
+
+    result = subprocess.run(
+        [sys.executable, "-c", _ENV_LOADER],
+        env=dict(os.environ, **dict(item.split("=", 1) for item in env)),
+        capture_output=True,
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.decode("utf-8") == "первая вторая __main__\n"
+    assert _env_payload("x" * 200_000, None) is None
+
+
+@pytest.mark.unit
+def test_demultiplex_splits_exec_stream():
+    frames = (
+        b"\x01\x00\x00\x00\x00\x00\x00\x03out"
+        b"\x02\x00\x00\x00\x00\x00\x00\x03err"
+        b"\x01\x00\x00\x00\x00\x00\x00\x01!"
+    )
+
+    assert demultiplex(frames) == (b"out!", b"err")
+
+
+@pytest.mark.unit
+async def test_persistent_repl_reuses_one_interpreter(monkeypatch):
+    spawned: List[tuple] = []
+    create_subprocess_exec = asyncio.create_subprocess_exec
+
+    async def local_exec(*cmd, **kwargs):
+        # Run the in-container command locally instead of through docker exec
+        spawned.append(cmd)
+        argv = cmd[cmd.index("python") + 1 :]
+        return await create_subprocess_exec(sys.executable, *argv, **kwargs)
+
+    monkeypatch.setattr(asyncio, "create_subprocess_exec", local_exec)
+    runner = ComposeDockerRunner(docker_socket="/nonexistent", persistent_repl=True)
+
+    first = await runner.run(
+        "import sys\nx = input()\nprint(x.upper())\nsys.exit(3)", "hi\n", 5
+    )
+    second = await runner.run(
+        "print('x' in globals())\nraise ValueError('boom')", None, 5
+    )
+    slow = await runner.run("while True:\n    pass", None, 1)
+    after = await runner.run("print('ok')", None, 5)
+    await runner.aclose()
+
+    assert (first.stdout, first.exit_code) == ("HI\n", 3)
+    assert (second.stdout, second.exit_code) == ("False\n", 1)
+    assert "<sandbox>" in second.stderr and "ValueError: boom" in second.stderr
+    assert slow.timed_out and slow.exit_code == 124
+    assert (after.stdout, after.exit_code) == ("ok\n", 0)
+    assert len(spawned) == 1
+
+
+class FailingEngine:
+    def __init__(self) -> None:
+        self.closed = False
+
+    async def exec_run(self, *args, **kwargs):
+        raise ConnectionError("socket gone")
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+@pytest.mark.unit
+async def test_engine_is_closed_when_falling_back_to_cli(monkeypatch):
+    async def fake_exec(*cmd, **kwargs):
+        return FakeProcess()
+
+    monkeypatch.setattr(asyncio, "create_subprocess_exec", fake_exec)
+    runner = ComposeDockerRunner(docker_socket="/nonexistent")
+    engine = runner._engine = FailingEngine()  # type: ignore[assignment]
+
+    result = await runner.run("print('ok')", None, 5)
+
+    assert result.stdout == "ok\n"
+    assert engine.closed and runner._engine is None
@@ -0,0 +1,50 @@
+from typing import Callable
+from unittest.mock import AsyncMock
+
+import pytest
+
+from aipg.domain import FeedbackAgentState, Project
+from aipg.task_inference.task_inference import (
+    CheckUserSolutionSandboxInference,
+    FeedbackInference,
+)
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_feedback_stream_yields_pieces_and_sets_feedback(
+    make_project: Callable[..., Project],
+) -> None:
+    async def stream(chat_prompt):
+        for piece in ["Good ", "job", "!\n"]:
+            yield piece
+
+    mock_llm = AsyncMock()
+    mock_llm.stream = stream
+    state = FeedbackAgentState(user_solution="print(1)", project=make_project())
+
+    pieces = [piece async for piece in FeedbackInference(llm=mock_llm).stream(state)]
+
+    assert pieces == ["Good ", "job", "!\n"]
+    assert state.feedback == "Good job!"
+    mock_llm.query.assert_not_called()
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_check_user_solution_renders_every_placeholder(
+    make_project: Callable[..., Project],
+) -> None:
+    sandbox_service = AsyncMock()
+    project = make_project()
+    project.autotest = "{STUDENT_SOLUTION}\n# check\n{STUDENT_SOLUTION}"
+    state = FeedbackAgentState(user_solution="print(1)", project=project)
+
+    await CheckUserSolutionSandboxInference(
+        llm=AsyncMock(), sandbox_service=sandbox_service
+    ).transform(state)
+
+    sandbox_service.run_code.assert_awaited_once_with("print(1)\n# check\nprint(1)")
+    assert project.has_solution_placeholder
+    project.autotest = "assert True"
+    assert not project.has_solution_placeholder
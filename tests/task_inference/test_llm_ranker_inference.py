@@ -1,4 +1,4 @@
-from unittest.mock import AsyncMock
+from unittest.mock import AsyncMock, Mock
 
 import pytest
 
@@ -123,3 +123,128 @@ async def test_llm_ranker_inference_empty_candidates() -> None:
     assert result.project is None
     assert result.topic == "test query"
     assert result.candidates == []
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_llm_ranker_inference_exact_match_skips_llm() -> None:
+    mock_llm = AsyncMock()
+
+    candidates = [Topic2Project(topic="Other"), Topic2Project(topic="Test Query ")]
+    state = ProcessTopicAgentState(topic="test query", candidates=candidates)
+    inference = LLMRankerInference(llm=mock_llm, similarity_threshold=0.7)
+
+    result = await inference.transform(state)
+
+    assert result.topic == "Test Query "
+    assert result.project == candidates[1].project
+    mock_llm.query.assert_not_called()
+
+
+def _batch_states() -> list[ProcessTopicAgentState]:
+    candidates = [Topic2Project(topic="first"), Topic2Project(topic="second")]
+    return [
+        ProcessTopicAgentState(topic="topic-a", candidates=candidates),
+        ProcessTopicAgentState(topic="topic-b", candidates=candidates),
+        ProcessTopicAgentState(topic="none", candidates=[]),
+    ]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_transform_batch_ranks_all_topics_in_one_call() -> None:
+    mock_llm = AsyncMock()
+    mock_llm.max_input_tokens = Mock(return_value=1000)
+    mock_llm.count_tokens = Mock(return_value=100)
+    mock_llm.query.return_value = (
+        '{"groups": [{"group": 1, "scores": [0.9, 0.1]},'
+        ' {"group": 2, "scores": [0.2, 0.3]}]}'
+    )
+    inference = LLMRankerInference(llm=mock_llm, similarity_threshold=0.5)
+
+    results = await inference.transform_batch(_batch_states())
+
+    assert mock_llm.query.call_count == 1
+    prompt = mock_llm.query.call_args.args[0][1]["content"]
+    assert "[Группа 1]" in prompt and "topic-b" in prompt and "none" not in prompt
+    assert [r.topic for r in results] == ["first", "topic-b", "none"]
+    assert results[1].project is None
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_transform_batch_ranks_one_by_one_when_prompt_is_too_large() -> None:
+    mock_llm = AsyncMock()
+    mock_llm.max_input_tokens = Mock(return_value=1000)
+    mock_llm.count_tokens = Mock(return_value=900)
+    mock_llm.query.side_effect = ["[0.9, 0.1]", "[0.1, 0.9]"]
+    inference = LLMRankerInference(llm=mock_llm, similarity_threshold=0.5)
+
+    results = await inference.transform_batch(_batch_states())
+
+    assert mock_llm.query.call_count == 2
+    assert sorted(r.topic for r in results) == ["first", "none", "second"]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_retries_keep_only_the_latest_failed_attempt() -> None:
+    prompt_lengths: list[int] = []
+
+    async def query(chat_prompt, *args, **kwargs):
+        prompt_lengths.append(len(chat_prompt))
+        return "not json" if len(prompt_lengths) < 3 else "[0.9]"
+
+    mock_llm = AsyncMock()
+    mock_llm.query.side_effect = query
+    state = ProcessTopicAgentState(
+        topic="topic", candidates=[Topic2Project(topic="candidate")]
+    )
+
+    await LLMRankerInference(llm=mock_llm).transform(state)
+
+    assert prompt_lengths == [2, 4, 4]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_duplicate_candidate_topics_are_scored_once() -> None:
+    mock_llm = AsyncMock()
+    mock_llm.query.return_value = "[0.2, 0.9]"
+    candidates = [
+        Topic2Project(topic="Lists"),
+        Topic2Project(topic="Dicts"),
+        Topic2Project(topic=" lists"),
+    ]
+    state = ProcessTopicAgentState(topic="topic", candidates=candidates)
+
+    result = await LLMRankerInference(llm=mock_llm).transform(state)
+
+    prompt = mock_llm.query.call_args.args[0][1]["content"]
+    assert "2. Dicts" in prompt and "3." not in prompt
+    assert result.topic == "Dicts"
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_semantic_match_skips_llm_ranking() -> None:
+    mock_llm = AsyncMock()
+    candidates = [
+        Topic2Project(topic="joins in SQL", similarity=0.95),
+        Topic2Project(topic="SQL indexes", similarity=0.8),
+    ]
+    state = ProcessTopicAgentState(topic="SQL joins", candidates=candidates)
+    inference = LLMRankerInference(llm=mock_llm, semantic_match_threshold=0.92)
+
+    result = await inference.transform(state)
+
+    assert result.topic == "joins in SQL"
+    mock_llm.query.assert_not_called()
+
+    # Below the threshold the LLM still ranks the candidates
+    mock_llm.query.return_value = "[0.9, 0.1]"
+    state = ProcessTopicAgentState(topic="SQL joins", candidates=candidates)
+    await LLMRankerInference(llm=mock_llm, semantic_match_threshold=0.99).transform(
+        state
+    )
+    mock_llm.query.assert_awaited_once()
@@ -0,0 +1,50 @@
+from typing import Callable
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from aipg.domain import ProcessTopicAgentState, Project
+from aipg.task_inference.task_inference import ProjectGenerationInference
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_transform_batch_uses_one_batch_job_and_regenerates_failures(
+    make_project: Callable[..., Project],
+) -> None:
+    def project_markdown(topic: str) -> str:
+        return make_project(topic=topic).raw_markdown
+
+    mock_llm = MagicMock()
+    mock_llm.supports_batch = True
+    mock_llm.batch_query = AsyncMock(
+        return_value=[project_markdown("first"), "not a project", None]
+    )
+    mock_llm.query = AsyncMock(
+        side_effect=lambda chat_prompt, **kwargs: project_markdown("retried")
+    )
+    states = [ProcessTopicAgentState(topic=t) for t in ["first", "second", "third"]]
+
+    results = await ProjectGenerationInference(llm=mock_llm).transform_batch(states)
+
+    mock_llm.batch_query.assert_awaited_once()
+    assert len(mock_llm.batch_query.await_args.args[0]) == 3
+    assert mock_llm.query.await_count == 2
+    assert [r.project.topic for r in results] == ["first", "retried", "retried"]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_transform_batch_without_batch_support_queries_each_topic(
+    make_project: Callable[..., Project],
+) -> None:
+    mock_llm = MagicMock()
+    mock_llm.supports_batch = False
+    mock_llm.batch_query = AsyncMock()
+    mock_llm.query = AsyncMock(return_value=make_project().raw_markdown)
+    states = [ProcessTopicAgentState(topic=t) for t in ["a", "b"]]
+
+    await ProjectGenerationInference(llm=mock_llm).transform_batch(states)
+
+    mock_llm.batch_query.assert_not_awaited()
+    assert mock_llm.query.await_count == 2
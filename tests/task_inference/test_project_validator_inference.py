@@ -200,6 +200,30 @@ checks:
         assert validation_result.checks[i].comment == expected_check["comment"]
 
 
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_project_validator_inference_requests_structured_json() -> None:
+    mock_llm = AsyncMock()
+    mock_llm.query.return_value = (
+        '{"is_valid": false, "checks": '
+        '[{"rule_id": "SOLVABILITY", "passed": false, "comment": "No data"}]}'
+    )
+    state = ProcessTopicAgentState(
+        topic="test topic", project=create_project(topic="test topic")
+    )
+
+    result = await ProjectValidatorInference(llm=mock_llm).transform(state)
+
+    response_format = mock_llm.query.call_args.kwargs["response_format"]
+    assert response_format["json_schema"]["schema"]["required"] == [
+        "is_valid",
+        "checks",
+    ]
+    validation_result = cast(ProjectValidationResult, result.validation_result)
+    assert validation_result.is_valid is False
+    assert validation_result.checks[0].comment == "No data"
+
+
 @pytest.mark.unit
 @pytest.mark.asyncio
 async def test_project_validator_inference_empty_response() -> None:
@@ -0,0 +1,96 @@
+from typing import Any, Callable
+
+import pytest
+
+from aipg.domain import ProjectsAgentState
+from aipg.llm import LLMClient
+from aipg.task_inference.task_inference import DefineTopicsInference
+
+DETERMINISTIC = {"temperature": 0}
+
+
+@pytest.fixture(autouse=True)
+def clear_response_cache(make_client: Callable[..., LLMClient]) -> None:
+    # The cache is process-wide, so hits from earlier tests would leak in
+    make_client().response_cache.clear()
+
+
+async def define_topics(client: LLMClient) -> list[str]:
+    state = ProjectsAgentState(comments=["Не понимаю списки"])
+    state = await DefineTopicsInference(llm=client).transform(state)
+    return state.topics
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_deterministic_request_is_answered_from_cache(
+    make_client: Callable[..., LLMClient],
+) -> None:
+    client = make_client(['{"topics": ["lists"]}'], completion_params=DETERMINISTIC)
+
+    assert await define_topics(client) == ["lists"]
+    assert await define_topics(client) == ["lists"]
+
+    assert client.query.await_count == 1
+    assert DefineTopicsInference(llm=client).response_cache is client.response_cache
+    assert (client.response_cache.hits, client.response_cache.misses) == (1, 1)
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_separate_clients_share_the_cache(
+    make_client: Callable[..., LLMClient],
+) -> None:
+    first = make_client(['{"topics": ["lists"]}'], completion_params=DETERMINISTIC)
+    second = make_client([], completion_params=DETERMINISTIC)
+
+    assert await define_topics(first) == ["lists"]
+    assert await define_topics(second) == ["lists"]
+
+    assert second.query.await_count == 0
+    assert second.response_cache is first.response_cache
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_unparsable_replies_are_not_cached(
+    make_client: Callable[..., LLMClient],
+) -> None:
+    client = make_client(
+        ["not json", '{"topics": ["lists"]}', '{"topics": ["dicts"]}'],
+        completion_params=DETERMINISTIC,
+    )
+
+    await define_topics(client)
+    # The malformed first reply was not stored, so the same prompt asks again
+    await define_topics(client)
+
+    assert client.query.await_count == 3
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_only_temperature_actually_sent_makes_requests_cacheable(
+    make_client: Callable[..., LLMClient],
+) -> None:
+    # llm.temperature is not sent on the litellm path; the provider samples
+    client = make_client(['{"topics": ["a"]}', '{"topics": ["b"]}'], temperature=0)
+
+    assert await define_topics(client) == ["a"]
+    assert await define_topics(client) == ["b"]
+
+
+@pytest.mark.unit
+def test_cache_key_covers_endpoint_and_params(
+    make_client: Callable[..., LLMClient],
+) -> None:
+    messages = [{"role": "user", "content": "hi"}]
+
+    def key(**llm_options: Any) -> str | None:
+        options = {"completion_params": DETERMINISTIC, **llm_options}
+        return make_client(**options).request_cache_key(messages)
+
+    assert key() == key()
+    assert key() != key(base_url="https://other.example.com/v1")
+    assert key() != key(completion_params={"temperature": 0, "max_tokens": 10})
+    assert key() != key(model_name="openai/gpt-4o-mini")
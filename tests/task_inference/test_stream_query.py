@@ -0,0 +1,114 @@
+import re
+from typing import Callable
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+from aipg.configs.app_config import AppConfig, LLMConfig
+from aipg.domain import ProcessTopicAgentState, Project, ProjectsAgentState
+from aipg.task_inference.task_inference import (
+    DefineTopicsInference,
+    ProjectValidatorInference,
+)
+
+
+def create_streaming_llm(
+    replies: list[list[str]], supports_response_schema: bool = True
+) -> tuple[Mock, list[int]]:
+    """LLM whose stream yields the pieces of one reply per call.
+
+    Also returns, per call, how many pieces were consumed before closing.
+    """
+    consumed: list[int] = []
+    remaining = iter(replies)
+
+    async def stream(chat_prompt, response_format=None):
+        consumed.append(0)
+        for piece in next(remaining):
+            consumed[-1] += 1
+            yield piece
+
+    llm = Mock()
+    llm.config = AppConfig(llm=LLMConfig(temperature=0.5, stream_responses=True))
+    llm.stream = stream
+    llm.supports_response_schema = supports_response_schema
+    llm.query = AsyncMock()
+    return llm, consumed
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_stream_stops_once_json_reply_is_complete() -> None:
+    llm, consumed = create_streaming_llm(
+        [['{"topics": ', '["lists"]', "}", "\n\nHope this helps!", " More text"]]
+    )
+
+    state = await DefineTopicsInference(llm=llm).transform(
+        ProjectsAgentState(comments=["Не понимаю списки"])
+    )
+
+    assert state.topics == ["lists"]
+    assert consumed == [3]
+    llm.query.assert_not_called()
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_stream_reads_fenced_json_reply_to_the_closing_fence() -> None:
+    llm, consumed = create_streaming_llm(
+        [["```json\n", '{"topics": ', '["lists"]', "}", "\n```", "\nDone."]]
+    )
+
+    state = await DefineTopicsInference(llm=llm).transform(
+        ProjectsAgentState(comments=["Не понимаю списки"])
+    )
+
+    assert state.topics == ["lists"]
+    assert consumed == [6]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_stream_cuts_off_non_json_reply_and_retries() -> None:
+    chatter = ["Sure! " * 50] * 10
+    llm, consumed = create_streaming_llm([chatter, ['{"topics": ["lists"]}']])
+
+    state = await DefineTopicsInference(llm=llm).transform(
+        ProjectsAgentState(comments=["Не понимаю списки"])
+    )
+
+    assert state.topics == ["lists"]
+    assert consumed == [2, 1]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_stream_keeps_whole_reply_when_schema_is_not_sent(
+    make_project: Callable[..., Project],
+) -> None:
+    # Without schema support the validator prompt's YAML format applies; a
+    # long reply with JSON-looking fragments must not be cut off
+    comment = "Список [1, 2] и словарь {} в условии согласованы. " * 12
+    reply = (
+        "is_valid: true\n"
+        "checks:\n"
+        '  - rule_id: "SOLVABILITY"\n'
+        "    passed: true\n"
+        f'    comment: "{comment}"\n'
+        '  - rule_id: "AUTOTEST_SCOPE"\n'
+        "    passed: true\n"
+        '    comment: "OK"\n'
+    )
+    # Pieces end right after each bracket, where JSON decoding is attempted
+    pieces = re.split(r"(?<=[\]}])", reply)
+    llm, consumed = create_streaming_llm([pieces], supports_response_schema=False)
+    project = make_project()
+
+    state = await ProjectValidatorInference(llm=llm).transform(
+        ProcessTopicAgentState(topic="topic", project=project)
+    )
+
+    assert consumed == [len(pieces)]
+    assert state.validation_result is not None
+    assert state.validation_result.is_valid
+    assert state.validation_result.checks[0].comment == comment
@@ -0,0 +1,38 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+import pytest
+
+from aipg.domain import ProcessTopicAgentState, Topic2Project
+from aipg.task_inference.task_inference import LLMRankerInference
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_transform_many_overlaps_calls_and_keeps_order() -> None:
+    in_flight = 0
+    peak = 0
+
+    async def query(chat_prompt, *args, **kwargs):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        # Prefer the candidate named after the topic being ranked
+        prompt = str(chat_prompt)
+        return "[0.9, 0.1]" if "topic-a" in prompt else "[0.1, 0.9]"
+
+    mock_llm = AsyncMock()
+    mock_llm.query.side_effect = query
+    candidates = [Topic2Project(topic="first"), Topic2Project(topic="second")]
+    states = [
+        ProcessTopicAgentState(topic=topic, candidates=candidates)
+        for topic in ["topic-a", "topic-b", "topic-a"]
+    ]
+    inference = LLMRankerInference(llm=mock_llm, similarity_threshold=0.5)
+
+    results = await inference.transform_many(states, concurrency=2)
+
+    assert [r.topic for r in results] == ["first", "second", "first"]
+    assert peak == 2
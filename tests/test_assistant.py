@@ -0,0 +1,88 @@
+import asyncio
+from typing import Callable, List
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from aipg.assistant import ProjectAssistant
+from aipg.configs.app_config import AppConfig, LLMConfig, RagConfig
+from aipg.domain import ProcessTopicAgentState, Project, Topic2Project
+
+TOPICS = ["a", "b", "c", "d", "e"]
+
+
+class InFlightCounter:
+    def __init__(self) -> None:
+        self.in_flight = 0
+        self.peak = 0
+
+    async def enter(self) -> None:
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+
+
+def create_assistant(
+    monkeypatch: pytest.MonkeyPatch, ranker: str = "llm"
+) -> ProjectAssistant:
+    monkeypatch.setattr("aipg.assistant.build_rag_service", lambda config: MagicMock())
+    monkeypatch.setattr(
+        "aipg.assistant.build_sandbox_service", lambda config: MagicMock()
+    )
+    config = AppConfig(
+        llm=LLMConfig(api_key="test-key"),
+        rag=RagConfig(ranker=ranker),
+        max_concurrent_topics=2,
+    )
+    config.llm.caching.enabled = False
+    return ProjectAssistant(config)
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_failed_batch_generation_respects_max_concurrent_topics(
+    monkeypatch: pytest.MonkeyPatch, make_project: Callable[..., Project]
+) -> None:
+    assistant = create_assistant(monkeypatch)
+    counter = InFlightCounter()
+    markdown = make_project().raw_markdown
+
+    async def query(chat_prompt, **kwargs):
+        await counter.enter()
+        return markdown
+
+    assistant.llm = MagicMock()
+    assistant.llm.supports_batch = True
+    assistant.llm.batch_query = AsyncMock(side_effect=RuntimeError("batch failed"))
+    assistant.llm.query = AsyncMock(side_effect=query)
+    ranked = [ProcessTopicAgentState(topic=topic) for topic in TOPICS]
+
+    generated = await assistant.generate_projects(ranked)
+
+    assert all(project is not None for project in generated)
+    assert counter.peak == 2
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_embedding_ranking_respects_max_concurrent_topics(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    assistant = create_assistant(monkeypatch, ranker="embedding")
+    counter = InFlightCounter()
+
+    async def embedding_processor(texts: List[str]) -> List[List[float]]:
+        await counter.enter()
+        return [[1.0, 0.0]] * len(texts)
+
+    candidates = [Topic2Project(topic="candidate")]
+    assistant.rag_service.try_to_get_many = AsyncMock(
+        return_value=[candidates] * len(TOPICS)
+    )
+    assistant.rag_service.embedder.embedding_processor = embedding_processor
+
+    ranked = await assistant.rank_topics(TOPICS)
+
+    assert all(state is not None for state in ranked)
+    assert counter.peak == 2
@@ -0,0 +1,55 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from aipg import event_loop
+
+
+async def current_loop() -> asyncio.AbstractEventLoop:
+    return asyncio.get_running_loop()
+
+
+async def fail() -> None:
+    raise ValueError("boom")
+
+
+@pytest.mark.unit
+def test_run_shared_reuses_one_loop_across_threads() -> None:
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        loops = list(
+            pool.map(lambda _: event_loop.run_shared(current_loop()), range(8))
+        )
+
+    assert len(set(map(id, loops))) == 1
+    with pytest.raises(ValueError, match="boom"):
+        event_loop.run_shared(fail())
+
+
+async def count_to(n: int):
+    for i in range(n):
+        await asyncio.sleep(0)
+        yield i
+
+
+@pytest.mark.unit
+def test_iterate_shared_drives_async_iterator_from_sync_code() -> None:
+    assert list(event_loop.iterate_shared(count_to(3))) == [0, 1, 2]
+
+
+@pytest.mark.unit
+def test_iterate_shared_closes_source_when_closed_early() -> None:
+    closed = []
+
+    async def source():
+        try:
+            for i in range(3):
+                yield i
+        finally:
+            closed.append(True)
+
+    items = event_loop.iterate_shared(source())
+    assert next(items) == 0
+    items.close()
+
+    assert closed == [True]
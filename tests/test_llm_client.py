@@ -0,0 +1,149 @@
+import json
+from types import SimpleNamespace
+from typing import Any, Callable
+
+import pytest
+from tenacity import wait_none
+
+from aipg.configs.app_config import AppConfig, LLMConfig
+from aipg.llm import LLMClient
+
+
+@pytest.mark.unit
+def test_prompt_cache_key_follows_system_prompt(
+    make_client: Callable[..., LLMClient],
+) -> None:
+    client = make_client(model_name="openai/gpt-4o", prompt_caching=True)
+
+    def params(system: str, user: str) -> dict:
+        messages = [
+            {"role": "system", "content": system},
+            {"role": "user", "content": user},
+        ]
+        return client._request_params(messages, response_format=None)
+
+    first = params("static instructions", "topic one")
+    assert (
+        first["prompt_cache_key"]
+        == params("static instructions", "topic two")["prompt_cache_key"]
+    )
+    assert first["prompt_cache_key"] != params("other", "topic one")["prompt_cache_key"]
+
+
+@pytest.mark.unit
+def test_prompt_cache_key_is_opt_in(make_client: Callable[..., LLMClient]) -> None:
+    client = make_client(model_name="openai/gpt-4o", prompt_caching=False)
+    messages = [{"role": "system", "content": "static instructions"}]
+
+    assert "prompt_cache_key" not in client._request_params(messages, None)
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_batch_query_sends_query_params_in_each_body(
+    monkeypatch: pytest.MonkeyPatch, make_client: Callable[..., LLMClient]
+) -> None:
+    client = make_client(
+        model_name="openai/gpt-4o",
+        batch_api=True,
+        extra_headers={"X-Title": "AIPG"},
+        completion_params={"temperature": 0.2, "max_completion_tokens": 900},
+    )
+    uploaded: dict[str, Any] = {}
+
+    async def acreate_file(file, purpose, **kwargs):
+        uploaded["jsonl"] = file[1].decode()
+        uploaded["headers"] = kwargs.get("extra_headers")
+        return SimpleNamespace(id="file-1")
+
+    async def acreate_batch(**kwargs):
+        return SimpleNamespace(id="batch-1", status="completed", output_file_id="out")
+
+    async def afile_content(file_id, **kwargs):
+        line = {
+            "custom_id": "request-0",
+            "response": {
+                "status_code": 200,
+                "body": {"choices": [{"message": {"content": "reply"}}]},
+            },
+        }
+        return SimpleNamespace(text=json.dumps(line))
+
+    monkeypatch.setattr("aipg.llm.litellm.acreate_file", acreate_file)
+    monkeypatch.setattr("aipg.llm.litellm.acreate_batch", acreate_batch)
+    monkeypatch.setattr("aipg.llm.litellm.afile_content", afile_content)
+
+    replies = await client.batch_query([[{"role": "user", "content": "hi"}]])
+
+    assert replies == ["reply"]
+    body = json.loads(uploaded["jsonl"])["body"]
+    assert body["model"] == "gpt-4o"
+    assert body["temperature"] == 0.2
+    assert body["max_completion_tokens"] == 900
+    assert "api_key" not in body and "metadata" not in body
+    assert uploaded["headers"] == {"X-Title": "AIPG"}
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_batch_query_cancels_job_after_task_timeout(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    config = AppConfig(
+        llm=LLMConfig(
+            model_name="openai/gpt-4o",
+            api_key="test-key",
+            batch_api=True,
+            batch_poll_interval_seconds=0.01,
+        ),
+        task_timeout=0,
+    )
+    config.llm.caching.enabled = False
+    client = LLMClient(config)
+    cancelled: list[str] = []
+
+    async def acreate_file(file, purpose, **kwargs):
+        return SimpleNamespace(id="file-1")
+
+    async def acreate_batch(**kwargs):
+        return SimpleNamespace(id="batch-1", status="in_progress")
+
+    async def acancel_batch(batch_id, **kwargs):
+        cancelled.append(batch_id)
+
+    monkeypatch.setattr("aipg.llm.litellm.acreate_file", acreate_file)
+    monkeypatch.setattr("aipg.llm.litellm.acreate_batch", acreate_batch)
+    monkeypatch.setattr("aipg.llm.litellm.acancel_batch", acancel_batch)
+
+    with pytest.raises(TimeoutError):
+        await client.batch_query([[{"role": "user", "content": "hi"}]])
+
+    assert cancelled == ["batch-1"]
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_stream_retries_errors_before_first_chunk(
+    monkeypatch: pytest.MonkeyPatch, make_client: Callable[..., LLMClient]
+) -> None:
+    client = make_client(model_name="openai/gpt-4o")
+    calls: list[bool] = []
+
+    async def chunks():
+        for text in ["Hel", "lo"]:
+            delta = SimpleNamespace(content=text)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+    async def acompletion(messages, stream, **kwargs):
+        calls.append(stream)
+        if len(calls) == 1:
+            raise ConnectionError("reset")
+        return chunks()
+
+    monkeypatch.setattr("aipg.llm.litellm.acompletion", acompletion)
+    monkeypatch.setattr(LLMClient._open_stream.retry, "wait", wait_none())
+
+    pieces = [piece async for piece in client.stream("hi")]
+
+    assert pieces == ["Hel", "lo"]
+    assert calls == [True, True]
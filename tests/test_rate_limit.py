@@ -0,0 +1,35 @@
+import pytest
+
+from aipg.rate_limit import AsyncRateLimiter, get_rate_limiter
+
+
+@pytest.mark.unit
+@pytest.mark.asyncio
+async def test_rate_limiter_waits_for_refill_after_burst(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    now = 0.0
+    sleeps: list[float] = []
+
+    async def fake_sleep(delay: float) -> None:
+        nonlocal now
+        sleeps.append(delay)
+        now += delay
+
+    monkeypatch.setattr("aipg.rate_limit.time.monotonic", lambda: now)
+    monkeypatch.setattr("aipg.rate_limit.asyncio.sleep", fake_sleep)
+    limiter = AsyncRateLimiter(max_rate=2, time_period=60)
+
+    for _ in range(3):
+        async with limiter:
+            pass
+
+    assert sleeps == [pytest.approx(30.0)]
+
+
+@pytest.mark.unit
+def test_get_rate_limiter_shares_bucket_per_key() -> None:
+    first = get_rate_limiter("https://api.example.com", 500)
+
+    assert get_rate_limiter("https://api.example.com", 500) is first
+    assert get_rate_limiter("gemini", 500) is not first
@@ -0,0 +1,26 @@
+import pytest
+
+from aipg.prompting.utils import parse_json
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize(
+    "raw_reply,expected",
+    [
+        # Fenced JSON block
+        ('```json\n{"a": 1}\n```', {"a": 1}),
+        # Object embedded in prose, followed by more braces
+        ('Result: {"a": {"b": 2}} and {"c": 3}', {"a": {"b": 2}}),
+        # Braces and escaped quotes inside string values
+        ('Here {"text": "a } \\" {"} done', {"text": 'a } " {'}),
+        # Unterminated object is handed to json_repair
+        ('Answer: {"a": 1', {"a": 1}),
+    ],
+)
+def test_parse_json_extracts_object(raw_reply: str, expected: dict) -> None:
+    assert parse_json(raw_reply) == expected
+
+
+@pytest.mark.unit
+def test_parse_json_returns_none_without_object() -> None:
+    assert parse_json("no json here") is None
@@ -1,7 +1,10 @@
 import pytest
 
 from aipg.exceptions import OutputParserException
-from aipg.prompting.utils import parse_llm_ranker_scores
+from aipg.prompting.utils import (
+    parse_llm_ranker_batch_scores,
+    parse_llm_ranker_scores,
+)
 
 
 @pytest.mark.unit
@@ -20,6 +23,8 @@ from aipg.prompting.utils import parse_llm_ranker_scores
         ("Here are the scores: [0.9, 0.1]", [0.9, 0.1]),
         # Integer values (should be converted to float)
         ("[1, 0, 0.5]", [1.0, 0.0, 0.5]),
+        # Structured-output object wrapping the array
+        ('{"scores": [0.4, 0.6]}', [0.4, 0.6]),
     ],
 )
 def test_parse_llm_ranker_scores_valid_inputs(
@@ -63,3 +68,39 @@ def test_parse_llm_ranker_scores_invalid_inputs(
     else:
         with pytest.raises(expected_exception_type):
             parse_llm_ranker_scores(input_text)
+
+
+@pytest.mark.unit
+def test_parse_llm_ranker_scores_checks_expected_count() -> None:
+    assert parse_llm_ranker_scores("[0.1, 0.2]", expected_count=2) == [0.1, 0.2]
+    with pytest.raises(OutputParserException, match="Expected 3 scores, got 2"):
+        parse_llm_ranker_scores("[0.1, 0.2]", expected_count=3)
+
+
+@pytest.mark.unit
+def test_parse_llm_ranker_batch_scores_maps_groups_to_indices() -> None:
+    reply = (
+        '```json\n{"groups": [{"group": 2, "scores": [0.3]},'
+        ' {"group": 1, "scores": [0.8, 0.1]}]}\n```'
+    )
+
+    assert parse_llm_ranker_batch_scores(reply, expected_counts=[2, 1]) == {
+        0: [0.8, 0.1],
+        1: [0.3],
+    }
+
+
+@pytest.mark.unit
+@pytest.mark.parametrize(
+    "reply",
+    [
+        "[0.8, 0.1]",
+        '{"groups": [{"group": 1, "scores": [0.8, 0.1]}]}',
+        '{"groups": [{"group": 1, "scores": [0.8]}, {"group": 2, "scores": [0.3]}]}',
+        '{"groups": [{"group": 3, "scores": [0.3]}]}',
+        '{"groups": [{"group": 1, "scores": [1.5, 0.1]}, {"group": 2, "scores": [0.3]}]}',
+    ],
+)
+def test_parse_llm_ranker_batch_scores_rejects_invalid_replies(reply: str) -> None:
+    with pytest.raises(OutputParserException):
+        parse_llm_ranker_batch_scores(reply, expected_counts=[2, 1])
@@ -250,3 +250,19 @@ def test_parse_project_markdown_outer_markdown_fence_success(open_fence: str):
     assert "Найти эффективный метод сортировки." == result.goal
     assert "```" not in result.expert_solution
     assert "def test_sorting():" in result.autotest
+
+
+def test_parse_project_markdown_repeated_parse_returns_independent_copies():
+    raw = _build_markdown(
+        wrap_all=False,
+        autotest_lang="python",
+        topic_bracketed=False,
+        expected_fenced=False,
+    )
+
+    first = parse_project_markdown(raw)
+    first.goal = "mutated"
+    second = parse_project_markdown(raw)
+
+    assert second.goal == "Найти эффективный метод сортировки."
+    assert second.topic == first.topic